@@ -0,0 +1,122 @@
+"""
+Ani trafik artışında kabul denetiminin etkisi: çok sayıda eşzamanlı kullanıcı sahte
+Gemini'ye karşı /chat'e istek atar; kabul denetimi açık ve kapalı karşılaştırılır.
+
+    python benchmarks/bench_admission.py [--users 16,128,256] [--latency 0.5] [--mode async]
+
+  ok           yanıt alan istekler (200, "yoğunum" mesajı hariç)
+  busy_200     Gemini erişim katmanının sırası dolduğu için 200 ile dönen "yoğunum" yanıtları
+  rejected     kabul denetiminin 429 ile geri çevirdiği istekler
+  ok_p50/p99   yanıt alan isteklerin gecikmesi
+  fail_p50/p99 reddedilen isteklerin (429 veya "yoğunum") kullanıcıya ulaşma süresi
+
+Denetim kapalıyken fazla istekler sırada bekleyip birkaç saniye sonra başarısız olur;
+açıkken kapasiteyi aşan istekler milisaniyeler içinde 429 ve Retry-After alır.
+Sınırlar worker başınadır (AYLA_ADMISSION_*); --admission-* ile değiştirilebilir.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import percentile, post_json, print_table, save_report, spawn_app, stop_app, wait_for_http  # noqa: E402
+from fake_gemini import FakeGeminiConfig, start_fake_gemini  # noqa: E402
+
+# Psikoloji anahtar kelimesi içermeyen mesaj: RAG devreye girmez, yalnızca LLM beklemesi ölçülür
+MESSAGE = "Merhaba, bugün nasılsın?"
+BUSY_MESSAGE = "Şu an çok yoğunum"
+
+
+def spike(base_url: str, users: int, requests_per_user: int) -> dict:
+    """'users' kullanıcı aynı anda başlar, her biri arka arkaya istek atar."""
+    ok, failed, outcomes = [], [], {"ok": 0, "busy_200": 0, "rejected": 0, "error": 0}
+    retry_after = []
+    lock = threading.Lock()
+
+    def user(index: int):
+        for turn in range(requests_per_user):
+            start = time.perf_counter()
+            try:
+                status, body = post_json(base_url, "/chat", {"message": f"{MESSAGE} ({index}-{turn})"})
+                payload = json.loads(body)
+            except (OSError, ValueError):
+                status, payload = 0, {}
+            took = time.perf_counter() - start
+            if status == 200 and not payload.get("response", "").startswith(BUSY_MESSAGE):
+                outcome = "ok"
+            elif status == 200:
+                outcome = "busy_200"
+            elif status == 429:
+                outcome = "rejected"
+            else:
+                outcome = "error"
+            with lock:
+                outcomes[outcome] += 1
+                (ok if outcome == "ok" else failed).append(took)
+                if status == 429:
+                    retry_after.append(payload.get("retry_after", 0))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    elapsed = time.perf_counter() - started
+    return {**outcomes, "goodput": round(outcomes["ok"] / elapsed, 1),
+            "ok_p50_ms": round(1000 * percentile(ok, 50)), "ok_p99_ms": round(1000 * percentile(ok, 99)),
+            "fail_p50_ms": round(1000 * percentile(failed, 50)), "fail_p99_ms": round(1000 * percentile(failed, 99)),
+            "retry_after": max(retry_after, default="")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kabul denetimi açık/kapalı ani trafik karşılaştırması")
+    parser.add_argument("--users", default="16,128,256", help="Eşzamanlı kullanıcı sayıları")
+    parser.add_argument("--requests-per-user", type=int, default=3)
+    parser.add_argument("--mode", default="async", choices=["sync", "async"])
+    parser.add_argument("--threads", type=int, default=64, help="sync modda worker başına iş parçacığı")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.5, help="Sahte Gemini gecikmesi (saniye)")
+    parser.add_argument("--admission-max-concurrency", type=int)
+    parser.add_argument("--admission-queue", type=int)
+    parser.add_argument("--admission-queue-timeout", type=float)
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    args = parser.parse_args()
+
+    fake, fake_url = start_fake_gemini(FakeGeminiConfig(latency=args.latency))
+    base_url = f"http://127.0.0.1:{args.port}"
+    limits = {f"AYLA_ADMISSION_{name.upper()}": str(value) for name, value in (
+        ("max_concurrency", args.admission_max_concurrency), ("queue", args.admission_queue),
+        ("queue_timeout", args.admission_queue_timeout)) if value is not None}
+    rows = []
+    try:
+        for admission in ("off", "on"):
+            env = {"GEMINI_API_KEY": "fake-key", "GEMINI_BASE_URL": fake_url, "AYLA_STARTUP": "lazy",
+                   "AYLA_LOG_LEVEL": "WARNING", "AYLA_ADMISSION": "1" if admission == "on" else "0", **limits}
+            proc = spawn_app(args.mode, args.port, workers=args.workers, threads=args.threads, env=env)
+            try:
+                wait_for_http(f"{base_url}/health", proc=proc)
+                for users in (int(u) for u in args.users.split(",")):
+                    row = {"admission": admission, "users": users,
+                           **spike(base_url, users, args.requests_per_user)}
+                    rows.append(row)
+                    print(f"  admission={admission:3} users={users:<4} ok={row['ok']} "
+                          f"rejected={row['rejected']} busy_200={row['busy_200']} ok_p99={row['ok_p99_ms']} ms")
+            finally:
+                stop_app(proc)
+    finally:
+        fake.shutdown()
+
+    print(f"\nMod: {args.mode}, {args.workers} worker, sahte Gemini gecikmesi {args.latency} sn")
+    print_table(rows, ["admission", "users", "ok", "busy_200", "rejected", "error", "goodput", "ok_p50_ms",
+                       "ok_p99_ms", "fail_p50_ms", "fail_p99_ms", "retry_after"])
+    if args.output:
+        save_report(args.output, {"mode": args.mode, "workers": args.workers, "latency": args.latency,
+                                  "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+FAISS indeks tiplerini (flat / hnsw / ivfpq) düz indekse göre recall@k,
+tek sorgu gecikmesi (p50/p99), boyut ve kurulum süresiyle karşılaştırır.
+
+  index_mb     serileştirilmiş FAISS indeksi (index.faiss)
+  resident_mb  index_mb + ham vektörler (vectors.f32): artifact her indeks tipinde ham
+               vektörleri de tutar (IVF-PQ yeniden sıralama ve pack_context için), bu
+               yüzden üretimdeki disk ve sayfa önbelleği kullanımı bu sütundur
+
+    python benchmarks/bench_ann.py                     # mevcut bilgi bankası vektörleri
+    python benchmarks/bench_ann.py --n 50000 --dim 384  # sentetik, kümelenmiş vektörler
+    python benchmarks/bench_ann.py --ef-search 16 32 64 128 --nprobe 4 8 16 32
+
+Bilgi bankası yoksa (veya --n verilirse) sentetik vektörler kullanılır; sorgular
+bilgi bankası vektörlerine gürültü eklenerek üretilir, böylece gerçek sorulara benzer
+biçimde yoğun bölgelere düşer.
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ["AYLA_STARTUP"] = "lazy"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss  # noqa: E402
+import numpy as np  # noqa: E402
+
+import chatbot  # noqa: E402
+from common import percentile, print_table, save_report  # noqa: E402
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def synthetic_vectors(n: int, dim: int, seed: int) -> np.ndarray:
+    """Konu kümelerini taklit eden, normalize edilmiş sentetik vektörler."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(8, n // 200), dim))
+    labels = rng.integers(0, len(centers), n)
+    return _normalize(centers[labels] + 0.6 * rng.standard_normal((n, dim)))
+
+
+def load_vectors(args) -> tuple:
+    if not args.n:
+        kb = chatbot.KnowledgeIndex.open()
+        if kb is not None:
+            return np.ascontiguousarray(kb.vectors), f"bilgi bankası ({kb.manifest['artifact']})"
+        print("⚠️ Bilgi bankası bulunamadı, sentetik vektörler kullanılıyor")
+    n = args.n or 20000
+    return synthetic_vectors(n, args.dim, args.seed), f"sentetik (n={n}, dim={args.dim})"
+
+
+def measure(index, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    """Tek tek sorgularla, sunucudaki arama yoluyla recall@k ve gecikme ölçer."""
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        rows, _ = chatbot.search_index(index, vectors, query, k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(rows.tolist()) & set(expected.tolist()))
+    return {"recall_at_k": round(hits / truth.size, 4),
+            "p50_us": round(1e6 * percentile(latencies, 50), 1),
+            "p99_us": round(1e6 * percentile(latencies, 99), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ANN indeks tipi benchmark'ı")
+    parser.add_argument("--n", type=int, default=0, help="Sentetik vektör sayısı (0: bilgi bankası)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--types", nargs="+", default=["flat", "hnsw", "ivfpq"])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[chatbot.HNSW_EF_SEARCH])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[chatbot.IVF_NPROBE])
+    parser.add_argument("--refine", type=int, nargs="+", default=[chatbot.IVF_REFINE],
+                        help="IVF-PQ yeniden sıralama katsayıları (1: kapalı)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    args = parser.parse_args()
+
+    vectors, origin = load_vectors(args)
+    count, dim = vectors.shape
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, count, args.queries)
+    noise = rng.standard_normal((args.queries, dim)) / np.sqrt(dim)  # norm ≈ 1
+    queries = _normalize(vectors[picks] + 0.5 * noise)
+
+    exact = faiss.IndexFlatIP(dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+    print(f"Vektörler: {origin}, {count} x {dim}; {args.queries} sorgu, k={args.k}\n")
+
+    rows = []
+    for index_type in args.types:
+        spec = chatbot._index_spec(count, dim, index_type)
+        start = time.perf_counter()
+        index = chatbot.build_faiss_index(vectors, spec)
+        build_s = time.perf_counter() - start
+        index_mb = len(faiss.serialize_index(index)) / 2 ** 20
+        resident_mb = index_mb + vectors.nbytes / 2 ** 20
+        if spec["type"] == "hnsw":
+            settings = [{"efSearch": ef} for ef in args.ef_search]
+        elif spec["type"] == "ivfpq":
+            settings = [{"nprobe": nprobe, "refine": refine}
+                        for nprobe in args.nprobe for refine in args.refine]
+        else:
+            settings = [{}]
+        for setting in settings:
+            if "efSearch" in setting:
+                index.hnsw.efSearch = setting["efSearch"]
+            if "nprobe" in setting:
+                index.nprobe = setting["nprobe"]
+                chatbot.IVF_REFINE = setting["refine"]
+            params = {**{k: v for k, v in spec.items() if k != "type"}, **setting}
+            rows.append({"index": spec["type"],
+                         "params": " ".join(f"{k}={v}" for k, v in params.items()),
+                         **measure(index, vectors, queries, truth, args.k),
+                         "index_mb": round(index_mb, 2), "resident_mb": round(resident_mb, 2),
+                         "build_s": round(build_s, 2)})
+
+    print_table(rows, ["index", "params", "recall_at_k", "p50_us", "p99_us", "index_mb", "resident_mb",
+                       "build_s"])
+    if args.output:
+        save_report(args.output, {"vectors": origin, "count": count, "dim": dim,
+                                  "queries": args.queries, "k": args.k, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
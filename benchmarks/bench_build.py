@@ -0,0 +1,116 @@
+"""
+Bilgi bankası kurulum sürelerini geçici bir çalışma dizininde ölçer:
+  full        boş dizinde baştan kurulum (PDF okuma + parçalama + gömme + artifact)
+  noop        değişiklik yokken açılış (manifest + mmap)
+  incremental tek bir PDF değişmiş gibi yeniden gömülmesi
+  relayout    yalnızca indeks tipi değiştiğinde saklı vektörlerden yeniden kurulum
+
+    python benchmarks/bench_build.py [--embedder auto|real|fake] [--relayout-type hnsw]
+
+Depodaki faiss_index/ klasörüne dokunulmaz; --workdir verilmezse geçici dizin kullanılır.
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ["AYLA_STARTUP"] = "lazy"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chatbot  # noqa: E402
+from common import REPO_ROOT, print_table, save_report  # noqa: E402
+from fake_embeddings import resolve_embedder  # noqa: E402
+
+
+@contextlib.contextmanager
+def working_directory(path: str):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def prepare_workdir(path: str, embedder, fresh: bool = True):
+    """PDF'leri çalışma dizinine bağlar ve bilgi bankasını kurar; KnowledgeIndex döndürür."""
+    os.makedirs(path, exist_ok=True)
+    if fresh:
+        shutil.rmtree(os.path.join(path, chatbot.VECTOR_DB_PATH), ignore_errors=True)
+    for name in chatbot.PDF_FILES:
+        target = os.path.join(path, name)
+        if not os.path.exists(target) and os.path.exists(os.path.join(REPO_ROOT, name)):
+            os.symlink(os.path.join(REPO_ROOT, name), target)
+    with working_directory(path):
+        return chatbot.update_vector_db(embedder)
+
+
+def _timed(fn) -> tuple:
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run_build(workdir: str, embedder, relayout_type: str = "hnsw") -> list:
+    rows = []
+
+    kb, took = _timed(lambda: prepare_workdir(workdir, embedder))
+    count = kb.count if kb else 0
+    rows.append({"scenario": "full", "seconds": round(took, 3), "chunks": count,
+                 "chunks_per_s": round(count / took, 1) if took else 0.0})
+
+    _, took = _timed(lambda: prepare_workdir(workdir, embedder, fresh=False))
+    rows.append({"scenario": "noop", "seconds": round(took, 3), "chunks": count, "chunks_per_s": ""})
+
+    # Bir dosyanın özetini bozmak, o dosyanın değişmiş sayılıp yeniden gömülmesini sağlar
+    with working_directory(workdir):
+        manifest = chatbot._load_manifest()
+        changed = next(iter(manifest.get("files", {})), None)
+        if changed:
+            manifest["files"][changed]["sha256"] = "0" * 64
+            chatbot._save_manifest(manifest)
+    if changed:
+        kb, took = _timed(lambda: prepare_workdir(workdir, embedder, fresh=False))
+        chunks = manifest["files"][changed]["chunks"]
+        rows.append({"scenario": f"incremental ({changed})", "seconds": round(took, 3), "chunks": chunks,
+                     "chunks_per_s": round(chunks / took, 1) if took else 0.0})
+
+    previous = chatbot.INDEX_TYPE
+    chatbot.INDEX_TYPE = relayout_type
+    try:
+        kb, took = _timed(lambda: prepare_workdir(workdir, embedder, fresh=False))
+    finally:
+        chatbot.INDEX_TYPE = previous
+    rows.append({"scenario": f"relayout (→ {relayout_type})", "seconds": round(took, 3), "chunks": count,
+                 "chunks_per_s": round(count / took, 1) if took else 0.0})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bilgi bankası kurulum süresi")
+    parser.add_argument("--embedder", default="auto", choices=["auto", "real", "fake"])
+    parser.add_argument("--workdir", help="Çalışma dizini (varsayılan: geçici dizin)")
+    parser.add_argument("--relayout-type", default="hnsw")
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    args = parser.parse_args()
+
+    embedder, label = resolve_embedder(args.embedder)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ayla-build-")
+    try:
+        rows = run_build(workdir, embedder, args.relayout_type)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\nEmbedding: {label}")
+    print_table(rows, ["scenario", "seconds", "chunks", "chunks_per_s"])
+    if args.output:
+        save_report(args.output, {"embedder": label, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
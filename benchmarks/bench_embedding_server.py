@@ -0,0 +1,236 @@
+"""
+Paylaşılan embedding sunucusu ile worker başına model karşılaştırması: N worker process'i
+(gunicorn sync worker'ı gibi her biri aynı anda tek sorgu) arka arkaya sorgu kodlar;
+toplam verim, gecikme ve toplam bellek (PSS) raporlanır.
+
+  per-worker  her worker modeli kendisi yükler (varsayılan davranış)
+  shared      tek sunucu process'i (embedding_server.py, mikro yığınlama) + worker başına EmbeddingClient
+
+    python benchmarks/bench_embedding_server.py [--workers 1,4,16] [--seconds 10]
+
+Gerçek model yerel önbellekte yoksa MiniLM-L12 boyutlarında rastgele ağırlıklı model
+(SyntheticMiniLM) kullanılır; bellek ve hesaplama maliyeti aynıdır. PSS paylaşılan
+kütüphane sayfalarını process'ler arasında böler, toplamı gerçek bellek kullanımıdır.
+Worker başına modellerin tahmini toplamı kullanılabilir belleği aşacaksa senaryo
+çalıştırılmaz ve tahmin yazılır (--vocab ile daha küçük bir sözlük seçilebilir).
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ["AYLA_STARTUP"] = "offline"
+os.environ.setdefault("AYLA_LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_retrieval import load_queries  # noqa: E402
+from common import percentile, print_table, save_report  # noqa: E402
+
+
+def pss_mb(pid: str = "self") -> float:
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def available_mb() -> float:
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) / 1024
+    return float("inf")
+
+
+def make_embedder(kind: str, vocab: int, threads: int):
+    if kind == "fake":
+        from fake_embeddings import HashEmbedder
+
+        return HashEmbedder()
+    import torch
+
+    torch.set_num_threads(threads)
+    if kind == "real":
+        import chatbot
+
+        return chatbot.SentenceEmbedder(threads=threads)
+    if kind == "synthetic":
+        from fake_embeddings import SyntheticMiniLM
+
+        return SyntheticMiniLM(vocab=vocab)
+    raise ValueError(f"Bilinmeyen embedding türü: {kind}")
+
+
+def resolve_kind(kind: str) -> str:
+    """auto: gerçek model yerel önbellekte yüklenebiliyorsa real, değilse synthetic."""
+    if kind != "auto":
+        return kind
+    probe = "import chatbot; chatbot.SentenceEmbedder()"
+    result = subprocess.run([sys.executable, "-c", probe], cwd=os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), env=dict(os.environ, HF_HUB_OFFLINE="1"), capture_output=True)
+    return "real" if result.returncode == 0 else "synthetic"
+
+
+# --- ALT PROCESS'LER ---
+def run_server(socket_path: str, kind: str, vocab: int, threads: int, max_batch: int, max_wait: float):
+    from embedding_server import EmbeddingServer
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    server = EmbeddingServer(make_embedder(kind, vocab, threads), socket_path, max_batch, max_wait)
+    server.serve_forever()
+
+
+def run_worker(mode: str, socket_path: str, kind: str, vocab: int, threads: int):
+    """'ready' yazar, stdin'den süreyi bekler, ölçer, sonucu yazar ve 'exit' bekler."""
+    import chatbot
+
+    if mode == "shared":
+        embedder = chatbot.EmbeddingClient(socket_path)
+        embedder.wait_ready(300)
+    else:
+        embedder = make_embedder(kind, vocab, threads)
+    queries = load_queries()
+    embedder.embed_query(queries[0])
+    print("ready", flush=True)
+    stop = time.monotonic() + float(sys.stdin.readline())
+    latencies, i = [], 0
+    while time.monotonic() < stop:
+        query = f"{queries[i % len(queries)]} ({os.getpid()}-{i})"
+        started = time.perf_counter()
+        embedder.embed_query(query)
+        latencies.append(time.perf_counter() - started)
+        i += 1
+    print(json.dumps({"latencies": latencies}), flush=True)
+    sys.stdin.readline()
+
+
+# --- ÖLÇÜM ---
+def _spawn(*args, stdin=None, stdout=None) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), *args], stdin=stdin, stdout=stdout,
+                            text=True)
+
+
+def _read_line(proc: subprocess.Popen, prefix: str):
+    """Alt process'in stdout'undan prefix ile başlayan ilk satırı okur (başlatma çıktıları atlanır)."""
+    for line in proc.stdout:
+        if line.startswith(prefix):
+            return line
+    return None
+
+
+def measure(mode: str, workers: int, seconds: float, kind: str, vocab: int, max_batch: int,
+            max_wait: float, socket_path: str) -> dict:
+    import chatbot
+
+    cpus = os.cpu_count() or 1
+    server = client = None
+    before = {}
+    if mode == "shared":
+        server = _spawn("--child", "server", "--socket", socket_path, "--embedder", kind, "--vocab", str(vocab),
+                        "--threads", str(cpus), "--max-batch", str(max_batch), "--max-wait-ms", str(max_wait * 1000))
+        client = chatbot.EmbeddingClient(socket_path)
+        client.wait_ready(300)
+    procs = [_spawn("--child", "worker", "--mode", mode, "--socket", socket_path, "--embedder", kind,
+                    "--vocab", str(vocab), "--threads", str(max(1, cpus // workers)),
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE) for _ in range(workers)]
+    try:
+        for proc in procs:
+            if _read_line(proc, "ready") is None:
+                raise RuntimeError("Worker başlatılamadı")
+        if client:
+            before = client.stats()
+        for proc in procs:
+            proc.stdin.write(f"{seconds}\n")
+            proc.stdin.flush()
+        latencies = []
+        for proc in procs:
+            latencies += json.loads(_read_line(proc, "{"))["latencies"]
+        # Bellek tüm process'ler ayaktayken ölçülür (paylaşılan sayfalar aralarında bölünür)
+        worker_mb = sum(pss_mb(proc.pid) for proc in procs)
+        server_mb = pss_mb(server.pid) if server else 0.0
+        stats = client.stats() if client else {}
+    finally:
+        for proc in procs:
+            try:
+                proc.stdin.write("exit\n")
+                proc.stdin.close()
+            except OSError:
+                pass
+            proc.wait(timeout=30)
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+    batches = stats.get("batches", 0) - before.get("batches", 0)
+    texts = stats.get("texts", 0) - before.get("texts", 0)
+    return {"scenario": f"{mode} ×{workers}", "requests": len(latencies),
+            "qps": round(len(latencies) / seconds, 1),
+            "p50_ms": round(1000 * percentile(latencies, 50), 1),
+            "p99_ms": round(1000 * percentile(latencies, 99), 1),
+            "mean_batch": round(texts / batches, 2) if batches else 1.0,
+            "worker_mb": round(worker_mb / workers, 1), "server_mb": round(server_mb, 1),
+            "total_mb": round(worker_mb + server_mb, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paylaşılan embedding sunucusu ve worker başına model")
+    parser.add_argument("--workers", default="1,4,16")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--modes", default="per-worker,shared")
+    parser.add_argument("--embedder", default="auto", choices=["auto", "real", "synthetic", "fake"])
+    parser.add_argument("--vocab", type=int, default=250002, help="SyntheticMiniLM sözlük boyutu")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--socket", help=argparse.SUPPRESS)
+    parser.add_argument("--threads", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == "server":
+        return run_server(args.socket, args.embedder, args.vocab, args.threads, args.max_batch,
+                          args.max_wait_ms / 1000)
+    if args.child == "worker":
+        return run_worker(args.mode, args.socket, args.embedder, args.vocab, args.threads)
+
+    kind = resolve_kind(args.embedder)
+    label = {"real": "gerçek model", "synthetic": f"synthetic MiniLM-L12 (sözlük {args.vocab})",
+             "fake": "hash"}[kind]
+    directory = tempfile.mkdtemp(prefix="ayla-embed-")
+    socket_path = os.path.join(directory, "embed.sock")
+    rows, per_process = [], None
+    try:
+        for mode in args.modes.split(","):
+            for workers in sorted(int(w) for w in args.workers.split(",")):
+                if mode == "per-worker" and per_process and per_process * workers > 0.9 * available_mb():
+                    rows.append({"scenario": f"{mode} ×{workers}", "requests": "atlandı",
+                                 "total_mb": f"~{per_process * workers:.0f}"})
+                    print(f"  − {mode} ×{workers}: tahmini {per_process * workers:.0f} MB, "
+                          f"kullanılabilir bellek {available_mb():.0f} MB")
+                    continue
+                row = measure(mode, workers, args.seconds, kind, args.vocab, args.max_batch,
+                              args.max_wait_ms / 1000, socket_path)
+                if mode == "per-worker":
+                    per_process = row["total_mb"] / workers
+                rows.append(row)
+                print(f"  ✓ {row['scenario']}: {row['qps']} sorgu/sn, {row['total_mb']} MB")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"\nEmbedding: {label}, {os.cpu_count()} CPU, mikro yığın ≤{args.max_batch} metin / "
+          f"{args.max_wait_ms:g} ms")
+    print_table(rows, ["scenario", "requests", "qps", "p50_ms", "p99_ms", "mean_batch", "worker_mb",
+                       "server_mb", "total_mb"])
+    if args.output:
+        save_report(args.output, {"embedder": label, "cpus": os.cpu_count(), "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Embedding çalıştırıcılarını (torch / torch-int8 / onnx / onnx-int8) kodlama hızı ve
+referans (torch fp32) vektörlere göre sapma açısından karşılaştırır.
+
+    python benchmarks/bench_embeddings.py [--backends torch torch-int8 onnx-int8]
+                                          [--batch-size 32] [--threads 4] [--docs 1000]
+
+Belgeler mevcut bilgi bankasının parçalarından (yoksa yönlendirme kümesinden),
+sorgular benchmarks/data/routing_set.jsonl dosyasından alınır. Raporlanan değerler:
+  docs_per_s        toplu kodlama hızı (indeks kurulumu)
+  query_p50/p99_ms  tek sorgu kodlama gecikmesi
+  cos_mean/min      aynı metin için referans vektörle kosinüs benzerliği
+  recall_at_3       referans belge vektörleri üzerinde, referans sorgu sonuçlarıyla örtüşme
+                    (indeks yeniden kurulmadan sorguların bu çalıştırıcıyla kodlanması)
+  self_recall_at_3  belgeler de bu çalıştırıcıyla kodlandığında (yeniden kurulum sonrası)
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ["AYLA_STARTUP"] = "lazy"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import chatbot  # noqa: E402
+from common import percentile, print_table, save_report  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routing_set.jsonl")
+
+
+def load_texts(args) -> tuple:
+    with open(args.queries, encoding="utf-8") as f:
+        queries = [json.loads(line)["text"] for line in f if line.strip()]
+    kb = chatbot.KnowledgeIndex.open()
+    if kb is not None:
+        docs = [kb.text(row) for row in range(min(kb.count, args.docs))]
+    else:
+        print("⚠️ Bilgi bankası bulunamadı, belge olarak sorgu metinleri kullanılıyor")
+        docs = queries
+    return docs, queries
+
+
+def overlap_at_k(doc_vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int) -> float:
+    top = np.argsort(-(queries @ doc_vectors.T), axis=1)[:, :k]
+    hits = sum(len(set(a) & set(b)) for a, b in zip(top.tolist(), truth.tolist()))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding çalıştırıcısı benchmark'ı")
+    parser.add_argument("--backends", nargs="+", default=list(chatbot.SentenceEmbedder.BACKENDS))
+    parser.add_argument("--batch-size", type=int, default=chatbot.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=chatbot.EMBEDDING_THREADS)
+    parser.add_argument("--docs", type=int, default=1000, help="Kodlanacak en fazla belge parçası")
+    parser.add_argument("--queries", default=DATA)
+    parser.add_argument("--model", default=chatbot.EMBEDDING_MODEL)
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    args = parser.parse_args()
+
+    docs, queries = load_texts(args)
+    print(f"{len(docs)} belge, {len(queries)} sorgu; batch={args.batch_size}, threads={args.threads or 'varsayılan'}\n")
+
+    reference = None
+    rows = []
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        try:
+            start = time.perf_counter()
+            embedder = chatbot.SentenceEmbedder(args.model, backend, args.batch_size, args.threads)
+            load_s = time.perf_counter() - start
+        except Exception as e:  # Örn. onnxruntime kurulu değil
+            print(f"⚠️ {backend} atlandı: {e}")
+            continue
+        embedder.embed_documents(docs[:args.batch_size])  # Isınma
+
+        start = time.perf_counter()
+        doc_vectors = embedder.embed_documents(docs)
+        docs_per_s = len(docs) / (time.perf_counter() - start)
+        latencies = []
+        query_vectors = []
+        for query in queries:
+            start = time.perf_counter()
+            query_vectors.append(embedder.embed_query(query))
+            latencies.append(time.perf_counter() - start)
+        query_vectors = np.vstack(query_vectors)
+
+        if reference is None:
+            truth = np.argsort(-(query_vectors @ doc_vectors.T), axis=1)[:, :3]
+            reference = (doc_vectors, query_vectors, truth)
+        ref_docs, ref_queries, truth = reference
+        cosines = np.concatenate([np.sum(doc_vectors * ref_docs, axis=1),
+                                  np.sum(query_vectors * ref_queries, axis=1)])
+        row = {"backend": backend, "load_s": round(load_s, 2), "docs_per_s": round(docs_per_s, 1),
+               "query_p50_ms": round(1000 * percentile(latencies, 50), 2),
+               "query_p99_ms": round(1000 * percentile(latencies, 99), 2),
+               "cos_mean": round(float(cosines.mean()), 4), "cos_min": round(float(cosines.min()), 4),
+               "recall_at_3": round(overlap_at_k(ref_docs, query_vectors, truth, 3), 3),
+               "self_recall_at_3": round(overlap_at_k(doc_vectors, query_vectors, truth, 3), 3)}
+        if backend == "torch" and "torch" not in args.backends:
+            continue  # Yalnızca referans olarak kullanıldı
+        rows.append(row)
+
+    print()
+    print_table(rows, ["backend", "load_s", "docs_per_s", "query_p50_ms", "query_p99_ms",
+                       "cos_mean", "cos_min", "recall_at_3", "self_recall_at_3"])
+    if args.output:
+        save_report(args.output, {"docs": len(docs), "queries": len(queries), "batch_size": args.batch_size,
+                                  "threads": args.threads, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Akış halindeki indeks kurulumunun bellek ve hız ölçümü, sentetik bir PDF korpusuyla:
+her korpus boyutu ayrı bir process'te kurulur ve tepe RSS ile sayfa/sn raporlanır.
+
+  stream   update_vector_db (sayfalar -> parçalar -> sabit yığınlar -> disk)
+  eager    karşılaştırma için eski yol: tüm sayfalar okunup parçalanır, tek seferde gömülür
+
+    python benchmarks/bench_ingest.py [--sizes 100,200,400] [--pages 10] [--workers 1]
+
+ingest_peak_mb FAISS indeksi kurulmadan önceki tepe RSS'tir (okuma + parçalama + gömme +
+diske ekleme); peak_mb indeks kurulumu dahil tepe RSS'tir. Düz (flat) FAISS indeksi
+vektörlerin tamamını bellekte tutar, vectors_mb bu payı gösterir. Korpus geçici
+dizinde üretilir; PDF'ler bilgi bankası PDF'lerinden türetilmiş ASCII metin içerir.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+os.environ["AYLA_STARTUP"] = "offline"
+os.environ.setdefault("AYLA_LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import REPO_ROOT, print_table, save_report  # noqa: E402
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+# --- SENTETİK PDF ---
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: list):
+    """Her sayfası bir satır listesi olan, Helvetica metinli en küçük geçerli PDF'i yazar."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        data = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        " ".join(f"{k} 0 R" for k in kids).encode(), len(kids))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_corpus(directory: str, files: int, pages: int, seed: int = 0) -> list:
+    """Bilgi bankası PDF'lerinin kelimelerinden deterministik sayfalar üretir; dosya yollarını döndürür."""
+    import chatbot
+
+    words = []
+    for name in chatbot.PDF_FILES:
+        path = os.path.join(REPO_ROOT, name)
+        if os.path.exists(path):
+            words += " ".join(t for t, _ in chatbot.extract_chunks(path, 0, 20)).translate(
+                chatbot._ASCII_FOLD).encode("latin-1", "ignore").decode("latin-1").split()
+    words = words or ["kaygi", "dusunce", "duygu", "davranis", "terapi", "farkindalik"]
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(files):
+        document = []
+        for _ in range(pages):
+            lines, line = [], []
+            while len(lines) < 60:
+                line.append(rng.choice(words))
+                if sum(len(w) + 1 for w in line) > 90:
+                    lines.append(" ".join(line))
+                    line = []
+            document.append(lines)
+        path = os.path.join(directory, f"doc_{i:05d}.pdf")
+        write_pdf(path, document)
+        paths.append(path)
+    return paths
+
+
+# --- ÖLÇÜM (alt process) ---
+class RssSampler:
+    """RSS'i /proc/self/statm'den düzenli aralıklarla okuyup tepe değeri tutar (MB)."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current() -> float:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / 2 ** 20
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            time.sleep(self.interval)
+
+    def start(self):
+        self.peak = self.current()
+        self._thread.start()
+        return self
+
+    def stop(self) -> float:
+        self._stop.set()
+        self._thread.join()
+        return max(self.peak, self.current())
+
+
+def measure(mode: str, corpus: list, workers: int, embedder_kind: str) -> dict:
+    import chatbot
+    from fake_embeddings import resolve_embedder
+
+    embedder, label = resolve_embedder(embedder_kind)
+    embedder.embed_documents(["ısınma"])  # Model yüklemesi ölçüme girmesin
+    chatbot.PDF_FILES = corpus
+    root = tempfile.mkdtemp(prefix="ayla-ingest-")
+    baseline = RssSampler.current()
+    sampler = RssSampler().start()
+    marks = {}
+    original_write = chatbot.ArtifactWriter.write
+
+    def write(self, *args, **kwargs):
+        marks["ingest_peak"] = sampler.peak
+        return original_write(self, *args, **kwargs)
+
+    chatbot.ArtifactWriter.write = write
+    started = time.perf_counter()
+    try:
+        if mode == "eager":
+            chunks = [chunk for path in corpus for chunk in chatbot.extract_chunks(path)]
+            vectors = embedder.embed_documents([text for text, _ in chunks])
+            marks["ingest_peak"] = sampler.peak
+            count, dim = len(chunks), vectors.shape[1]
+        else:
+            kb = chatbot.update_vector_db(embedder, workers=workers, root=root)
+            count, dim = kb.count, kb.dim
+        seconds = time.perf_counter() - started
+        peak = sampler.stop()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    pages = chatbot.INGESTED.value("pages") if mode == "stream" else sum(
+        chatbot.pdf_page_count(path) for path in corpus)
+    return {"embedder": label, "pages": pages, "chunks": count, "seconds": round(seconds, 2),
+            "pages_per_s": round(pages / seconds, 1),
+            "baseline_mb": round(baseline, 1),
+            "ingest_peak_mb": round(marks.get("ingest_peak", peak), 1),
+            "peak_mb": round(peak, 1),
+            "vectors_mb": round(count * dim * 4 / 2 ** 20, 1)}
+
+
+def run_child(mode: str, corpus_dir: str, files: int, workers: int, embedder: str) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), "--child", mode, "--corpus", corpus_dir,
+               "--files", str(files), "--workers", str(workers), "--embedder", embedder]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Akış halindeki indeks kurulumu: tepe bellek ve sayfa/sn")
+    parser.add_argument("--sizes", default="100,200,400", help="PDF sayıları (virgülle)")
+    parser.add_argument("--pages", type=int, default=10, help="PDF başına sayfa")
+    parser.add_argument("--workers", type=int, default=1, help="PDF okuma process sayısı")
+    parser.add_argument("--modes", default="stream,eager")
+    parser.add_argument("--embedder", default="fake", choices=["auto", "real", "fake"])
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", help=argparse.SUPPRESS)
+    parser.add_argument("--files", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        corpus = sorted(os.path.join(args.corpus, name) for name in os.listdir(args.corpus))[:args.files]
+        print(json.dumps(measure(args.child, corpus, args.workers, args.embedder)))
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    corpus_dir = tempfile.mkdtemp(prefix="ayla-corpus-")
+    rows = []
+    try:
+        started = time.perf_counter()
+        make_corpus(corpus_dir, max(sizes), args.pages)
+        print(f"Korpus: {max(sizes)} PDF × {args.pages} sayfa ({time.perf_counter() - started:.1f} sn)")
+        for mode in args.modes.split(","):
+            for size in sizes:
+                row = run_child(mode, corpus_dir, size, args.workers, args.embedder)
+                rows.append({"scenario": f"{mode} {size} pdf", **row})
+                print(f"  ✓ {rows[-1]['scenario']}: {row['peak_mb']} MB, {row['pages_per_s']} sayfa/sn")
+    finally:
+        shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    print(f"\nEmbedding: {rows[0]['embedder'] if rows else '-'}, {args.workers} okuma process'i")
+    print_table(rows, ["scenario", "pages", "chunks", "seconds", "pages_per_s", "baseline_mb",
+                       "ingest_peak_mb", "peak_mb", "vectors_mb"])
+    if args.output:
+        save_report(args.output, {"pages_per_pdf": args.pages, "workers": args.workers, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Tek kullanıcılı uçtan uca gecikme: sıralı /chat istekleri ve /chat/stream için
+ilk token süresi (TTFT) ile toplam süre. Gemini yerine yerel sahte sunucu kullanılır.
+
+    python benchmarks/bench_latency.py --latency 0.3 --requests 50 [--embedder auto|real|fake]
+
+Mesajlar yönlendirme kümesinden sırayla alınır (psikoloji mesajları RAG'den geçer).
+Aynı mesaj tekrar edildiğinde önbellekler devreye girer; --unique ile her istek yeni bir
+oturumda ve benzersiz bir ekle gönderilir.
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+os.environ["AYLA_STARTUP"] = "lazy"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_build import prepare_workdir  # noqa: E402
+from common import post_json, print_table, save_report, spawn_app, stop_app, summarize, wait_for_http, wait_for_rag  # noqa: E402
+from fake_embeddings import resolve_embedder  # noqa: E402
+from fake_gemini import FakeGeminiConfig, start_fake_gemini  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routing_set.jsonl")
+
+
+def stream_chat(base_url: str, message: str, timeout: float = 120.0) -> tuple:
+    """/chat/stream isteği atar; (başarılı mı, ilk token süresi, toplam süre) döndürür."""
+    parsed = urlparse(base_url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+    start = time.perf_counter()
+    first_token = None
+    ok = False
+    try:
+        conn.request("POST", "/chat/stream", body=json.dumps({"message": message}).encode("utf-8"),
+                     headers={"Content-Type": "application/json"})
+        res = conn.getresponse()
+        if res.status != 200:
+            return False, 0.0, time.perf_counter() - start
+        for line in res:
+            if line.startswith(b"event: token") and first_token is None:
+                first_token = time.perf_counter() - start
+            elif line.startswith(b"event: done"):
+                ok = True
+            elif line.startswith(b"event: error"):
+                ok = False
+                break
+    finally:
+        conn.close()
+    return ok, first_token or 0.0, time.perf_counter() - start
+
+
+def run_latency(base_url: str, messages: list, requests: int) -> list:
+    chat, ttft, stream_total = [], [], []
+    errors = {"chat": 0, "stream": 0}
+    start = time.perf_counter()
+    for i in range(requests):
+        t = time.perf_counter()
+        status, _ = post_json(base_url, "/chat", {"message": messages[i % len(messages)]})
+        if status == 200:
+            chat.append(time.perf_counter() - t)
+        else:
+            errors["chat"] += 1
+    chat_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(requests):
+        ok, first, total = stream_chat(base_url, messages[i % len(messages)])
+        if ok:
+            ttft.append(first)
+            stream_total.append(total)
+        else:
+            errors["stream"] += 1
+    stream_elapsed = time.perf_counter() - start
+    return [{"scenario": "chat", **summarize(chat, chat_elapsed, errors["chat"])},
+            {"scenario": "stream_ttft", **summarize(ttft, stream_elapsed, errors["stream"])},
+            {"scenario": "stream_total", **summarize(stream_total, stream_elapsed, errors["stream"])}]
+
+
+def server_env(fake_url: str, embedder_label: str) -> dict:
+    """Benchmark sunucusu için ortam: sahte Gemini, ağsız embedding, ilk istekte yükleme."""
+    env = {"GEMINI_API_KEY": "fake-key", "GEMINI_BASE_URL": fake_url, "AYLA_STARTUP": "lazy",
+           "HF_HUB_OFFLINE": "1"}
+    if embedder_label == "hash":
+        env["AYLA_BENCH_FAKE_EMBEDDINGS"] = "1"
+    return env
+
+
+def load_messages(path: str = DATA, unique: bool = False) -> list:
+    with open(path, encoding="utf-8") as f:
+        messages = [json.loads(line)["text"] for line in f if line.strip()]
+    if unique:
+        messages = [f"{m} ({i})" for i, m in enumerate(messages * 10)]
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tek kullanıcılı uçtan uca gecikme")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.3, help="Sahte Gemini gecikmesi (saniye)")
+    parser.add_argument("--mode", default="sync", choices=["sync", "async"])
+    parser.add_argument("--embedder", default="auto", choices=["auto", "real", "fake"])
+    parser.add_argument("--unique", action="store_true", help="Önbellekleri atlatmak için benzersiz mesajlar")
+    parser.add_argument("--port", type=int, default=5057)
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    args = parser.parse_args()
+
+    embedder, label = resolve_embedder(args.embedder)
+    workdir = tempfile.mkdtemp(prefix="ayla-latency-")
+    fake, fake_url = start_fake_gemini(FakeGeminiConfig(latency=args.latency))
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        prepare_workdir(workdir, embedder)
+        proc = spawn_app(args.mode, args.port, env=server_env(fake_url, label), cwd=workdir)
+        try:
+            wait_for_http(f"{base_url}/health", proc=proc)
+            rag_state = wait_for_rag(base_url, proc=proc)
+            rows = run_latency(base_url, load_messages(unique=args.unique), args.requests)
+        finally:
+            stop_app(proc)
+    finally:
+        fake.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\nEmbedding: {label}, rag_state: {rag_state}, sahte Gemini gecikmesi: {args.latency} sn")
+    print_table(rows, ["scenario", "count", "errors", "rps", "p50_ms", "p95_ms", "p99_ms"])
+    if args.output:
+        save_report(args.output, {"embedder": label, "latency": args.latency, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
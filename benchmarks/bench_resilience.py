@@ -0,0 +1,115 @@
+"""
+Gemini erişim katmanının (GeminiGateway) arıza senaryoları, ağ erişimi olmadan:
+sahte Gemini sunucusuna çalışırken arıza enjekte edilir ve eşzamanlı kullanıcıların
+gördüğü gecikme, hata ve Gemini'ye giden istek sayısı ölçülür.
+
+  brownout  tüm istekler 503 döner; devre kesici açık/kapalı karşılaştırılır
+  recovery  kesinti biter; devrenin half-open yoklamasıyla yeniden kapanması
+  tail      isteklerin bir kısmı çok yavaş; hedging açık/kapalı karşılaştırılır
+
+    python benchmarks/bench_resilience.py [--users 16] [--phase-seconds 6]
+
+Süreç içinde generate_response çağrılır (bilgi bankası yüklenmez).
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import percentile, print_table, save_report  # noqa: E402
+from fake_gemini import FakeGeminiConfig, start_fake_gemini  # noqa: E402
+
+fake, fake_url = start_fake_gemini(FakeGeminiConfig(latency=0.1, jitter=0.05, tokens=20))
+os.environ.update({"GEMINI_API_KEY": "fake-key", "GEMINI_BASE_URL": fake_url, "AYLA_STARTUP": "lazy",
+                   "AYLA_LOG_LEVEL": os.environ.get("AYLA_LOG_LEVEL", "CRITICAL")})
+
+import chatbot  # noqa: E402
+
+FAST_FAILS = (chatbot.CIRCUIT_OPEN_MESSAGE, chatbot.BUSY_MESSAGE)
+
+
+def run_phase(name: str, users: int, seconds: float, **gateway) -> dict:
+    """'seconds' boyunca 'users' kullanıcı arka arkaya soru sorar."""
+    if gateway:
+        chatbot.gemini = chatbot.GeminiGateway(**gateway)
+    latencies, outcomes = [], {"ok": 0, "fast_fail": 0, "error": 0}
+    lock = threading.Lock()
+    before = fake.stats.snapshot()["requests"]
+    stop = time.monotonic() + seconds
+
+    def user(index: int):
+        turn = 0
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            answer = chatbot.generate_response(f"Bugün nasılsın? ({index}-{turn})", f"bench-{index}-{turn}")
+            took = time.perf_counter() - start
+            outcome = "fast_fail" if answer in FAST_FAILS else \
+                "error" if answer in chatbot._FAILED_ANSWERS else "ok"
+            with lock:
+                latencies.append(took)
+                outcomes[outcome] += 1
+            turn += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    elapsed = time.perf_counter() - started
+    return {"scenario": name, **outcomes,
+            "upstream": fake.stats.snapshot()["requests"] - before,
+            "rps": round(sum(outcomes.values()) / elapsed, 1),
+            "p50_ms": round(1000 * percentile(latencies, 50), 1),
+            "p99_ms": round(1000 * percentile(latencies, 99), 1),
+            "breaker": chatbot.gemini.breaker.state}
+
+
+def run_resilience(users: int, seconds: float) -> list:
+    rows = []
+    threshold = chatbot.BREAKER_FAILURES
+    # Devre kesici kapalı: eşik hiç aşılmaz
+    for label, failures in (("breaker off", 10 ** 9), ("breaker on", threshold)):
+        chatbot.BREAKER_FAILURES = failures
+        fake.configure(error_rate=0.0, slow_rate=0.0)
+        rows.append(run_phase(f"healthy ({label})", users, seconds / 2, hedge=False))
+        fake.configure(error_rate=1.0)
+        rows.append(run_phase(f"brownout ({label})", users, seconds))
+        fake.configure(error_rate=0.0)
+        rows.append(run_phase(f"recovery ({label})", users, seconds + chatbot.BREAKER_RESET))
+
+    for label, hedge in (("hedge off", False), ("hedge on", True)):
+        fake.configure(error_rate=0.0, slow_rate=0.0)
+        rows.append(run_phase(f"warmup ({label})", users, seconds / 2, hedge=hedge))
+        fake.configure(slow_rate=0.05, slow_latency=2.0)
+        rows.append(run_phase(f"tail ({label})", users, seconds))
+    fake.configure(slow_rate=0.0)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini erişim katmanı arıza senaryoları")
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--phase-seconds", type=float, default=6.0)
+    parser.add_argument("--breaker-reset", type=float, default=2.0, help="Devrenin açık kalma süresi")
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    args = parser.parse_args()
+
+    chatbot.BREAKER_RESET = args.breaker_reset
+    chatbot.GEMINI_DEADLINE = 8.0
+    try:
+        rows = run_resilience(args.users, args.phase_seconds)
+    finally:
+        fake.shutdown()
+
+    print(f"\n{args.users} kullanıcı, aşama başına ~{args.phase_seconds:g} sn "
+          "(upstream: sahte Gemini'ye giden istek sayısı)")
+    print_table(rows, ["scenario", "ok", "fast_fail", "error", "upstream", "rps", "p50_ms", "p99_ms", "breaker"])
+    if args.output:
+        save_report(args.output, {"users": args.users, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
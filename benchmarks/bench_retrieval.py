@@ -0,0 +1,101 @@
+"""
+Arama hattının aşamalarını süreç içinde, sunucu ve Gemini olmadan ölçer:
+yönlendirme, BM25, sorgu kodlama, FAISS araması ve önbellekli/önbelleksiz retrieve().
+
+    python benchmarks/bench_retrieval.py [--embedder auto|real|fake] [--repeat 5]
+
+Sorgular benchmarks/data/routing_set.jsonl dosyasındaki psikoloji mesajlarıdır.
+Bilgi bankası geçici bir çalışma dizininde kurulur (bkz. bench_build.py).
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ["AYLA_STARTUP"] = "lazy"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chatbot  # noqa: E402
+from bench_build import prepare_workdir  # noqa: E402
+from common import percentile, print_table, save_report  # noqa: E402
+from fake_embeddings import resolve_embedder  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routing_set.jsonl")
+
+
+def measure(name: str, fn, inputs: list, repeat: int, before=None) -> dict:
+    """fn'i her girdi için 'repeat' kez çağırır; çağrı başına gecikme yüzdelikleri (µs)."""
+    latencies = []
+    for _ in range(repeat):
+        for item in inputs:
+            if before:
+                before()
+            start = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - start)
+    return {"stage": name, "calls": len(latencies),
+            "p50_us": round(1e6 * percentile(latencies, 50), 1),
+            "p95_us": round(1e6 * percentile(latencies, 95), 1),
+            "p99_us": round(1e6 * percentile(latencies, 99), 1),
+            "ops_per_s": round(len(latencies) / sum(latencies), 1) if latencies else 0.0}
+
+
+def run_retrieval(kb, embedder, queries: list, repeat: int) -> list:
+    chatbot.vector_db = kb
+    chatbot.embedder = embedder
+    chatbot.invalidate_retrieval_caches()
+    vectors = {q: chatbot.embed_query(q) for q in queries}
+    rows = [
+        measure("router", chatbot.topic_router.route, queries, repeat * 10),
+        measure("embed_query (önbelleksiz)", embedder.embed_query, queries, repeat),
+        measure("faiss_search k=3", lambda q: kb.search(vectors[q], 3), queries, repeat * 10),
+    ]
+    if kb.lexical is not None:
+        rows.append(measure("bm25_search k=10", lambda q: kb.lexical.search(chatbot.lexical_terms(q), 10),
+                            queries, repeat * 10))
+    rows.append(measure("retrieve (soğuk)", lambda q: chatbot.retrieve(q, 3), queries, repeat,
+                        before=chatbot.invalidate_retrieval_caches))
+    for query in queries:
+        chatbot.retrieve(query, 3)  # Önbelleği doldur
+    rows += [
+        measure("retrieve (sıcak)", lambda q: chatbot.retrieve(q, 3), queries, repeat * 10),
+        measure("get_context_if_relevant (sıcak)", chatbot.get_context_if_relevant, queries, repeat * 10),
+    ]
+    return rows
+
+
+def load_queries(path: str = DATA) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [s["text"] for s in map(json.loads, filter(str.strip, f)) if s["psi"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arama hattı mikro benchmark'ı")
+    parser.add_argument("--embedder", default="auto", choices=["auto", "real", "fake"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workdir", help="Hazır çalışma dizini (varsayılan: geçici dizinde kurulur)")
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    args = parser.parse_args()
+
+    embedder, label = resolve_embedder(args.embedder)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ayla-retrieval-")
+    try:
+        kb = prepare_workdir(workdir, embedder, fresh=not args.workdir)
+        rows = run_retrieval(kb, embedder, load_queries(), args.repeat)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\nEmbedding: {label}, {kb.count} parça, arama modu: {chatbot.RETRIEVAL_MODE}")
+    print(f"Arama yolları: {chatbot.retrieval_paths}")
+    print_table(rows, ["stage", "calls", "p50_us", "p95_us", "p99_us", "ops_per_s"])
+    if args.output:
+        save_report(args.output, {"embedder": label, "chunks": kb.count, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
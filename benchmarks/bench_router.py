@@ -0,0 +1,99 @@
+"""
+Konu yönlendiricisinin doğruluğunu (precision/recall) ve hızını, etiketli
+yönlendirme kümesi üzerinde eski alt-dize taramasıyla karşılaştırır.
+
+    python benchmarks/bench_router.py [--centroid 0.35] [--repeat 2000]
+
+--centroid verilirse bilgi bankası yüklenir ve anahtar kelime içermeyen
+mesajlar için merkez (centroid) benzerliği yedeği de ölçülür.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ["AYLA_STARTUP"] = "lazy"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chatbot  # noqa: E402
+from common import print_table, save_report  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routing_set.jsonl")
+
+
+def legacy_route(query: str) -> bool:
+    """Eski davranış: her çağrıda liste + str.lower() alt-dize taraması."""
+    query_lower = query.lower()
+    return any(kw in query_lower for kw in chatbot.PSI_KEYWORDS)
+
+
+def evaluate(name: str, route, samples, repeat: int) -> tuple:
+    tp = fp = fn = tn = 0
+    errors = []
+    for sample in samples:
+        predicted = route(sample["text"])
+        if predicted and sample["psi"]:
+            tp += 1
+        elif predicted:
+            fp += 1
+            errors.append(("FP", sample["text"]))
+        elif sample["psi"]:
+            fn += 1
+            errors.append(("FN", sample["text"]))
+        else:
+            tn += 1
+
+    texts = [s["text"] for s in samples]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            route(text)
+    per_query_us = 1e6 * (time.perf_counter() - start) / (repeat * len(texts))
+
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    row = {"router": name, "precision": round(precision, 3), "recall": round(recall, 3),
+           "f1": round(f1, 3), "accuracy": round((tp + tn) / len(samples), 3),
+           "us_per_query": round(per_query_us, 2)}
+    return row, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Konu yönlendirici benchmark'ı")
+    parser.add_argument("--data", default=DATA)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--centroid", type=float, default=0.0, help="Merkez benzerliği eşiği (0: kapalı)")
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    args = parser.parse_args()
+
+    with open(args.data, encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+
+    router = chatbot.TopicRouter(chatbot.PSI_KEYWORDS)
+    candidates = [("legacy_substring", legacy_route, args.repeat),
+                  ("compiled_regex", router.route, args.repeat)]
+    if args.centroid:
+        chatbot.load_knowledge_base()
+        hybrid = chatbot.TopicRouter(chatbot.PSI_KEYWORDS, args.centroid)
+        hybrid.set_centroid(chatbot.vector_db.vectors if chatbot.vector_db else None)
+        candidates.append(("compiled_regex+centroid", hybrid.route, max(1, args.repeat // 100)))
+
+    rows = []
+    for name, route, repeat in candidates:
+        row, errors = evaluate(name, route, samples, repeat)
+        rows.append(row)
+        print(f"\n{name}: {len(errors)} hata")
+        for kind, text in errors:
+            print(f"  {kind}  {text}")
+
+    print()
+    print_table(rows, ["router", "precision", "recall", "f1", "accuracy", "us_per_query"])
+    if args.output:
+        save_report(args.output, {"samples": len(samples), "results": rows})
+
+
+if __name__ == "__main__":
+    main()
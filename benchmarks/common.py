@@ -0,0 +1,168 @@
+"""Benchmark betiklerinin ortak yardımcıları (yalnızca standart kütüphane)."""
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, p: float) -> float:
+    """Doğrusal ara değerlemeli yüzdelik (p: 0-100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(latencies, elapsed: float, errors: int = 0) -> dict:
+    """Gecikme listesinden (saniye) p50/p95/p99 ve istek/sn özeti üretir."""
+    count = len(latencies)
+    return {
+        "count": count,
+        "errors": errors,
+        "rps": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(1000 * sum(latencies) / count, 2) if count else 0.0,
+        "p50_ms": round(1000 * percentile(latencies, 50), 2),
+        "p95_ms": round(1000 * percentile(latencies, 95), 2),
+        "p99_ms": round(1000 * percentile(latencies, 99), 2),
+    }
+
+
+def print_table(rows, columns):
+    """Sözlük listesini sabit genişlikli tablo olarak basar."""
+    widths = [max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
+
+
+def wait_for_http(url: str, timeout: float = 300.0, proc=None):
+    """URL 200 dönene kadar bekler."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"Sunucu erken kapandı (kod {proc.returncode})")
+        try:
+            with urllib.request.urlopen(url, timeout=2) as res:
+                if res.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} {timeout} saniyede hazır olmadı")
+
+
+def spawn_app(mode: str, port: int, workers: int = 1, threads: int = 1, env: dict = None,
+              log_path: str = None, cwd: str = None) -> subprocess.Popen:
+    """
+    Uygulamayı gunicorn ile ayrı bir process olarak başlatır.
+    mode: 'sync' (chatbot:app, sync worker) veya 'async' (chatbot:asgi_app, uvicorn worker).
+    cwd: PDF'lerin ve faiss_index/ klasörünün arandığı çalışma dizini (varsayılan: depo kökü).
+    """
+    cmd = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+           "--workers", str(workers), "--timeout", "120", "--pythonpath", REPO_ROOT,
+           "-c", os.path.join(REPO_ROOT, "benchmarks", "gunicorn_bench.py")]
+    if mode == "sync":
+        cmd += ["--threads", str(threads), "chatbot:app"]
+    elif mode == "async":
+        cmd += ["-k", "uvicorn.workers.UvicornWorker", "chatbot:asgi_app"]
+    else:
+        raise ValueError(f"Bilinmeyen mod: {mode}")
+    full_env = {**os.environ, "PYTHONUNBUFFERED": "1", **(env or {})}
+    out = open(log_path, "w") if log_path else subprocess.DEVNULL
+    return subprocess.Popen(cmd, cwd=cwd or REPO_ROOT, env=full_env, stdout=out, stderr=subprocess.STDOUT)
+
+
+def stop_app(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def post_json(base_url: str, path: str, payload: dict, timeout: float = 120.0) -> tuple:
+    """Tek bir JSON POST isteği atar; (durum kodu, gövde) döndürür."""
+    parsed = urlparse(base_url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+    try:
+        body = json.dumps(payload).encode("utf-8")
+        conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+        res = conn.getresponse()
+        return res.status, res.read()
+    finally:
+        conn.close()
+
+
+def run_concurrent(request_fn, concurrency: int, total: int) -> dict:
+    """
+    request_fn'i 'concurrency' iş parçacığıyla toplam 'total' kez çağırır.
+    request_fn(i) başarılıysa True döndürmelidir.
+    """
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                ok = request_fn(i)
+            except Exception:
+                ok = False
+            took = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(took)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, time.perf_counter() - start, errors[0])
+
+
+def get_json(url: str, timeout: float = 2.0):
+    """GET isteğinin JSON gövdesi; hata durumunda None."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as res:
+            return json.loads(res.read())
+    except (OSError, ValueError):
+        return None
+
+
+def wait_for_rag(base_url: str, timeout: float = 600.0, proc=None) -> str:
+    """Bilgi bankası yüklemesi bitene kadar bekler; son rag_state değerini döndürür."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"Sunucu erken kapandı (kod {proc.returncode})")
+        state = (get_json(f"{base_url}/health") or {}).get("rag_state")
+        if state in ("ready", "failed"):
+            return state
+        time.sleep(0.2)
+    raise TimeoutError(f"Bilgi bankası {timeout} saniyede yüklenmedi")
+
+
+def save_report(path: str, report: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"📄 Rapor kaydedildi: {path}")
@@ -0,0 +1,92 @@
+"""
+İki run_suite.py raporunu karşılaştırır: her ölçüm için eski/yeni değer ve değişim yüzdesi.
+
+    python benchmarks/compare.py benchmarks/results/eski.json benchmarks/results/yeni.json
+    python benchmarks/compare.py eski.json yeni.json --threshold 10 --fail-on-regression
+
+Gecikme ve süre ölçümlerinde (…_ms, …_us, seconds) artış, verim ölçümlerinde
+(rps, ops_per_s, chunks_per_s) azalış kötüleşme sayılır. Eşiği aşan kötüleşmeler
+işaretlenir; --fail-on-regression ile çıkış kodu 1 olur (CI için).
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import print_table  # noqa: E402
+
+LOWER_IS_BETTER = ("_ms", "_us", "seconds")
+HIGHER_IS_BETTER = ("rps", "ops_per_s", "chunks_per_s")
+# Satırı tanımlayan (ölçüm olmayan) alanlar
+KEY_FIELDS = ("scenario", "stage", "mode", "workers", "concurrency")
+
+
+def _direction(metric: str) -> int:
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    if metric in HIGHER_IS_BETTER:
+        return 1
+    return 0
+
+
+def flatten(report: dict) -> dict:
+    """{(senaryo, satır kimliği, ölçüm): değer} sözlüğü."""
+    values = {}
+    for scenario, rows in report.get("scenarios", {}).items():
+        for row in rows:
+            row_id = " ".join(f"{k}={row[k]}" if k in ("workers", "concurrency") else str(row[k])
+                              for k in KEY_FIELDS if k in row)
+            for metric, value in row.items():
+                if _direction(metric) and isinstance(value, (int, float)):
+                    values[(scenario, row_id, metric)] = value
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark raporlarını karşılaştırır")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Kötüleşme eşiği (yüzde)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+
+    base_meta, head_meta = base.get("meta", {}), head.get("meta", {})
+    print(f"eski: {base_meta.get('commit')} ({base_meta.get('timestamp')})")
+    print(f"yeni: {head_meta.get('commit')} ({head_meta.get('timestamp')})")
+    for field in ("embedder", "gemini_latency", "gemini_error_rate", "cpus", "quick"):
+        if base_meta.get(field) != head_meta.get(field):
+            print(f"⚠️ Koşullar farklı: {field} = {base_meta.get(field)} → {head_meta.get(field)}")
+
+    old, new = flatten(base), flatten(head)
+    rows, regressions = [], 0
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        change = 100.0 * (after - before) / before if before else 0.0
+        worse = -_direction(key[2]) * change
+        flag = ""
+        if worse > args.threshold:
+            flag = "▼ kötüleşti"
+            regressions += 1
+        elif worse < -args.threshold:
+            flag = "▲ iyileşti"
+        rows.append({"scenario": key[0], "row": key[1], "metric": key[2], "base": before, "head": after,
+                     "change": f"{change:+.1f}%", "": flag})
+    print()
+    print_table(rows, ["scenario", "row", "metric", "base", "head", "change", ""])
+    missing = sorted({k[:2] for k in old.keys() ^ new.keys()})
+    if missing:
+        print(f"\nYalnızca bir raporda olan satırlar: {len(missing)}")
+    print(f"\n{regressions} ölçüm %{args.threshold:g} eşiğinden fazla kötüleşti")
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Parçalama ve k ayarlarını etiketli Türkçe sorgu setiyle karşılaştıran çevrimdışı değerlendirme:
+her (chunk_size, chunk_overlap) için bilgi bankası kurulur, her k için sorgular aranır.
+
+    python benchmarks/eval_retrieval.py [--chunk-sizes 400,800,1200] [--overlaps 0,150] [--k 1,3,5]
+
+Sorgular benchmarks/data/retrieval_set.jsonl dosyasındadır; her sorgunun "relevant" alanı
+PDF adı -> ilgili sayfalar (0'dan başlayan) eşlemesidir. Bir sorgu, getirilen parçalardan
+biri ilgili sayfalardan geliyorsa isabet sayılır.
+
+  hit_rate         ilk k parçada ilgili sayfa bulunan sorguların oranı
+  mrr              ilk ilgili parçanın sırasının tersi (ortalama)
+  packed_hit_rate  pack_context sonrası prompt'a giren pasajlarda ilgili sayfa oranı
+  context_tokens   getirilen k parçanın tahmini token toplamı (ortalama)
+  packed_tokens    prompt'a giren bağlamın token'ı (AYLA_PROMPT_CONTEXT_TOKENS bütçesiyle)
+  p50_ms / p95_ms  önbelleksiz retrieve() gecikmesi
+
+Sayfa metinleri ilk kurulumda çalışma dizinindeki sayfa önbelleğine (faiss_index/pages/)
+yazılır; sonraki ayarlar PDF'leri yeniden ayrıştırmadan yalnızca yeniden parçalanıp gömülür.
+--workdir verilirse önbellek çalıştırmalar arasında da korunur. Sonuçlar embedding'e
+bağlıdır: HashEmbedder anlamsal değildir, Türkçe sorgular İngilizce PDF'leri bulamaz.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ["AYLA_STARTUP"] = "offline"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chatbot  # noqa: E402
+from bench_build import prepare_workdir  # noqa: E402
+from common import percentile, print_table, save_report  # noqa: E402
+from fake_embeddings import resolve_embedder  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "retrieval_set.jsonl")
+
+
+def load_labeled(path: str = DATA) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _relevant(sample: dict, source: str, page: int) -> bool:
+    return page in sample["relevant"].get(os.path.basename(source), ())
+
+
+def evaluate(kb, samples: list, k: int) -> dict:
+    """Her sorguyu önbelleksiz arar; isabet, sıra, token ve gecikme ortalamalarını döndürür."""
+    hits = packed_hits = 0
+    reciprocal, context_tokens, packed_tokens, latencies = 0.0, 0, 0, []
+    for sample in samples:
+        chatbot.invalidate_retrieval_caches()
+        start = time.perf_counter()
+        docs = chatbot.retrieve(sample["text"], k)
+        latencies.append(time.perf_counter() - start)
+        rank = next((i for i, d in enumerate(docs, 1) if _relevant(sample, d.source, d.page)), None)
+        if rank:
+            hits += 1
+            reciprocal += 1 / rank
+        context_tokens += sum(chatbot.estimate_tokens(d.text) for d in docs)
+        if docs:
+            passages = chatbot.pack_context(kb, docs, chatbot.PROMPT_CONTEXT_TOKENS)
+            packed_tokens += sum(p.tokens for p in passages)
+            packed_hits += any(_relevant(sample, kb.source(row), kb.page(row))
+                               for p in passages for row in p.rows)
+    n = len(samples)
+    return {"hit_rate": round(hits / n, 3), "mrr": round(reciprocal / n, 3),
+            "packed_hit_rate": round(packed_hits / n, 3),
+            "context_tokens": round(context_tokens / n, 1), "packed_tokens": round(packed_tokens / n, 1),
+            "p50_ms": round(1000 * percentile(latencies, 50), 2),
+            "p95_ms": round(1000 * percentile(latencies, 95), 2)}
+
+
+def run_sweep(workdir: str, embedder, samples: list, sizes: list, overlaps: list, ks: list,
+              fresh: bool = True) -> tuple:
+    """(değerlendirme satırları, kurulum satırları) döndürür."""
+    rows, builds = [], []
+    chatbot.embedder = embedder
+    for size in sizes:
+        for overlap in overlaps:
+            if overlap >= size:
+                continue
+            chatbot.CHUNK_SIZE, chatbot.CHUNK_OVERLAP = size, overlap
+            cached = chatbot.INGESTED.value("cached_pages")
+            started = time.perf_counter()
+            kb = prepare_workdir(workdir, embedder, fresh=fresh)
+            builds.append({"chunk_size": size, "chunk_overlap": overlap, "chunks": kb.count,
+                           "build_s": round(time.perf_counter() - started, 2),
+                           "cached_pages": chatbot.INGESTED.value("cached_pages") - cached})
+            fresh = False
+            chatbot.vector_db = kb
+            for k in ks:
+                rows.append({"chunk_size": size, "chunk_overlap": overlap, "k": k, **evaluate(kb, samples, k)})
+                print(f"  ✓ chunk_size={size} overlap={overlap} k={k}: hit_rate {rows[-1]['hit_rate']}")
+    return rows, builds
+
+
+def _ints(value: str) -> list:
+    return [int(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parçalama ve k ayarlarının arama kalitesine etkisi")
+    parser.add_argument("--chunk-sizes", default="400,800,1200")
+    parser.add_argument("--overlaps", default="0,150")
+    parser.add_argument("--k", default="1,3,5")
+    parser.add_argument("--embedder", default="auto", choices=["auto", "real", "fake"])
+    parser.add_argument("--data", default=DATA, help="Etiketli sorgu seti (JSONL)")
+    parser.add_argument("--workdir", help="Çalışma dizini; sayfa önbelleği korunur (varsayılan: geçici dizin)")
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    args = parser.parse_args()
+
+    embedder, label = resolve_embedder(args.embedder)
+    samples = load_labeled(args.data)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ayla-eval-")
+    try:
+        rows, builds = run_sweep(workdir, embedder, samples, _ints(args.chunk_sizes), _ints(args.overlaps),
+                                 _ints(args.k), fresh=not args.workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\nEmbedding: {label}, {len(samples)} sorgu, arama modu: {chatbot.RETRIEVAL_MODE}, "
+          f"bağlam bütçesi {chatbot.PROMPT_CONTEXT_TOKENS} token")
+    print_table(builds, ["chunk_size", "chunk_overlap", "chunks", "build_s", "cached_pages"])
+    print()
+    print_table(rows, ["chunk_size", "chunk_overlap", "k", "hit_rate", "mrr", "packed_hit_rate",
+                       "context_tokens", "packed_tokens", "p50_ms", "p95_ms"])
+    if args.output:
+        save_report(args.output, {"embedder": label, "queries": len(samples), "mode": chatbot.RETRIEVAL_MODE,
+                                  "builds": builds, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
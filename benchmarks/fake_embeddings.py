@@ -0,0 +1,107 @@
+"""
+Ağ erişimi olmadan benchmark çalıştırmak için embedding yardımcıları.
+
+Gerçek model (sentence-transformers) yerel Hugging Face önbelleğinde varsa o kullanılır;
+yoksa HashEmbedder devreye girer. HashEmbedder anlamsal değildir, yalnızca kelime ve
+harf üçlülerini sabit boyutlu, normalize bir vektöre katlar: arama hattının (BM25, FAISS,
+önbellekler) maliyetini ölçmeye yeter, kodlayıcı maliyetini ölçmez. Raporlar hangi
+embedding'in kullanıldığını yazar; farklı embedding'li raporlar karşılaştırılmamalıdır.
+"""
+import os
+import zlib
+
+import numpy as np
+
+
+class HashEmbedder:
+    """Deterministik, ağ gerektirmeyen sahte embedding (LangChain Embeddings arayüzü)."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                vector[zlib.crc32(padded[i:i + 3].encode("utf-8")) % self.dim] += 0.3
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: list) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self._vector(t) for t in texts])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._vector(text)
+
+
+class SyntheticMiniLM:
+    """
+    paraphrase-multilingual-MiniLM-L12-v2 boyutlarında (12 katman, 384 boyut, 250k sözlük)
+    rastgele ağırlıklı BERT. Gerçek modelle aynı bellek ve hesaplama maliyetine sahiptir ama
+    vektörleri anlamsızdır; model indirilemediğinde bellek/verim ölçümleri için kullanılır.
+    Kelimeler WordPiece yerine crc32 ile sözlüğe katlanır.
+    """
+
+    backend = "synthetic"
+
+    def __init__(self, vocab: int = 250002, layers: int = 12, dim: int = 384, max_tokens: int = 128):
+        import torch
+        from transformers import BertConfig, BertModel
+
+        torch.manual_seed(0)
+        config = BertConfig(vocab_size=vocab, hidden_size=dim, num_hidden_layers=layers,
+                            num_attention_heads=12, intermediate_size=4 * dim, max_position_embeddings=512)
+        self.model = BertModel(config).eval()
+        self.vocab = vocab
+        self.dim = dim
+        self.max_tokens = max_tokens
+        self._torch = torch
+
+    def _ids(self, text: str) -> list:
+        words = [zlib.crc32(w.encode("utf-8")) % (self.vocab - 3) + 3 for w in text.lower().split()]
+        return [1] + words[:self.max_tokens - 2] + [2]
+
+    def embed_documents(self, texts: list) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        torch = self._torch
+        ids = [self._ids(t) for t in texts]
+        width = max(len(i) for i in ids)
+        input_ids = torch.zeros((len(ids), width), dtype=torch.long)
+        mask = torch.zeros((len(ids), width), dtype=torch.long)
+        for row, tokens in enumerate(ids):
+            input_ids[row, :len(tokens)] = torch.tensor(tokens)
+            mask[row, :len(tokens)] = 1
+        with torch.inference_mode():
+            hidden = self.model(input_ids=input_ids, attention_mask=mask).last_hidden_state
+            pooled = (hidden * mask.unsqueeze(-1)).sum(1) / mask.sum(1, keepdim=True)
+            pooled = torch.nn.functional.normalize(pooled, dim=1)
+        return pooled.numpy().astype(np.float32)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
+
+
+def resolve_embedder(kind: str = "auto") -> tuple:
+    """
+    kind: real (yerel önbellekteki gerçek model), fake (HashEmbedder), synthetic
+    (SyntheticMiniLM) veya auto. (embedder, etiket) döndürür.
+    """
+    import chatbot
+
+    if kind == "synthetic":
+        return SyntheticMiniLM(), "synthetic MiniLM-L12 (rastgele ağırlık)"
+    if kind in ("auto", "real"):
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        try:
+            embedder = chatbot.SentenceEmbedder()
+            return embedder, f"{chatbot.EMBEDDING_MODEL} ({chatbot.EMBEDDING_BACKEND})"
+        except Exception as e:
+            if kind == "real":
+                raise
+            print(f"⚠️ Gerçek embedding modeli yüklenemedi ({type(e).__name__}), HashEmbedder kullanılıyor")
+    return HashEmbedder(), "hash"
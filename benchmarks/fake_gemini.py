@@ -0,0 +1,205 @@
+"""
+Gemini `generateContent` / `streamGenerateContent` uç noktalarının yerel taklidi.
+
+Ağ erişimi ve API anahtarı olmadan yük testi yapmak için kullanılır:
+
+    python benchmarks/fake_gemini.py --port 8765 --latency 0.5 --error-rate 0.1
+    GEMINI_API_KEY=fake GEMINI_BASE_URL=http://127.0.0.1:8765 python chatbot.py
+
+Arıza enjeksiyonu çalışırken değiştirilebilir (ör. kesinti başlatıp bitirmek için):
+
+    curl -X POST localhost:8765/config -d '{"error_rate": 1.0}'
+
+Yalnızca Python standart kütüphanesini kullanır.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ["merhaba", "bugün", "nefes", "al", "ve", "sakin", "ol", "düşüncelerini",
+         "fark", "et", "kendine", "iyi", "bak", "😊"]
+
+
+@dataclass
+class FakeGeminiConfig:
+    latency: float = 0.5         # İlk token'a kadar geçen süre (saniye)
+    jitter: float = 0.0          # Gecikmeye eklenen rastgele süre (0..jitter)
+    token_interval: float = 0.0  # Akışta parçalar arası süre (saniye/parça)
+    tokens: int = 60             # Yanıttaki kelime (token) sayısı
+    chunk_tokens: int = 8        # Akışta bir parçadaki kelime sayısı
+    error_rate: float = 0.0      # 503 dönen isteklerin oranı (0..1)
+    seed: int = 0
+    slow_rate: float = 0.0       # Kuyruk gecikmesi: bu orandaki istekler slow_latency kadar sürer
+    slow_latency: float = 5.0
+
+
+class FakeGeminiStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def enter(self):
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def leave(self, error=False):
+        with self.lock:
+            self.in_flight -= 1
+            self.errors += int(error)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "errors": self.errors,
+                    "in_flight": self.in_flight, "max_in_flight": self.max_in_flight}
+
+
+def _payload(text: str, prompt_tokens: int, output_tokens: int, finished: bool) -> dict:
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return {
+        "candidates": [candidate],
+        "usageMetadata": {"promptTokenCount": prompt_tokens,
+                          "candidatesTokenCount": output_tokens,
+                          "totalTokenCount": prompt_tokens + output_tokens},
+        "modelVersion": "fake-gemini",
+    }
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    server_version = "FakeGemini/1.0"
+
+    def log_message(self, format, *args):  # İstek başına log basma
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/stats"):
+            self._send_json(200, self.server.stats.snapshot())
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        cfg, stats = self.server.config, self.server.stats
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.path.startswith("/config"):
+            self.server.configure(**json.loads(body or b"{}"))
+            self._send_json(200, vars(cfg))
+            return
+        prompt_tokens = max(1, len(body) // 4)
+        streaming = ":streamGenerateContent" in self.path
+        if ":generateContent" not in self.path and not streaming:
+            self._send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+            return
+
+        stats.enter()
+        error = False
+        try:
+            with self.server.rng_lock:
+                delay = cfg.latency + self.server.rng.random() * cfg.jitter
+                if self.server.rng.random() < cfg.slow_rate:
+                    delay = cfg.slow_latency
+                error = self.server.rng.random() < cfg.error_rate
+            time.sleep(delay)
+            if error:
+                self._send_json(503, {"error": {"code": 503, "message": "The model is overloaded.",
+                                                "status": "UNAVAILABLE"}})
+                return
+
+            words = [WORDS[i % len(WORDS)] for i in range(cfg.tokens)]
+            if not streaming:
+                time.sleep(cfg.token_interval * (cfg.tokens / max(1, cfg.chunk_tokens)))
+                self._send_json(200, _payload(" ".join(words), prompt_tokens, cfg.tokens, True))
+                return
+
+            # SSE akışı: bağlantı kapanana kadar 'data: {...}' satırları
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for start in range(0, len(words), cfg.chunk_tokens):
+                piece = " ".join(words[start:start + cfg.chunk_tokens])
+                if start:
+                    piece = " " + piece
+                    time.sleep(cfg.token_interval)
+                finished = start + cfg.chunk_tokens >= len(words)
+                event = _payload(piece, prompt_tokens, start + cfg.chunk_tokens, finished)
+                self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+                self.wfile.flush()
+            self.close_connection = True
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            stats.leave(error)
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, config: FakeGeminiConfig):
+        super().__init__(address, FakeGeminiHandler)
+        self.config = config
+        self.stats = FakeGeminiStats()
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+
+    def configure(self, **changes):
+        """Arıza ayarlarını çalışırken değiştirir (bilinmeyen alanlar yok sayılır)."""
+        for key, value in changes.items():
+            if hasattr(self.config, key):
+                setattr(self.config, key, type(getattr(self.config, key))(value))
+
+
+def start_fake_gemini(config: FakeGeminiConfig = None, host="127.0.0.1", port=0) -> tuple:
+    """Sunucuyu arka planda başlatır; (server, base_url) döndürür."""
+    server = FakeGeminiServer((host, port), config or FakeGeminiConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Yerel sahte Gemini sunucusu")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--token-interval", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--chunk-tokens", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Yavaş yanıt oranı (kuyruk gecikmesi)")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    args = parser.parse_args()
+
+    config = FakeGeminiConfig(args.latency, args.jitter, args.token_interval, args.tokens,
+                              args.chunk_tokens, args.error_rate, args.seed, args.slow_rate,
+                              args.slow_latency)
+    server = FakeGeminiServer((args.host, args.port), config)
+    print(f"🤖 Sahte Gemini: http://{args.host}:{args.port}  ({config})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
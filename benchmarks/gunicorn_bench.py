@@ -0,0 +1,26 @@
+"""
+Benchmark sunucuları için gunicorn ayarları: depodaki gunicorn.conf.py'ye ek olarak,
+AYLA_BENCH_FAKE_EMBEDDINGS=1 ise her worker'da embedding modeli HashEmbedder ile
+değiştirilir (ağ erişimi gerekmez). Bilgi bankası ilk istekte yüklendiğinden
+(AYLA_STARTUP=lazy) değişiklik yüklemeden önce yapılmış olur.
+"""
+import os
+import sys
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_CONF = os.path.join(os.path.dirname(_HERE), "gunicorn.conf.py")
+with open(_CONF, encoding="utf-8") as _f:
+    # __file__ depodaki ayar dosyasını göstersin (embedding_server.py yolu ona göre bulunur)
+    _namespace = {"__file__": _CONF, "__name__": "gunicorn_conf"}
+    exec(compile(_f.read(), _CONF, "exec"), _namespace)
+globals().update({k: v for k, v in _namespace.items() if not k.startswith("__")})
+
+
+def post_worker_init(worker):
+    if os.getenv("AYLA_BENCH_FAKE_EMBEDDINGS") != "1":
+        return
+    sys.path.insert(0, _HERE)
+    import chatbot
+    from fake_embeddings import HashEmbedder
+
+    chatbot._get_embeddings = HashEmbedder
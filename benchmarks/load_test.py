@@ -0,0 +1,70 @@
+"""
+Sync (gunicorn sync worker) ve async (ASGI, uvicorn worker) sunum modlarının
+eşzamanlılıkla nasıl ölçeklendiğini sahte Gemini sunucusuna karşı ölçer.
+
+    python benchmarks/load_test.py --latency 0.5 --concurrency 1,16,64,256
+
+Beklenen sonuç: sync modda istek/sn 'workers / latency' civarında tıkanır,
+async modda eşzamanlılıkla birlikte neredeyse doğrusal artar.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import post_json, print_table, run_concurrent, save_report, spawn_app, stop_app, wait_for_http  # noqa: E402
+from fake_gemini import FakeGeminiConfig, start_fake_gemini  # noqa: E402
+
+# Psikoloji anahtar kelimesi içermeyen mesaj: RAG devreye girmez, yalnızca LLM beklemesi ölçülür
+MESSAGE = "Merhaba, bugün nasılsın?"
+
+
+def run_load_test(base_url: str, port: int, modes: list, levels: list, requests_per_worker: int,
+                  workers: int, env: dict, cwd: str = None) -> list:
+    rows = []
+    for mode in modes:
+        proc = spawn_app(mode, port, workers=workers, env=env, cwd=cwd)
+        try:
+            wait_for_http(f"{base_url}/health", proc=proc)
+            for concurrency in levels:
+                def request_fn(i):
+                    status, _ = post_json(base_url, "/chat", {"message": MESSAGE})
+                    return status == 200
+                result = run_concurrent(request_fn, concurrency, concurrency * requests_per_worker)
+                rows.append({"mode": mode, "workers": workers, "concurrency": concurrency, **result})
+                print(f"  {mode:5} c={concurrency:<4} {result['rps']:8.2f} istek/sn  p50={result['p50_ms']} ms")
+        finally:
+            stop_app(proc)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync ve async sunum modlarının yük testi")
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--concurrency", default="1,16,64,256")
+    parser.add_argument("--requests-per-worker", type=int, default=4,
+                        help="Her eşzamanlılık seviyesinde istemci başına istek sayısı")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.5, help="Sahte Gemini gecikmesi (saniye)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    args = parser.parse_args()
+
+    fake, fake_url = start_fake_gemini(FakeGeminiConfig(latency=args.latency, error_rate=args.error_rate))
+    env = {"GEMINI_API_KEY": "fake-key", "GEMINI_BASE_URL": fake_url}
+    rows = run_load_test(f"http://127.0.0.1:{args.port}", args.port, args.modes.split(","),
+                         [int(c) for c in args.concurrency.split(",")], args.requests_per_worker,
+                         args.workers, env)
+
+    print()
+    print_table(rows, ["mode", "workers", "concurrency", "rps", "p50_ms", "p95_ms", "p99_ms", "errors"])
+    print(f"\nSahte Gemini: {fake.stats.snapshot()}")
+    if args.output:
+        save_report(args.output, {"latency": args.latency, "results": rows})
+    fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Ağ erişimi gerektirmeyen benchmark paketini çalıştırır ve commit'ler arasında
+karşılaştırılabilir tek bir JSON rapor üretir:
+
+  build      bilgi bankası kurulum süreleri (bench_build.py)
+  retrieval  arama hattı mikro benchmark'ları (bench_retrieval.py)
+  latency    tek kullanıcılı uçtan uca gecikme, /chat ve /chat/stream (bench_latency.py)
+  load       gunicorn'a karşı eşzamanlı kullanıcı verimi (load_test.py)
+
+    python benchmarks/run_suite.py                        # benchmarks/results/<tarih>-<commit>.json
+    python benchmarks/run_suite.py --quick --only build,retrieval
+    python benchmarks/compare.py eski.json yeni.json
+
+Gemini yerine fake_gemini.py, embedding modeli yerel önbellekte yoksa HashEmbedder
+kullanılır (rapordaki meta.embedder alanı).
+"""
+import argparse
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+os.environ["AYLA_STARTUP"] = "lazy"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_build import prepare_workdir, run_build  # noqa: E402
+from bench_latency import load_messages, run_latency, server_env  # noqa: E402
+from bench_retrieval import load_queries, run_retrieval  # noqa: E402
+from common import REPO_ROOT, print_table, save_report, spawn_app, stop_app, wait_for_http, wait_for_rag  # noqa: E402
+from fake_embeddings import resolve_embedder  # noqa: E402
+from fake_gemini import FakeGeminiConfig, start_fake_gemini  # noqa: E402
+from load_test import run_load_test  # noqa: E402
+
+SCENARIOS = ("build", "retrieval", "latency", "load")
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def collect_meta(args, embedder_label: str) -> dict:
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "embedder": embedder_label,
+        "gemini_latency": args.latency,
+        "gemini_error_rate": args.error_rate,
+        "quick": args.quick,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Çevrimdışı benchmark paketi")
+    parser.add_argument("--only", default=",".join(SCENARIOS), help=f"Senaryolar: {','.join(SCENARIOS)}")
+    parser.add_argument("--embedder", default="auto", choices=["auto", "real", "fake"])
+    parser.add_argument("--latency", type=float, default=0.3, help="Sahte Gemini gecikmesi (saniye)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Sahte Gemini 503 oranı")
+    parser.add_argument("--tokens", type=int, default=60, help="Sahte Gemini yanıt uzunluğu (token)")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--quick", action="store_true", help="Daha az tekrar (duman testi)")
+    parser.add_argument("--port", type=int, default=5058)
+    parser.add_argument("--output", help="Rapor yolu (varsayılan: benchmarks/results/<tarih>-<commit>.json)")
+    args = parser.parse_args()
+
+    selected = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Bilinmeyen senaryo: {', '.join(sorted(unknown))}")
+
+    embedder, label = resolve_embedder(args.embedder)
+    meta = collect_meta(args, label)
+    report = {"meta": meta, "scenarios": {}}
+    workdir = tempfile.mkdtemp(prefix="ayla-suite-")
+    fake, fake_url = start_fake_gemini(FakeGeminiConfig(latency=args.latency, error_rate=args.error_rate,
+                                                        tokens=args.tokens))
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = server_env(fake_url, label)
+    try:
+        if "build" in selected:
+            print("\n▶ build")
+            report["scenarios"]["build"] = run_build(workdir, embedder)
+        kb = prepare_workdir(workdir, embedder, fresh="build" not in selected)
+
+        if "retrieval" in selected:
+            print("\n▶ retrieval")
+            report["scenarios"]["retrieval"] = run_retrieval(kb, embedder, load_queries(),
+                                                             1 if args.quick else 5)
+
+        if "latency" in selected:
+            print("\n▶ latency")
+            proc = spawn_app("sync", args.port, env=env, cwd=workdir)
+            try:
+                wait_for_http(f"{base_url}/health", proc=proc)
+                meta["rag_state"] = wait_for_rag(base_url, proc=proc)
+                report["scenarios"]["latency"] = run_latency(base_url, load_messages(),
+                                                             10 if args.quick else 50)
+            finally:
+                stop_app(proc)
+
+        if "load" in selected:
+            print("\n▶ load")
+            levels = [int(c) for c in args.concurrency.split(",")]
+            report["scenarios"]["load"] = run_load_test(base_url, args.port, ["sync", "async"], levels,
+                                                        2 if args.quick else 4, args.workers, env, workdir)
+    finally:
+        fake.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    meta["gemini"] = fake.stats.snapshot()
+    for name, rows in report["scenarios"].items():
+        print(f"\n== {name} ==")
+        print_table(rows, list(rows[0]) if rows else [])
+
+    output = args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results",
+        f"{datetime.now():%Y%m%d-%H%M%S}-{meta['commit']}{'-dirty' if meta['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    save_report(output, report)
+
+
+if __name__ == "__main__":
+    main()
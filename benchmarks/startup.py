@@ -0,0 +1,85 @@
+"""
+Başlangıç süresini ölçer: process başlatmadan itibaren
+  - 'import chatbot' süresi,
+  - ilk /health/live yanıtı,
+  - ilk /chat yanıtı (sahte Gemini ile),
+  - bilgi bankasının hazır olması (rag_state).
+
+    python benchmarks/startup.py --modes background,preload,lazy --workers 2
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import REPO_ROOT, get_json, post_json, print_table, save_report, spawn_app, stop_app  # noqa: E402
+from fake_gemini import FakeGeminiConfig, start_fake_gemini  # noqa: E402
+
+
+def _until(fn, timeout: float, proc) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Sunucu erken kapandı (kod {proc.returncode})")
+        if fn():
+            return time.perf_counter()
+        time.sleep(0.05)
+    raise TimeoutError("Süre aşıldı")
+
+
+def measure_import(env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import chatbot; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, env=dict(os.environ, **env),
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import'tan ilk yanıta kadar geçen süre")
+    parser.add_argument("--modes", default="background,preload,lazy")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="JSON rapor dosyası")
+    args = parser.parse_args()
+
+    fake, fake_url = start_fake_gemini(FakeGeminiConfig(latency=0.05))
+    base_url = f"http://127.0.0.1:{args.port}"
+    rows = []
+
+    for mode in args.modes.split(","):
+        env = {"GEMINI_API_KEY": "fake-key", "GEMINI_BASE_URL": fake_url, "AYLA_STARTUP": mode}
+        import_s = measure_import(env)
+        start = time.perf_counter()
+        proc = spawn_app("sync", args.port, workers=args.workers, env=env)
+        try:
+            live = _until(lambda: get_json(f"{base_url}/health/live") is not None, args.timeout, proc)
+            chat = _until(lambda: post_json(base_url, "/chat", {"message": "Merhaba!"})[0] == 200,
+                          args.timeout, proc)
+            rag = _until(lambda: (get_json(f"{base_url}/health") or {}).get("rag_state") in ("ready", "failed"),
+                         args.timeout, proc)
+            rag_state = (get_json(f"{base_url}/health") or {}).get("rag_state")
+        finally:
+            stop_app(proc)
+        rows.append({
+            "mode": mode,
+            "import_s": round(import_s, 2),
+            "live_s": round(live - start, 2),
+            "first_chat_s": round(chat - start, 2),
+            "rag_ready_s": round(rag - start, 2),
+            "rag_state": rag_state,
+        })
+        print(f"  {mode}: {rows[-1]}")
+
+    print()
+    print_table(rows, ["mode", "import_s", "live_s", "first_chat_s", "rag_ready_s", "rag_state"])
+    if args.output:
+        save_report(args.output, {"workers": args.workers, "results": rows})
+    fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Bilgi bankasını (faiss_index/) Gemini API anahtarı olmadan kurar; Docker imajı
+hazır indeksle gelsin diye imaj kurulumunda çalıştırılır.
+
+    python build_index.py [--workers 4] [--batch-size 256] [--index-type flat] [--path faiss_index]
+
+PDF_FILES sayfaları bir process havuzunda okunup parçalanır, parçalar sabit boyutlu
+büyük yığınlarla gömülüp akış halinde diske eklenir (bkz. chatbot.update_vector_db) ve içerikten türetilen adlı (v2-<özet>) bir artifact yazılır:
+aynı PDF'ler ve ayarlar her zaman aynı artifact'i üretir. Uygulama açılışta
+manifest'teki ayarlar ve dosya özetleri eşleştiği için yeniden gömme yapmaz.
+Değişmeyen dosyalar mevcut indeksten kopyalanır; --force ile baştan kurulur. Sayfa
+metinleri faiss_index/pages/ altında saklanır, parçalama ayarı değişince PDF'ler yeniden okunmaz.
+"""
+import argparse
+import os
+import shutil
+import time
+
+os.environ["AYLA_STARTUP"] = "offline"  # Gemini istemcisi ve arka plan yüklemesi başlatılmasın
+
+import chatbot  # noqa: E402
+
+
+def build(path: str, workers: int, batch_size: int, force: bool = False):
+    """İndeksi kurar; (KnowledgeIndex veya None, aşama süreleri) döndürür."""
+    if force:
+        shutil.rmtree(path, ignore_errors=True)
+    stages = {}
+    before = chatbot.STAGE_SECONDS.totals()
+    pages_before = chatbot.INGESTED.value("pages")
+    cached_before = chatbot.INGESTED.value("cached_pages")
+    started = time.perf_counter()
+    embedder = chatbot.SentenceEmbedder(batch_size=batch_size)
+    stages["model"] = time.perf_counter() - started
+    kb = chatbot.update_vector_db(embedder, workers=workers, root=path, batch_size=batch_size)
+    after = chatbot.STAGE_SECONDS.totals()
+    for stage in ("embed", "write"):
+        key = f"index_{stage}"
+        stages[stage] = after.get(key, 0.0) - before.get(key, 0.0)
+    stages["total"] = time.perf_counter() - started
+    # Okuma ve parçalama gömmeyle eşzamanlı yürür; ayrı bir süre olarak ölçülmez
+    stages["pages"] = chatbot.INGESTED.value("pages") - pages_before
+    stages["cached_pages"] = chatbot.INGESTED.value("cached_pages") - cached_before
+    return kb, stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bilgi bankası indeksini API anahtarı olmadan kurar")
+    parser.add_argument("--path", default=chatbot.VECTOR_DB_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="PDF okuma process sayısı (1 = süreç içinde)")
+    parser.add_argument("--batch-size", type=int, default=chatbot.INGEST_BATCH_SIZE,
+                        help="embed_documents çağrısı başına parça (embedding yığın boyutu)")
+    parser.add_argument("--index-type", default=chatbot.INDEX_TYPE, choices=["flat", "hnsw", "ivfpq"])
+    parser.add_argument("--force", action="store_true", help="Mevcut indeksi silip baştan kur")
+    args = parser.parse_args()
+
+    chatbot.INDEX_TYPE = args.index_type
+    missing = [f for f in chatbot.PDF_FILES if not os.path.exists(f)]
+    if len(missing) == len(chatbot.PDF_FILES):
+        parser.error(f"PDF bulunamadı: {', '.join(missing)}")
+    for file_name in missing:
+        print(f"⚠️ {file_name} bulunamadı, atlanıyor")
+
+    print(f"🔨 İndeks kuruluyor: {args.path} ({args.workers} process, yığın {args.batch_size}, "
+          f"{chatbot.EMBEDDING_BACKEND}, {args.index_type})")
+    kb, stages = build(args.path, args.workers, args.batch_size, args.force)
+    if kb is None:
+        raise SystemExit("❌ Hiç parça üretilmedi, indeks kurulamadı")
+    print(f"✓ {kb.manifest['artifact']}: {kb.count} parça, {kb.dim} boyut")
+    pages, cached = stages.pop("pages"), stages.pop("cached_pages")
+    print("  " + ", ".join(f"{stage} {seconds:.2f} sn" for stage, seconds in stages.items()))
+    ingest = stages["total"] - stages["model"] - stages["write"]
+    if pages and ingest > 0:
+        print(f"  {pages} sayfa ({cached} önbellekten), {pages / ingest:.1f} sayfa/sn (okuma + parçalama + gömme)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,245 +1,3419 @@
 import os
+import re
+import asyncio
 import sys
 import json
+import math
 import time  # <-- YENİ: Yeniden deneme için eklendi
+import hashlib
+import mmap
+import secrets
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import zlib
+import atexit
+import logging
+import queue
+import random
+from bisect import bisect_left
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import (FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor,
+                                TimeoutError as FuturesTimeoutError, wait as futures_wait)
+from logging.handlers import QueueHandler, QueueListener
+from http.cookies import CookieError, SimpleCookie
 from dotenv import load_dotenv
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Response, render_template_string, request, jsonify, stream_with_context
 from datetime import datetime
 
-# LangChain ve Google Gemini kütüphanelerini içe aktar
+# Google Gemini kütüphanelerini içe aktar.
+# Ağır LangChain/transformers modülleri yalnızca bilgi bankası yüklenirken
+# içe aktarılır (bkz. load_knowledge_base), böylece '/' ve '/health' hızlı açılır.
 try:
     from google import genai
+    import faiss
+    import httpx
+    import numpy as np
+    from google.genai import errors as genai_errors
     from google.genai.types import HarmCategory, HarmBlockThreshold
     # <-- YENİ: Google API hata yönetimi için eklendi
     from google.api_core import exceptions as google_exceptions 
-    from langchain_community.document_loaders import PyPDFLoader
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-    from langchain_community.vectorstores import FAISS
-    from langchain_huggingface import HuggingFaceEmbeddings
 except ImportError:
     print("HATA: Gerekli kütüphaneler eksik.")
     print("Lütfen terminalde bu komutu çalıştırın:")
-    print("pip install flask google-genai pypdf langchain-community langchain-text-splitters langchain-huggingface sentence-transformers faiss-cpu python-dotenv google-api-core")
+    print("pip install flask numpy google-genai pypdf langchain-community langchain-text-splitters sentence-transformers faiss-cpu python-dotenv google-api-core")
     sys.exit(1)
 
-# --- KONFİGÜRASYON ---
-load_dotenv()
-app = Flask(__name__)
+# --- KONFİGÜRASYON ---
+load_dotenv()
+app = Flask(__name__)
+
+# Hız için Flash-8B modeli, daha detaylı yanıtlar için Pro'ya çevirebilirsiniz
+GEMINI_MODEL = "gemini-2.0-flash-exp"  # En hızlı ve güncel model
+VECTOR_DB_PATH = "faiss_index"
+MANIFEST_FILE = "manifest.json"
+INDEX_FORMAT_VERSION = 2
+EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+# Embedding çalıştırıcısı:
+#   torch:      tam hassasiyetli PyTorch (varsayılan)
+#   torch-int8: Linear katmanları dinamik int8 nicemlenmiş PyTorch
+#   onnx:       ONNX Runtime (AYLA_ONNX_FILE, varsayılan onnx/model.onnx)
+#   onnx-int8:  ONNX Runtime + int8 nicemlenmiş model (varsayılan onnx/model_qint8_avx2.onnx)
+EMBEDDING_BACKEND = os.getenv("AYLA_EMBEDDING_BACKEND", "torch")
+EMBEDDING_BATCH_SIZE = int(os.getenv("AYLA_EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_THREADS = int(os.getenv("AYLA_EMBEDDING_THREADS", "0"))  # 0 = kütüphane varsayılanı
+ONNX_FILE = os.getenv("AYLA_ONNX_FILE")
+# Paylaşılan embedding sunucusu (bkz. embedding_server.py, EmbeddingClient): Unix soket yolu
+# verilirse worker'lar modeli yüklemez, metinleri bu soketteki tek process'e kodlatır
+EMBEDDING_SERVER = os.getenv("AYLA_EMBEDDING_SERVER")
+EMBEDDING_SERVER_TIMEOUT = float(os.getenv("AYLA_EMBEDDING_SERVER_TIMEOUT", "30"))  # İstek başına (saniye)
+EMBEDDING_SERVER_WAIT = float(os.getenv("AYLA_EMBEDDING_SERVER_WAIT", "120"))  # Açılışta hazır olma bekleme
+# Parçalama ayarları; değişirse indeks baştan kurulur (sayfa metinleri önbellekten okunur)
+CHUNK_SIZE = int(os.getenv("AYLA_CHUNK_SIZE", "800"))  # Parça başına karakter
+CHUNK_OVERLAP = int(os.getenv("AYLA_CHUNK_OVERLAP", "150"))  # Art arda parçaların ortak karakteri
+# PDF sayfa metinleri indeks dizininde (faiss_index/pages/) dosya özetine göre saklanır (bkz. PageCache)
+PAGE_CACHE_ENABLED = os.getenv("AYLA_PAGE_CACHE", "1") == "1"
+PDF_PAGES_PER_TASK = 8  # Paralel PDF okumada process başına verilen sayfa aralığı
+# İndeks kurulumu akış halindedir: sayfalar -> parçalar -> sabit boyutlu embedding yığınları -> disk.
+# Bellekte en fazla INGEST_QUEUE_DEPTH yığın bekler (okuma gömmeden hızlıysa okuma bekletilir).
+INGEST_BATCH_SIZE = int(os.getenv("AYLA_INGEST_BATCH", "256"))  # embed_documents çağrısı başına parça
+INGEST_QUEUE_DEPTH = int(os.getenv("AYLA_INGEST_QUEUE", "4"))
+# FAISS indeks tipi: flat (tam arama), hnsw (graf) veya ivfpq (kümeleme + ürün nicemleme)
+INDEX_TYPE = os.getenv("AYLA_INDEX_TYPE", "flat")
+HNSW_M = int(os.getenv("AYLA_HNSW_M", "32"))  # Düğüm başına komşu sayısı
+HNSW_EF_SEARCH = int(os.getenv("AYLA_HNSW_EF_SEARCH", "64"))  # Aramada gezilen aday sayısı
+IVF_NLIST = int(os.getenv("AYLA_IVF_NLIST", "0"))  # Küme sayısı (0 = parça sayısına göre otomatik)
+IVF_NPROBE = int(os.getenv("AYLA_IVF_NPROBE", "16"))  # Aramada taranan küme sayısı
+PQ_M = int(os.getenv("AYLA_PQ_M", "48"))  # Vektör başına alt nicemleyici (bayt) sayısı
+# IVF-PQ adaylarının kaç katı alınıp ham vektörlerle yeniden sıralanacağı (1 = kapalı)
+IVF_REFINE = int(os.getenv("AYLA_IVF_REFINE", "8"))
+# Arama modu: vector (yalnızca FAISS) veya hybrid (BM25 + FAISS, sıralama birleştirme)
+RETRIEVAL_MODE = os.getenv("AYLA_RETRIEVAL", "hybrid")
+# Hybrid modda BM25 sonuçları güvenilirse kodlayıcı hiç çalıştırılmaz
+LEXICAL_FAST_PATH = os.getenv("AYLA_LEXICAL_FAST_PATH", "1") == "1"
+LEXICAL_FAST_MAX_TERMS = int(os.getenv("AYLA_LEXICAL_FAST_MAX_TERMS", "4"))
+HYBRID_CANDIDATES = int(os.getenv("AYLA_HYBRID_CANDIDATES", "10"))  # Birleştirilen liste uzunluğu
+RETRIEVAL_K = int(os.getenv("AYLA_RETRIEVAL_K", "3"))  # Soru başına getirilen bilgi parçası
+# Prompt'taki bilgi bankası bağlamı için token bütçesi (bkz. pack_context)
+PROMPT_CONTEXT_TOKENS = int(os.getenv("AYLA_PROMPT_CONTEXT_TOKENS", "400"))
+# Token tahmini için ortalama karakter/token oranı; /metrics'teki Gemini sayımıyla ayarlanabilir
+CHARS_PER_TOKEN = float(os.getenv("AYLA_CHARS_PER_TOKEN", "4"))
+# Vektörleri bu kosinüs benzerliğinin üstündeki parçalar tekrar sayılır ve prompt'a bir kez girer
+DEDUP_THRESHOLD = float(os.getenv("AYLA_DEDUP_THRESHOLD", "0.95"))
+# Gemini erişim katmanı (bkz. GeminiGateway); sınırlar worker başınadır
+GEMINI_MAX_CONCURRENCY = int(os.getenv("AYLA_GEMINI_MAX_CONCURRENCY", "32"))
+GEMINI_QUEUE_TIMEOUT = float(os.getenv("AYLA_GEMINI_QUEUE_TIMEOUT", "2"))  # Boş yer için bekleme (saniye)
+GEMINI_DEADLINE = float(os.getenv("AYLA_GEMINI_DEADLINE", "20"))  # İstek başına toplam süre (saniye)
+GEMINI_ATTEMPT_TIMEOUT = float(os.getenv("AYLA_GEMINI_ATTEMPT_TIMEOUT", "10"))  # Deneme başına (saniye)
+BREAKER_FAILURES = int(os.getenv("AYLA_BREAKER_FAILURES", "5"))  # Devreyi açan art arda hata sayısı
+BREAKER_RESET = float(os.getenv("AYLA_BREAKER_RESET", "15"))  # Devrenin açık kalma süresi (saniye)
+HEDGE_ENABLED = os.getenv("AYLA_HEDGE", "0") == "1"
+HEDGE_QUANTILE = float(os.getenv("AYLA_HEDGE_QUANTILE", "0.95"))  # Hedge isteği bu yüzdelikten sonra
+HEDGE_MIN_SAMPLES = 20  # Eşik hesaplanmadan önce gereken başarılı çağrı sayısı
+# Aynı anda gelen özdeş istekleri (boş geçmişli sohbet, arama) tek hesaplamada birleştir
+COALESCE_ENABLED = os.getenv("AYLA_COALESCE", "1") == "1"
+# /chat ve /chat/stream için kabul denetimi (bkz. AdmissionController); sınırlar worker başınadır
+ADMISSION_ENABLED = os.getenv("AYLA_ADMISSION", "1") == "1"
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("AYLA_ADMISSION_MAX_CONCURRENCY", "32"))  # Aynı anda işlenen istek
+ADMISSION_QUEUE_SIZE = int(os.getenv("AYLA_ADMISSION_QUEUE", "64"))  # Sırada bekleyebilecek istek
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("AYLA_ADMISSION_QUEUE_TIMEOUT", "2"))  # Sırada bekleme (saniye)
+# Vekil sunucunun arkasında (TRUST_PROXY=0) tüm istemciler aynı IP'den görünür; bu yüzden kapalıdır
+RATE_LIMIT_PER_MINUTE = float(os.getenv("AYLA_RATE_LIMIT_PER_MINUTE", "0"))  # İstemci başına (0 = kapalı)
+RATE_LIMIT_BURST = int(os.getenv("AYLA_RATE_LIMIT_BURST", "5"))  # Art arda gönderilebilecek mesaj
+RATE_LIMIT_CLIENTS = int(os.getenv("AYLA_RATE_LIMIT_CLIENTS", "10000"))  # İzlenen istemci sayısı
+# Uygulama bir vekil sunucunun (ör. HF Spaces) arkasındaysa istemci adresi X-Forwarded-For'un
+# son (vekilin eklediği) girdisinden alınır; istemcinin yazdığı baştaki girdiler sahte olabilir
+TRUST_PROXY = os.getenv("AYLA_TRUST_PROXY", "0") == "1"
+HOST_IP = "127.0.0.1"
+PORT_NUMBER = 5000
+# Test/benchmark için Gemini uç noktası değiştirilebilir (örn. benchmarks/fake_gemini.py)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+# Sorgu vektörü ve arama sonucu önbellekleri
+QUERY_CACHE_SIZE = int(os.getenv("AYLA_QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = int(os.getenv("AYLA_QUERY_CACHE_TTL", "3600"))  # saniye
+# Anlamsal cevap önbelleği (opsiyonel): benzer sorulara Gemini'ye gitmeden cevap verir
+ANSWER_CACHE_ENABLED = os.getenv("AYLA_ANSWER_CACHE", "0") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("AYLA_ANSWER_CACHE_THRESHOLD", "0.92"))  # kosinüs benzerliği
+ANSWER_CACHE_SIZE = int(os.getenv("AYLA_ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = int(os.getenv("AYLA_ANSWER_CACHE_TTL", "86400"))  # saniye
+# Başlangıç modu:
+#   background: import hızlıdır, bilgi bankası arka planda yüklenir (varsayılan)
+#   preload:    bilgi bankası import sırasında yüklenir; 'gunicorn --preload' ile
+#               master'da bir kez yüklenip worker'lara copy-on-write paylaştırılır
+#   lazy:       bilgi bankası ilk istekte arka planda yüklenmeye başlar
+#   offline:    Gemini istemcisi de hazırlanmaz (araçlar için, ör. build_index.py)
+STARTUP_MODE = os.getenv("AYLA_STARTUP", "background")
+# Konu yönlendirici: anahtar kelime JSON dosyası (liste veya {"keywords": [...]})
+ROUTER_KEYWORDS_FILE = os.getenv("AYLA_ROUTER_KEYWORDS")
+# > 0 ise anahtar kelime içermeyen mesajlar bilgi bankası merkezine benzerlikle de yönlendirilir
+ROUTER_CENTROID_THRESHOLD = float(os.getenv("AYLA_ROUTER_CENTROID_THRESHOLD", "0"))
+# Async modda (asgi_app) FAISS aramalarının çalıştığı iş parçacığı sayısı
+RETRIEVAL_THREADS = int(os.getenv("AYLA_RETRIEVAL_THREADS", "4"))
+# Günlük (log): seviye (DEBUG kullanıcı mesajlarını da yazar) ve biçim (text | json)
+LOG_LEVEL = os.getenv("AYLA_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("AYLA_LOG_FORMAT", "text")
+
+PDF_FILES = [
+    "psikoloji_sozlugu.pdf",
+    "mindfulness_egzersizleri.pdf",
+    "bdt_kilavuzu.pdf"
+]
+
+# Oturum (session) ayarları
+SESSION_COOKIE = "ayla_sid"
+SESSION_HEADER = "X-Session-ID"
+SESSION_MAX_TURNS = int(os.getenv("AYLA_SESSION_MAX_TURNS", "6"))  # Oturum başına saklanan mesaj sayısı
+SESSION_MAX_COUNT = int(os.getenv("AYLA_SESSION_MAX_COUNT", "10000"))
+SESSION_MAX_CHARS = int(os.getenv("AYLA_SESSION_MAX_CHARS", "20000000"))  # Tüm oturumlar için toplam karakter sınırı
+SESSION_TTL = int(os.getenv("AYLA_SESSION_TTL", "3600"))  # saniye
+# Uzun sohbetler: pencereden taşan eski mesajlar arka planda bir özete katlanır
+# (bkz. ConversationSummarizer); özet ve son mesajlar bu token bütçesine sığdırılır.
+PROMPT_HISTORY_TOKENS = int(os.getenv("AYLA_PROMPT_HISTORY_TOKENS", "600"))
+SUMMARY_ENABLED = os.getenv("AYLA_SUMMARY", "1") == "1"
+SUMMARY_MAX_TOKENS = int(os.getenv("AYLA_SUMMARY_MAX_TOKENS", "200"))
+SUMMARY_BATCH = int(os.getenv("AYLA_SUMMARY_BATCH", "4"))  # Kaç taşan mesajda bir özetlenir
+SUMMARY_THREADS = int(os.getenv("AYLA_SUMMARY_THREADS", "2"))
+
+client = None
+vector_db = None
+embedder = None  # Sorgu ve belge vektörleri için embedding modeli
+rag_state = "idle"  # idle | loading | ready | failed
+_rag_lock = threading.Lock()
+_warmup_pid = None
+
+
+# --- GÜNLÜK (LOGGING) ---
+class _LogFormatter(logging.Formatter):
+    """
+    text: konsolda eski print çıktısıyla aynı görünüm + alanlar (anahtar=değer)
+    json: satır başına bir JSON nesnesi (log toplayıcılar için)
+    """
+
+    def __init__(self, as_json: bool):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record) -> str:
+        fields = getattr(record, "fields", None) or {}
+        if self.as_json:
+            return json.dumps({"ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                               "level": record.levelname, "pid": record.process,
+                               "msg": record.getMessage(), **fields}, ensure_ascii=False, default=str)
+        extra = " ".join(f"{k}={v}" for k, v in fields.items())
+        return f"{record.getMessage()}  {extra}" if extra else record.getMessage()
+
+
+log = logging.getLogger("ayla")
+log.setLevel(LOG_LEVEL)
+log.propagate = False
+# İstek iş parçacıkları kayıtları yalnızca kuyruğa bırakır; stdout'a yazma işini
+# arka plandaki dinleyici (QueueListener) yapar, böylece yavaş bir konsol isteği bekletmez.
+_log_handler = QueueHandler(queue.SimpleQueue())
+log.addHandler(_log_handler)
+_log_listener = None
+
+
+def _start_log_listener():
+    """Dinleyiciyi başlatır; fork sonrası çocuk process'te yeni kuyrukla yeniden çağrılır."""
+    global _log_listener
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(_LogFormatter(LOG_FORMAT == "json"))
+    _log_handler.queue = queue.SimpleQueue()
+    _log_listener = QueueListener(_log_handler.queue, output)
+    _log_listener.start()
+
+
+_start_log_listener()
+atexit.register(lambda: _log_listener.stop() if _log_listener._thread is not None else None)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_start_log_listener)
+
+
+# --- METRİKLER ---
+# Aşama süreleri sabit kovalı histogramlarda tutulur (kova arama + kilitli sayaç artışı);
+# /metrics uç noktası Prometheus metin formatında sunar. Sayaçlar process başınadır:
+# birden çok gunicorn worker'ında her worker kendi değerlerini raporlar.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Etiket değerine göre ayrılmış, sabit kovalı süre histogramı."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}  # etiket -> [kova sayaçları..., toplam süre, adet]
+
+    def observe(self, label: str, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def totals(self) -> dict:
+        """Etiket başına toplam süre."""
+        with self._lock:
+            return {label: series[-2] for label, series in self._series.items()}
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {label: list(series) for label, series in self._series.items()}
+        for label, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{self.label}="{label}",le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{self.label}="{label}"}} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{self.label}="{label}"}} {series[-1]}')
+        return lines
+
+
+class Counter:
+    """Etiket değerine göre ayrılmış artan sayaç."""
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, label: str, amount: int = 1):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def value(self, label: str) -> int:
+        return self._values.get(label, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f'{self.name}{{{self.label}="{label}"}} {value}' for label, value in items]
+        return lines
+
+
+STAGE_SECONDS = Histogram("ayla_stage_seconds", "İstek aşamalarının süresi (saniye)", "stage")
+REQUESTS = Counter("ayla_requests_total", "Uç noktaya göre sohbet istekleri", "endpoint")
+REQUEST_ERRORS = Counter("ayla_request_errors_total", "Hata ile biten sohbet istekleri", "endpoint")
+REQUESTS_ABORTED = Counter("ayla_requests_aborted_total", "İstemci ayrıldığı için yarıda kalan yanıt akışları "
+                           "(ayla_requests_total'a sayılmaz)", "endpoint")
+GEMINI_ATTEMPTS = Counter("ayla_gemini_attempts_total", "Sonucuna göre Gemini denemeleri", "outcome")
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096)
+PROMPT_TOKENS = Histogram("ayla_prompt_tokens", "İstek başına tahmini prompt token sayısı", "part",
+                          TOKEN_BUCKETS)
+GEMINI_TOKENS = Counter("ayla_gemini_tokens_total", "Gemini'nin saydığı token'lar", "kind")
+CONTEXT_CHUNKS = Counter("ayla_context_chunks_total", "Prompt'a giren/girmeyen bilgi parçaları", "outcome")
+GATEWAY_EVENTS = Counter("ayla_gemini_gateway_total", "Gemini erişim katmanı olayları", "event")
+INGESTED = Counter("ayla_ingest_total", "İndeks kurulumunda okunan sayfalar (cached_pages: önbellekten) "
+                   "ve gömülen parçalar", "kind")
+SUMMARIES = Counter("ayla_summaries_total", "Sonucuna göre arka plan sohbet özetlemeleri", "outcome")
+BREAKER_TRANSITIONS = Counter("ayla_breaker_transitions_total", "Devre kesici durum geçişleri", "state")
+FLIGHTS = Counter("ayla_singleflight_calls_total", "Birleştirme katmanında gerçekten yapılan hesaplamalar",
+                  "flight")
+COALESCED = Counter("ayla_coalesced_total", "Süren özdeş bir hesaplamaya katılarak kazanılan çağrılar",
+                    "flight")
+ADMISSION = Counter("ayla_admission_total", "Sohbet isteklerinin kabul denetimi sonuçları", "outcome")
+
+
+class timed:
+    """
+    Bir aşamanın süresini STAGE_SECONDS histogramına yazan bağlam yöneticisi:
+        with timed("faiss_search"): ...
+    """
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+# --- OTURUM BAZLI SOHBET GEÇMİŞİ ---
+class _Session:
+    """Tek bir kullanıcının son mesajlarını tutan küçük halka tampon."""
+    __slots__ = ("turns", "chars", "last_seen", "summary", "overflow", "folding")
+
+    def __init__(self, max_turns: int):
+        self.turns = deque(maxlen=max_turns)  # (rol, içerik) demetleri
+        self.chars = 0
+        self.last_seen = time.monotonic()
+        self.summary = ""  # Pencereden çıkmış eski mesajların özeti
+        self.overflow = []  # Pencereden çıkmış, henüz özete katlanmamış mesajlar
+        self.folding = False  # Özetleme işi sırada veya sürüyor
+
+
+class _SessionShard:
+    __slots__ = ("lock", "sessions", "chars")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()  # sid -> _Session, en eski başta (LRU)
+        self.chars = 0
+
+
+class ConversationStore:
+    """
+    Oturum kimliğine göre ayrılmış sohbet geçmişi.
+    Oturumlar parçalara (shard) bölünür; her parçanın kendi kilidi vardır,
+    böylece farklı kullanıcıların istekleri birbirini beklemez.
+    Bellek sınırı aşıldığında en uzun süredir kullanılmayan (LRU) oturumlar,
+    TTL süresi dolanlar ise her erişimde atılır.
+    on_overflow verilmişse pencereden taşan mesajlar silinmez, özetlenmek üzere
+    bekletilir ve on_overflow(sid) çağrılır (bkz. begin_fold/finish_fold).
+    """
+
+    def __init__(self, max_turns=SESSION_MAX_TURNS, max_sessions=SESSION_MAX_COUNT,
+                 max_chars=SESSION_MAX_CHARS, ttl=SESSION_TTL, shards=16):
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self._shards = [_SessionShard() for _ in range(shards)]
+        # Sınırlar parçalara eşit dağıtılır
+        self._shard_max_sessions = max(1, max_sessions // shards)
+        self._shard_max_chars = max(1, max_chars // shards)
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+        self.on_overflow = None
+        # Özetleyici yetişemezse en eskiler atılır
+        self.max_overflow = max(2 * max_turns, 2 * SUMMARY_BATCH)
+
+    def _shard(self, sid: str) -> _SessionShard:
+        return self._shards[zlib.crc32(sid.encode()) % len(self._shards)]
+
+    def _drop(self, shard: _SessionShard, sid: str):
+        sess = shard.sessions.pop(sid)
+        shard.chars -= sess.chars
+
+    def _evict(self, shard: _SessionShard, now: float):
+        # TTL: en eski oturumlar baştadır, süresi dolmayan ilk oturumda dur
+        while shard.sessions:
+            sid, sess = next(iter(shard.sessions.items()))
+            if now - sess.last_seen < self.ttl:
+                break
+            self._drop(shard, sid)
+            self.evicted_ttl += 1
+        # LRU: oturum sayısı veya toplam karakter sınırı aşıldıysa
+        while shard.sessions and (len(shard.sessions) > self._shard_max_sessions
+                                  or shard.chars > self._shard_max_chars):
+            self._drop(shard, next(iter(shard.sessions)))
+            self.evicted_lru += 1
+
+    def history(self, sid: str) -> list:
+        """Oturumun geçmişinin bir kopyasını döndürür: [(rol, içerik), ...]"""
+        return self.snapshot(sid)[1]
+
+    def snapshot(self, sid: str) -> tuple:
+        """
+        (özet, mesajlar) döndürür; mesajlar henüz özete katlanmamış taşan mesajlarla
+        son mesajlardır, böylece özetleme sürerken hiçbir mesaj kaybolmaz.
+        """
+        shard = self._shard(sid)
+        now = time.monotonic()
+        with shard.lock:
+            self._evict(shard, now)
+            sess = shard.sessions.get(sid)
+            if sess is None:
+                return "", []
+            sess.last_seen = now
+            shard.sessions.move_to_end(sid)
+            return sess.summary, sess.overflow + list(sess.turns)
+
+    def _trim_overflow(self, shard: _SessionShard, sess: _Session):
+        limit = self.max_overflow if self.on_overflow else 0
+        while len(sess.overflow) > limit:
+            dropped = len(sess.overflow.pop(0)[1])
+            sess.chars -= dropped
+            shard.chars -= dropped
+
+    def commit(self, sid: str, *turns):
+        """Bir veya daha fazla (rol, içerik) mesajını oturuma ekler."""
+        shard = self._shard(sid)
+        now = time.monotonic()
+        with shard.lock:
+            sess = shard.sessions.get(sid)
+            if sess is None:
+                sess = shard.sessions[sid] = _Session(self.max_turns)
+            else:
+                shard.sessions.move_to_end(sid)
+            sess.last_seen = now
+            for role, content in turns:
+                if len(sess.turns) == sess.turns.maxlen:
+                    sess.overflow.append(sess.turns[0])
+                sess.turns.append((role, content))
+                sess.chars += len(content)
+                shard.chars += len(content)
+            # Özetleme sürerken taşan liste kırpılmaz: finish_fold baştan sayarak siler
+            if not sess.folding:
+                self._trim_overflow(shard, sess)
+            schedule = (len(sess.overflow) >= SUMMARY_BATCH and not sess.folding
+                        and self.on_overflow is not None)
+            sess.folding = sess.folding or schedule
+            self._evict(shard, now)
+        if schedule:
+            self.on_overflow(sid)
+
+    def begin_fold(self, sid: str):
+        """Özetlenecek işi döndürür: (mevcut özet, katlanacak mesajlar) veya None."""
+        shard = self._shard(sid)
+        with shard.lock:
+            sess = shard.sessions.get(sid)
+            if sess is None:
+                return None
+            if not sess.overflow:
+                sess.folding = False
+                return None
+            return sess.summary, list(sess.overflow)
+
+    def finish_fold(self, sid: str, summary: str, folded: int) -> bool:
+        """
+        İlk 'folded' taşan mesajı yeni özetle değiştirir. Bu sırada SUMMARY_BATCH kadar
+        yeni mesaj taşmışsa True döner (yeni bir özetleme gerekir).
+        """
+        shard = self._shard(sid)
+        with shard.lock:
+            sess = shard.sessions.get(sid)
+            if sess is None:
+                return False
+            delta = len(summary) - len(sess.summary) - sum(len(c) for _, c in sess.overflow[:folded])
+            sess.summary = summary
+            del sess.overflow[:folded]
+            sess.chars += delta
+            shard.chars += delta
+            self._trim_overflow(shard, sess)
+            sess.folding = len(sess.overflow) >= SUMMARY_BATCH
+            return sess.folding
+
+    def abort_fold(self, sid: str):
+        """Özetleme başarısız: taşan mesajlar bir sonraki taşmada yeniden denenir."""
+        shard = self._shard(sid)
+        with shard.lock:
+            sess = shard.sessions.get(sid)
+            if sess is not None:
+                sess.folding = False
+                self._trim_overflow(shard, sess)
+
+    def stats(self) -> dict:
+        sessions = chars = summarized = 0
+        for shard in self._shards:
+            with shard.lock:
+                sessions += len(shard.sessions)
+                chars += shard.chars
+                summarized += sum(1 for sess in shard.sessions.values() if sess.summary)
+        return {
+            "active": sessions,
+            "chars": chars,
+            "summarized": summarized,
+            "evicted_lru": self.evicted_lru,
+            "evicted_ttl": self.evicted_ttl,
+        }
+
+
+sessions = ConversationStore()
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def resolve_session_id(header_sid, cookie_sid) -> tuple:
+    """Başlık veya çerezdeki oturum kimliğini doğrular. (sid, yeni_mi) döndürür."""
+    sid = header_sid or cookie_sid
+    if sid and _SESSION_ID_RE.match(sid):
+        return sid, False
+    return secrets.token_urlsafe(16), True
+
+
+def get_session_id() -> tuple:
+    """Flask isteğinden oturum kimliğini okur (başlık veya çerez)."""
+    return resolve_session_id(request.headers.get(SESSION_HEADER), request.cookies.get(SESSION_COOKIE))
+
+class SentenceEmbedder:
+    """
+    sentence-transformers modelini seçilen çalıştırıcıyla (PyTorch/ONNX, fp32/int8)
+    yükler; LangChain Embeddings arayüzüyle (embed_documents / embed_query) uyumludur.
+    Vektörler her zaman L2 normalize float32 döner.
+    """
+
+    BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, threads: int = EMBEDDING_THREADS,
+                 onnx_file: str = ONNX_FILE):
+        from sentence_transformers import SentenceTransformer
+
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Bilinmeyen embedding çalıştırıcısı: {backend} (seçenekler: {', '.join(self.BACKENDS)})")
+        self.backend = backend
+        self.batch_size = batch_size
+        if backend.startswith("onnx"):
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            if threads:
+                options.intra_op_num_threads = threads
+            default_file = "onnx/model_qint8_avx2.onnx" if backend == "onnx-int8" else "onnx/model.onnx"
+            self.model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs={
+                "file_name": onnx_file or default_file,
+                "provider": "CPUExecutionProvider",
+                "session_options": options,
+            })
+        else:
+            import torch
+
+            if threads:
+                torch.set_num_threads(threads)
+            self.model = SentenceTransformer(model_name, device="cpu")
+            if backend == "torch-int8":
+                torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear},
+                                                       dtype=torch.qint8, inplace=True)
+
+    def _encode(self, texts: list) -> np.ndarray:
+        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                 convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+
+    def embed_documents(self, texts: list) -> np.ndarray:
+        return self._encode(list(texts))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._encode([text])[0]
+
+
+# --- PAYLAŞILAN EMBEDDING SUNUCUSU (İSTEMCİ) ---
+# Sunucu embedding_server.py'dedir; protokol ikisinde ortaktır.
+# İstek:  uint32 uzunluk + JSON ({"texts": [...]}, {"op": "ping"} veya {"op": "stats"})
+# Yanıt:  int32 satır + uint32 boyut + satır x boyut float32 vektör;
+#         satır = -1 ise ardından 'boyut' bayt JSON gelir (ping/stats yanıtı veya {"error": ...})
+_REQUEST_HEADER = struct.Struct("<I")
+_RESPONSE_HEADER = struct.Struct("<iI")
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        block = sock.recv(size - len(data))
+        if not block:
+            raise ConnectionError("Embedding sunucusu bağlantısı kapandı")
+        data += block
+    return bytes(data)
+
+
+class EmbeddingClient:
+    """
+    embedding_server.EmbeddingServer'ı SentenceEmbedder ile aynı arayüzle (embed_documents / embed_query)
+    kullanır. İş parçacığı başına kalıcı bir bağlantı açılır (fork sonrası yenisi);
+    bağlantı koparsa istek bir kez yeniden bağlanarak denenir.
+    """
+
+    def __init__(self, path: str = EMBEDDING_SERVER, timeout: float = EMBEDDING_SERVER_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self.backend = None
+
+    def _socket(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            self._reset()
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            local.sock, local.pid = sock, os.getpid()
+        return local.sock
+
+    def _reset(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = self._local.pid = None
+
+    def _exchange(self, sock, payload: bytes):
+        sock.sendall(_REQUEST_HEADER.pack(len(payload)) + payload)
+        rows, size = _RESPONSE_HEADER.unpack(_recv_exact(sock, _RESPONSE_HEADER.size))
+        if rows < 0:
+            reply = json.loads(_recv_exact(sock, size))
+            if "error" in reply:
+                raise RuntimeError(f"Embedding sunucusu: {reply['error']}")
+            return reply
+        return np.frombuffer(_recv_exact(sock, rows * size * 4), dtype=np.float32).reshape(rows, size)
+
+    def _call(self, request: dict):
+        payload = json.dumps(request, ensure_ascii=False).encode("utf-8")
+        for attempt in range(2):
+            try:
+                return self._exchange(self._socket(), payload)
+            except ConnectionError:
+                # Sunucu yeniden başlamış olabilir: bir kez yeni bağlantıyla dene
+                self._reset()
+                if attempt:
+                    raise
+            except OSError:
+                self._reset()  # Zaman aşımı vb.: yarım kalan yanıt sonraki isteğe karışmasın
+                raise
+
+    def wait_ready(self, timeout: float = EMBEDDING_SERVER_WAIT) -> dict:
+        """Sunucu yanıt verene kadar (model yüklenirken) bekler; sunucu bilgisini döndürür."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                info = self._call({"op": "ping"})
+                self.backend = info.get("backend")
+                return info
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def stats(self) -> dict:
+        return self._call({"op": "stats"})
+
+    def embed_documents(self, texts: list) -> np.ndarray:
+        return self._call({"texts": list(texts)})
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._call({"texts": [text]})[0]
+
+
+def _get_embeddings():
+    if not EMBEDDING_SERVER:
+        return SentenceEmbedder()
+    embeddings = EmbeddingClient(EMBEDDING_SERVER)
+    info = embeddings.wait_ready()
+    if (info.get("model"), info.get("backend")) != (EMBEDDING_MODEL, EMBEDDING_BACKEND):
+        # Manifest bu worker'ın ayarlarıyla karşılaştırılır; farklıysa indeks yeniden gömülür
+        log.warning(f"⚠️ Embedding sunucusu {info.get('model')} ({info.get('backend')}) kullanıyor, "
+                    f"bu process'in ayarı {EMBEDDING_MODEL} ({EMBEDDING_BACKEND})")
+    log.info(f"✓ Paylaşılan embedding sunucusu: {EMBEDDING_SERVER}", extra={"fields": info})
+    return embeddings
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _index_params() -> dict:
+    """Değişince indeksin baştan kurulmasını gerektiren ayarlar."""
+    return {
+        "version": INDEX_FORMAT_VERSION,
+        "embedding_model": EMBEDDING_MODEL,
+        # Nicemlenmiş/ONNX vektörleri fp32 vektörlerle birebir aynı değildir
+        "embedding_backend": EMBEDDING_BACKEND,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+    }
+
+
+# Sonradan eklenen ayarlar: eski manifest'lerde yoksa bu değerlerle kurulmuş sayılır
+_PARAM_DEFAULTS = {"embedding_backend": "torch"}
+
+
+def _params_match(manifest: dict, params: dict) -> bool:
+    return all(manifest.get(k, _PARAM_DEFAULTS.get(k)) == v for k, v in params.items())
+
+
+def _load_manifest(root: str = VECTOR_DB_PATH) -> dict:
+    try:
+        with open(os.path.join(root, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest: dict, root: str = VECTOR_DB_PATH):
+    path = os.path.join(root, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+# --- MMAP BİLGİ BANKASI ---
+# faiss_index/
+#   manifest.json           -> ayarlar, dosya özetleri ve geçerli artifact
+#   <artifact>/index.faiss  -> FAISS indeksi (mmap ile okunur)
+#   <artifact>/vectors.f32  -> ham float32 vektörler (count x dim)
+#   <artifact>/chunks.bin   -> parça metinleri art arda (UTF-8)
+#   <artifact>/chunks.idx   -> parça başına (offset, uzunluk, kaynak, sayfa)
+# Hiçbir dosya pickle içermez; worker'lar dosyaları salt okunur mmap ile açar,
+# böylece sayfa önbelleği (page cache) tüm process'ler arasında paylaşılır.
+CHUNK_DTYPE = np.dtype([("offset", "<i8"), ("length", "<i4"), ("source", "<i4"), ("page", "<i4")])
+
+
+def _index_spec(count: int, dim: int, index_type: str = None) -> dict:
+    """
+    Kurulacak FAISS indeksinin tipi ve kurulum parametreleri.
+    IVF-PQ eğitimi küme ve kod kitabı başına yeterli örnek ister; küçük bilgi
+    bankalarında (256 parçadan az) düz indekse geri dönülür.
+    """
+    index_type = (index_type or INDEX_TYPE).lower()
+    if index_type == "hnsw":
+        return {"type": "hnsw", "m": HNSW_M}
+    if index_type == "ivfpq":
+        if count < 256:
+            log.warning(f"⚠️ IVF-PQ için en az 256 parça gerekir ({count} var), düz indeks kullanılıyor")
+            return {"type": "flat"}
+        # Önerilen küme sayısı ~4·√n; her küme için en az 39 eğitim örneği
+        nlist = IVF_NLIST or int(4 * count ** 0.5)
+        nlist = max(1, min(nlist, count // 39))
+        m = max(d for d in range(1, min(PQ_M, dim) + 1) if dim % d == 0)
+        # PQ kod kitabı başına 2^nbits merkez; az veride daha küçük kod kitabı
+        nbits = max(4, min(8, int(np.log2(count / 39))))
+        return {"type": "ivfpq", "nlist": nlist, "m": m, "nbits": nbits}
+    if index_type != "flat":
+        log.warning(f"⚠️ Bilinmeyen indeks tipi '{index_type}', düz indeks kullanılıyor")
+    return {"type": "flat"}
+
+
+def build_faiss_index(vectors: np.ndarray, spec: dict, blocks=None, block_rows: int = 65536):
+    """
+    Normalize vektörlerden iç çarpım (= kosinüs) indeksi kurar; gerekiyorsa eğitir.
+    vectors bir np.memmap olabilir: vektörler indekse bloklar halinde eklenir (blocks
+    verilmişse o bloklar), böylece indeksin kendisi dışında ikinci bir kopya belleğe alınmaz.
+    """
+    count, dim = vectors.shape
+    if spec["type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, spec["m"], faiss.METRIC_INNER_PRODUCT)
+    elif spec["type"] == "ivfpq":
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, spec["nlist"], spec["m"], spec["nbits"],
+                                 faiss.METRIC_INNER_PRODUCT)
+        # k-means küme başına 256 örnekten fazlasını kullanmaz; eşit aralıklı örneklem yeter
+        step = max(1, count // (256 * spec["nlist"]))
+        index.train(np.ascontiguousarray(vectors[::step], dtype=np.float32))
+    else:
+        index = faiss.IndexFlatIP(dim)
+    if blocks is None:
+        blocks = (vectors[start:start + block_rows] for start in range(0, count, block_rows))
+    for block in blocks:
+        index.add(np.ascontiguousarray(block, dtype=np.float32))
+    return index
+
+
+def _read_vector_blocks(path: str, dim: int, block_rows: int = 65536):
+    """vectors.f32'yi bloklar halinde okur (mmap'in aksine okunan sayfalar RSS'te kalmaz)."""
+    with open(path, "rb") as f:
+        while True:
+            block = np.fromfile(f, dtype=np.float32, count=block_rows * dim)
+            if not len(block):
+                return
+            yield block.reshape(-1, dim)
+
+
+def _tune_search(index):
+    """Arama zamanı parametrelerini (efSearch, nprobe) ortam değişkenlerinden uygular."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = IVF_NPROBE
+    return index
+
+
+def search_index(index, vectors: np.ndarray, query: np.ndarray, k: int) -> tuple:
+    """
+    İndekste arar; IVF-PQ için k·IVF_REFINE aday alınır ve skorlar mmap'teki ham
+    vektörlerle yeniden hesaplanır (nicemleme kaybını geri kazanır).
+    """
+    query = query.reshape(1, -1)
+    if IVF_REFINE <= 1 or not isinstance(index, faiss.IndexIVFPQ):
+        scores, rows = index.search(query, k)
+        return rows[0], scores[0]
+    _, rows = index.search(query, k * IVF_REFINE)
+    rows = rows[0][rows[0] != -1]
+    scores = vectors[np.sort(rows)] @ query[0]
+    order = np.argsort(-scores, kind="stable")[:k]
+    return np.sort(rows)[order], scores[order]
+
+
+def _read_faiss_index(path: str):
+    """FAISS indeksini mümkünse mmap ile, değilse belleğe okuyarak açar."""
+    for flags in (getattr(faiss, "IO_FLAG_MMAP_IFC", 0), faiss.IO_FLAG_MMAP):
+        if not flags:
+            continue
+        try:
+            return faiss.read_index(path, flags | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            pass
+    return faiss.read_index(path)
+
+
+# --- BM25 SÖZCÜK İNDEKSİ ---
+# <artifact>/bm25.terms -> sıralı terim listesi (satır başına bir terim)
+# <artifact>/bm25.ptr   -> terim başına posting başlangıcı (int64, terim sayısı + 1)
+# <artifact>/bm25.post  -> (satır, terim frekansı) çiftleri, terim sırasıyla
+# <artifact>/bm25.len   -> parça başına terim sayısı
+LEXICAL_FORMAT = 1
+POSTING_DTYPE = np.dtype([("row", "<i4"), ("tf", "<u2")])
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # Reciprocal rank fusion sabiti
+
+_TOKEN_RE = re.compile(r"\w+")
+_STEM_PREFIX = 5  # Türkçe için sabit önek gövdeleme (ilk 5 harf)
+_HARDENING = {"g": "k", "b": "p", "d": "t"}  # "paniğe" -> "panik"
+_LEXICAL_STOPWORDS = frozenset("""
+    acaba ama ancak bana bazi beni benim ben bile bir biraz birkac biz bu cok cunku da daha de
+    defa demek diye en gibi hangi hem hep her hic icin ile ise kadar ki kim mi mu nasil ne neden
+    nedir nelerdir nerede o olan olarak on ona onu sanki sen sey siz su sunu tum ve veya ya yani
+""".split())
+
+
+def lexical_terms(text: str) -> list:
+    """Metni BM25 terimlerine ayırır: Türkçe harf katlama, durak kelime ve önek gövdeleme."""
+    terms = []
+    for token in _TOKEN_RE.findall(_route_fold(text)):
+        if len(token) < 2 or token in _LEXICAL_STOPWORDS or token.isdigit():
+            continue
+        stem = token[:_STEM_PREFIX]
+        terms.append(stem[:-1] + _HARDENING[stem[-1]] if stem[-1] in _HARDENING else stem)
+    return terms
+
+
+class LexicalIndex:
+    """Parça metinleri üzerinde BM25 ters indeksi; posting dizileri mmap ile okunur."""
+
+    def __init__(self, path: str, count: int):
+        with open(os.path.join(path, "bm25.terms"), encoding="utf-8") as f:
+            self.terms = {term: i for i, term in enumerate(f.read().split("\n")) if term}
+        self.ptr = np.fromfile(os.path.join(path, "bm25.ptr"), dtype=np.int64)
+        self.postings = np.memmap(os.path.join(path, "bm25.post"), dtype=POSTING_DTYPE, mode="r",
+                                  shape=(int(self.ptr[-1]),)) if self.ptr[-1] else np.zeros(0, POSTING_DTYPE)
+        self.lengths = np.fromfile(os.path.join(path, "bm25.len"), dtype=np.int32)
+        self.count = count
+        self.avgdl = float(self.lengths.mean()) if count else 0.0
+        df = np.diff(self.ptr).astype(np.float32)
+        self.idf = np.log1p((count - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Parça uzunluğu normalizasyonu sorgudan bağımsızdır, bir kez hesaplanır
+        self._norm = (BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(self.avgdl, 1.0))).astype(np.float32)
+
+    @classmethod
+    def open(cls, path: str, count: int):
+        """Artifact'te BM25 dosyaları yoksa (eski artifact) None döndürür."""
+        if not os.path.exists(os.path.join(path, "bm25.ptr")):
+            return None
+        return cls(path, count)
+
+    def search(self, terms: list, k: int) -> list:
+        """En yüksek BM25 skorlu k parçanın (satır, skor, eşleşen terim sayısı) listesi."""
+        scores = np.zeros(self.count, dtype=np.float32)
+        matched = np.zeros(self.count, dtype=np.int32)
+        for term in set(terms):
+            t = self.terms.get(term)
+            if t is None:
+                continue
+            block = self.postings[self.ptr[t]:self.ptr[t + 1]]
+            rows = block["row"]
+            tf = block["tf"].astype(np.float32)
+            scores[rows] += self.idf[t] * tf * (BM25_K1 + 1) / (tf + self._norm[rows])
+            matched[rows] += 1
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(r), float(scores[r]), int(matched[r])) for r in candidates]
+
+    def confident(self, terms: list, hits: list, k: int) -> bool:
+        """
+        Kısa sorgunun tüm terimleri sözlükte var ve ilk k sonucun her biri tüm
+        terimleri içeriyorsa (ör. sözlükte geçen bir kavram) vektör aramasına gerek yoktur.
+        """
+        unique = set(terms)
+        if not unique or len(unique) > LEXICAL_FAST_MAX_TERMS or len(hits) < k:
+            return False
+        if any(term not in self.terms for term in unique):
+            return False
+        return all(m == len(unique) for _, _, m in hits[:k])
+
+
+class LexicalWriter:
+    """
+    BM25 dosyalarını akış halinde yazar. Posting'ler geliş sırasıyla geçici bir dosyaya
+    eklenir; finish() bunları terim sırasına göre sayma sıralamasıyla (counting sort)
+    bm25.post'a dağıtır. Bellekte yalnızca sözlük ve blok boyutunda diziler tutulur.
+    """
+    SPILL_DTYPE = np.dtype([("term", "<i4"), ("row", "<i4"), ("tf", "<u2")])
+    BLOCK = 1 << 18  # finish() sırasında bir kerede işlenen posting sayısı
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._terms = {}  # terim -> geçici kimlik (geliş sırası)
+        self._spill = open(os.path.join(path, "bm25.spill"), "wb")
+        self._lengths = open(os.path.join(path, "bm25.len"), "wb")
+
+    def add(self, texts: list):
+        """Sıradaki parçaların metinleri (str)."""
+        ids, rows, tfs = [], [], []
+        lengths = np.zeros(len(texts), dtype=np.int32)
+        for i, text in enumerate(texts):
+            terms = lexical_terms(text)
+            lengths[i] = len(terms)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                ids.append(self._terms.setdefault(term, len(self._terms)))
+                rows.append(self.count + i)
+                tfs.append(min(tf, 65535))
+        self.count += len(texts)
+        block = np.zeros(len(ids), dtype=self.SPILL_DTYPE)
+        block["term"], block["row"], block["tf"] = ids, rows, tfs
+        block.tofile(self._spill)
+        lengths.tofile(self._lengths)
+
+    def _blocks(self, path: str):
+        with open(path, "rb") as f:
+            while True:
+                block = np.fromfile(f, dtype=self.SPILL_DTYPE, count=self.BLOCK)
+                if not len(block):
+                    return
+                yield block
+
+    def finish(self):
+        self._spill.close()
+        self._lengths.close()
+        spill_path = os.path.join(self.path, "bm25.spill")
+        vocabulary = sorted(self._terms)
+        # Geçici kimlik -> alfabetik sıradaki kimlik
+        rank = np.zeros(len(vocabulary), dtype=np.int64)
+        rank[[self._terms[term] for term in vocabulary]] = np.arange(len(vocabulary))
+        total = os.path.getsize(spill_path) // self.SPILL_DTYPE.itemsize
+        df = np.zeros(len(vocabulary), dtype=np.int64)
+        for block in self._blocks(spill_path):
+            df += np.bincount(rank[block["term"]], minlength=len(vocabulary))
+        ptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum(df)
+        post_path = os.path.join(self.path, "bm25.post")
+        with open(post_path, "w+b") as f:
+            f.truncate(total * POSTING_DTYPE.itemsize)
+            if total:
+                output = mmap.mmap(f.fileno(), 0)
+                postings = np.frombuffer(output, dtype=POSTING_DTYPE)
+                cursor = ptr[:-1].copy()
+                for block in self._blocks(spill_path):
+                    # Blok içinde terime göre kararlı sıralama: her terimin satırları artan kalır
+                    terms = rank[block["term"]]
+                    order = np.argsort(terms, kind="stable")
+                    terms = terms[order]
+                    unique, first, sizes = np.unique(terms, return_index=True, return_counts=True)
+                    positions = cursor[terms] + np.arange(len(terms)) - np.repeat(first, sizes)
+                    postings["row"][positions] = block["row"][order]
+                    postings["tf"][positions] = block["tf"][order]
+                    cursor[unique] += sizes
+                    # Yazılan sayfaları diske aktarıp bırak: çıktı dosyası RSS'te birikmesin
+                    output.flush()
+                    output.madvise(mmap.MADV_DONTNEED)
+                del postings
+                output.close()
+        os.remove(spill_path)
+        with open(os.path.join(self.path, "bm25.terms"), "w", encoding="utf-8") as f:
+            f.write("\n".join(vocabulary))
+        ptr.tofile(os.path.join(self.path, "bm25.ptr"))
+
+
+def reciprocal_rank_fusion(rankings: list, k: int) -> list:
+    """Sıralı (satır, skor, ...) listelerini 1 / (RRF_K + sıra) toplamıyla birleştirir."""
+    fused = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking):
+            fused[hit[0]] = fused.get(hit[0], 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+class KnowledgeIndex:
+    """Salt okunur, mmap ile açılmış bilgi bankası artifact'i."""
+
+    def __init__(self, root: str, manifest: dict):
+        self.manifest = manifest
+        self.path = os.path.join(root, manifest["artifact"])
+        self.sources = manifest["sources"]
+        self.count = manifest["count"]
+        self.dim = manifest["dim"]
+        self.index = _tune_search(_read_faiss_index(os.path.join(self.path, "index.faiss")))
+        self.vectors = np.memmap(os.path.join(self.path, "vectors.f32"), dtype=np.float32,
+                                 mode="r", shape=(self.count, self.dim))
+        self.meta = np.memmap(os.path.join(self.path, "chunks.idx"), dtype=CHUNK_DTYPE,
+                              mode="r", shape=(self.count,))
+        with open(os.path.join(self.path, "chunks.bin"), "rb") as f:
+            self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.lexical = LexicalIndex.open(self.path, self.count)
+
+    @classmethod
+    def open(cls, root: str = VECTOR_DB_PATH):
+        """Geçerli artifact'i açar; yoksa veya boşsa None döndürür."""
+        manifest = _load_manifest(root)
+        if not manifest.get("artifact") or not manifest.get("count"):
+            return None
+        return cls(root, manifest)
+
+    def search(self, vector: np.ndarray, k: int) -> list:
+        """En benzer k parçanın (satır, skor) listesi."""
+        rows, scores = search_index(self.index, self.vectors, vector, k)
+        return [(int(r), float(sc)) for r, sc in zip(rows, scores) if r != -1]
+
+    def text(self, row: int) -> str:
+        meta = self.meta[row]
+        start = int(meta["offset"])
+        return self._text[start:start + int(meta["length"])].decode("utf-8")
+
+    def source(self, row: int) -> str:
+        return self.sources[int(self.meta[row]["source"])]
+
+    def page(self, row: int) -> int:
+        return int(self.meta[row]["page"])
+
+    def rows_for_source(self, file_name: str) -> np.ndarray:
+        if file_name not in self.sources:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.meta["source"] == self.sources.index(file_name))
+
+
+class ArtifactWriter:
+    """
+    Parçaları geldikçe geçici bir dizine ekler (vektörler, metinler, meta veri, BM25) ve
+    write() ile yeni bir bilgi bankası artifact'i olarak yayımlar. Bellekte parça verisi
+    birikmez; yalnızca FAISS indeksi kurulurken vektörler indeksin içine alınır.
+    """
+
+    def __init__(self, root: str = VECTOR_DB_PATH):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._tmp = tempfile.mkdtemp(prefix="build-", suffix=".tmp", dir=root)
+        self._vectors = open(os.path.join(self._tmp, "vectors.f32"), "wb")
+        self._text = open(os.path.join(self._tmp, "chunks.bin"), "wb")
+        self._meta = open(os.path.join(self._tmp, "chunks.idx"), "wb")
+        self._lexical = LexicalWriter(self._tmp)
+        self._sources = {}  # kaynak adı -> geçici kimlik (ekleme sırası)
+        self.count = 0
+        self.dim = 0
+        self._offset = 0
+
+    def add(self, source: str, vectors: np.ndarray, texts: list, pages: list):
+        if not len(texts):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        self.dim = vectors.shape[1]
+        encoded = [t.encode("utf-8") for t in texts]
+        meta = np.zeros(len(texts), dtype=CHUNK_DTYPE)
+        lengths = np.fromiter((len(t) for t in encoded), dtype=np.int64, count=len(encoded))
+        meta["offset"] = self._offset + np.cumsum(lengths) - lengths
+        meta["length"] = lengths
+        meta["source"] = self._sources.setdefault(source, len(self._sources))
+        meta["page"] = pages
+        vectors.tofile(self._vectors)
+        self._text.write(b"".join(encoded))
+        meta.tofile(self._meta)
+        self._lexical.add(texts)
+        self._offset += int(lengths.sum())
+        self.count += len(texts)
+
+    def copy_from(self, old: KnowledgeIndex, source: str, block_rows: int = 4096):
+        """Değişmeyen bir dosyanın parçalarını eski artifact'ten yeniden gömmeden kopyalar."""
+        rows = old.rows_for_source(source)
+        for start in range(0, len(rows), block_rows):
+            block = rows[start:start + block_rows]
+            self.add(source, np.asarray(old.vectors[block]),
+                     [old.text(r) for r in block], [old.page(r) for r in block])
+
+    def _digest(self, header) -> str:
+        # Eski (bellek içi) yazıcıyla aynı özet: başlık + vektörler + metinler, diskten okunarak
+        digest = hashlib.sha256(json.dumps(header, sort_keys=True).encode())
+        for name in ("vectors.f32", "chunks.bin"):
+            with open(os.path.join(self._tmp, name), "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def discard(self):
+        for f in (self._vectors, self._text, self._meta):
+            f.close()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def write(self, params: dict, files: dict, index_type: str = None) -> dict:
+        """Artifact'i yayımlar, manifest'i atomik olarak günceller ve manifest'i döndürür."""
+        for f in (self._vectors, self._text, self._meta):
+            f.close()
+        self._lexical.finish()
+        sources = list(files)
+        count, dim = self.count, self.dim
+        if count:
+            # Kaynak kimlikleri manifest'teki sıraya çevrilir
+            remap = np.zeros(len(self._sources), dtype=np.int32)
+            for name, provisional in self._sources.items():
+                remap[provisional] = sources.index(name)
+            meta = np.memmap(os.path.join(self._tmp, "chunks.idx"), dtype=CHUNK_DTYPE, mode="r+", shape=(count,))
+            meta["source"] = remap[meta["source"]]
+            meta.flush()
+            del meta
+        spec = _index_spec(count, dim, index_type)
+
+        # İçerikten türetilen artifact adı: aynı girdi her zaman aynı artifact'i üretir
+        artifact = f"v{INDEX_FORMAT_VERSION}-{self._digest([params, files, spec, LEXICAL_FORMAT])[:16]}"
+        manifest = {**params, "artifact": artifact, "count": count, "dim": dim,
+                    "index_type": (index_type or INDEX_TYPE).lower(), "index": spec,
+                    "lexical": LEXICAL_FORMAT, "sources": sources, "files": files}
+
+        target = os.path.join(self.root, artifact)
+        if count and not os.path.isdir(target):
+            started = time.perf_counter()
+            path = os.path.join(self._tmp, "vectors.f32")
+            vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(count, dim))
+            index = build_faiss_index(vectors, spec, blocks=_read_vector_blocks(path, dim))
+            del vectors
+            faiss.write_index(index, os.path.join(self._tmp, "index.faiss"))
+            del index
+            log.info(f"  ✓ {spec['type']} indeksi kuruldu", extra={"fields": {
+                "seconds": round(time.perf_counter() - started, 2), "count": count}})
+            os.replace(self._tmp, target)
+        else:
+            shutil.rmtree(self._tmp, ignore_errors=True)
+        _save_manifest(manifest, self.root)
+        _remove_old_artifacts(self.root, artifact)
+        return manifest
+
+
+_ARTIFACT_RE = re.compile(r"^v\d+-[0-9a-f]{16}$")
+
+
+def _remove_old_artifacts(root: str, keep: str):
+    """
+    Eski artifact'leri ve eski (pickle) LangChain indeks dosyalarını siler.
+    Bu dosyaları mmap ile açmış process'ler, kapatana kadar okumaya devam edebilir.
+    """
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name in (keep, MANIFEST_FILE) or name.endswith(".tmp"):
+            continue
+        if os.path.isdir(path) and _ARTIFACT_RE.match(name):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name in ("index.faiss", "index.pkl"):
+            os.remove(path)
+
+
+# --- PDF OKUMA ---
+PAGE_CACHE_DIR = "pages"
+PAGE_CACHE_FORMAT = 1
+
+
+class PageCache:
+    """
+    PDF sayfa metinlerinin disk önbelleği: <indeks dizini>/pages/<sha256>.pages.
+    Dosya: JSON başlık satırı + (sayfa sayısı + 1) adet int64 ofset + zlib ile sıkıştırılmış
+    UTF-8 metin. Anahtar PDF'in içerik özetidir, dosya değişince kayıt kendiliğinden
+    kullanılmaz olur; pypdf sürümü değişmişse kayıt yok sayılır (metin çıkarma farklı olabilir).
+    Parçalama ayarları değişip indeks baştan kurulurken PDF'ler yeniden okunmaz.
+    """
+
+    def __init__(self, root: str = VECTOR_DB_PATH):
+        self.path = os.path.join(root, PAGE_CACHE_DIR)
+
+    @staticmethod
+    def _header(pages: int) -> dict:
+        from pypdf import __version__ as pypdf_version
+
+        return {"format": PAGE_CACHE_FORMAT, "pypdf": pypdf_version, "pages": pages}
+
+    def _file(self, digest: str) -> str:
+        return os.path.join(self.path, f"{digest}.pages")
+
+    def get(self, digest: str):
+        """Sayfa metinlerinin listesi; kayıt yoksa veya geçersizse None."""
+        try:
+            with open(self._file(digest), "rb") as f:
+                line, _, data = f.read().partition(b"\n")
+            header = json.loads(line)
+            pages = header.get("pages", -1)
+            if header != self._header(pages):
+                return None
+            offsets = np.frombuffer(data, dtype="<i8", count=pages + 1)
+            text = zlib.decompress(data[offsets.nbytes:])
+            return [text[a:b].decode("utf-8") for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    def put(self, digest: str, pages: list):
+        encoded = [page.encode("utf-8") for page in pages]
+        offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+        offsets[1:] = np.cumsum([len(page) for page in encoded])
+        path = self._file(digest)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(json.dumps(self._header(len(pages))).encode() + b"\n")
+                f.write(offsets.tobytes())
+                f.write(zlib.compress(b"".join(encoded), 6))
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            log.warning(f"⚠️ Sayfa önbelleği yazılamadı: {e}")
+
+    def prune(self, keep):
+        """Özeti 'keep' içinde olmayan kayıtları siler (artık bilgi bankasında olmayan PDF sürümleri)."""
+        keep = {f"{digest}.pages" for digest in keep}
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(".pages") and name not in keep:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+
+def _text_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+def pdf_page_count(file_name: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(file_name).pages)
+
+
+def _page_texts(reader, start: int, stop: int) -> list:
+    return [reader.pages[page].extract_text(extraction_mode="plain").strip() for page in range(start, stop)]
+
+
+def _split_pages(texts: list, start: int, splitter) -> list:
+    """start'tan başlayan sayfa metinlerini parçalar: [(metin, sayfa), ...]."""
+    chunks = []
+    for page, text in enumerate(texts, start):
+        chunks.extend((chunk, page) for chunk in splitter.split_text(text))
+    return chunks
+
+
+def extract_pages(file_name: str, start: int = 0, stop: int = None) -> list:
+    """PDF'in [start, stop) sayfalarının metinleri (process havuzunda da çalışır)."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_name)
+    stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+    return _page_texts(reader, start, stop)
+
+
+def extract_chunks(file_name: str, start: int = 0, stop: int = None) -> list:
+    """
+    PDF'in [start, stop) sayfalarını okuyup parçalar: [(metin, sayfa), ...].
+    PyPDFLoader + split_documents ile aynı parçaları üretir (her sayfa ayrı parçalanır),
+    bu yüzden sayfa aralıkları ayrı ayrı okunup sırayla birleştirilebilir.
+    """
+    return _split_pages(extract_pages(file_name, start, stop), start, _text_splitter())
+
+
+def iter_pdf_chunks(files: list, workers: int = 1, cache: PageCache = None, digests: dict = None):
+    """
+    Dosyaları sırayla, sayfa aralığı (PDF_PAGES_PER_TASK) başına okuyup parçalar ve
+    (dosya, sayfa sayısı, [(metin, sayfa), ...]) üretir; her dosyanın sonunda
+    (dosya, 0, None) işareti gelir. Açılamayan dosya atlanır (işaret gelmez),
+    okunamayan sayfa aralığı uyarıyla atlanır.
+    cache ve digests (dosya -> sha256) verilirse sayfa metinleri önce önbellekten okunur;
+    okunan dosyanın tüm sayfaları çıkarılabildiyse metinleri önbelleğe yazılır.
+    workers > 1 ise metin çıkarma bir process havuzunda yapılır (PDF metin çıkarma saf
+    Python'dur, iş parçacıkları GIL yüzünden hızlandırmaz); sonuçlar tüketildikçe en
+    fazla 2·workers aralık önden okunur. Parçalama bu process'te yapılır.
+    """
+    from pypdf import PdfReader
+
+    splitter = _text_splitter()
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def ranges(pages: int):
+        return [(start, min(start + PDF_PAGES_PER_TASK, pages)) for start in range(0, pages, PDF_PAGES_PER_TASK)]
+
+    def tasks():
+        # (dosya, başlangıç, bitiş, metinler | Future | çağrılabilir); dosya sonunda (dosya, None, None, özet)
+        for file_name in files:
+            digest = digests.get(file_name) if cache is not None and digests else None
+            texts = cache.get(digest) if digest else None
+            if texts is not None:
+                INGESTED.inc("cached_pages", len(texts))
+                for start, stop in ranges(len(texts)):
+                    yield file_name, start, stop, texts[start:stop]
+                yield file_name, None, None, None
+                continue
+            try:
+                reader = None if pool else PdfReader(file_name)
+                parts = ranges(pdf_page_count(file_name) if pool else len(reader.pages))
+            except Exception as e:
+                log.warning(f"  ⚠️ {file_name} yüklenemedi: {e}")
+                continue
+            for start, stop in parts:
+                yield file_name, start, stop, (pool.submit(extract_pages, file_name, start, stop) if pool
+                                               else lambda start=start, stop=stop: _page_texts(reader, start, stop))
+            yield file_name, None, None, digest
+
+    read, complete = [], True
+
+    def collect(task: tuple):
+        nonlocal read, complete
+        file_name, start, stop, source = task
+        if start is None:
+            if source and complete:
+                cache.put(source, read)
+            read, complete = [], True
+            return file_name, 0, None
+        try:
+            texts = source if isinstance(source, list) else source.result() if pool else source()
+        except Exception as e:
+            log.warning(f"  ⚠️ {file_name} sayfa {start}-{stop - 1} okunamadı: {e}")
+            complete = False
+            return None
+        if source is not texts:
+            read.extend(texts)
+        return file_name, stop - start, _split_pages(texts, start, splitter)
+
+    lookahead = 2 * workers if pool else 0
+    pending = deque()
+    try:
+        for task in tasks():
+            pending.append(task)
+            while len(pending) > lookahead or (pending and pending[0][1] is None):
+                item = collect(pending.popleft())
+                if item:
+                    yield item
+        while pending:
+            item = collect(pending.popleft())
+            if item:
+                yield item
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+
+def iter_batches(files: list, workers: int = 1, batch_size: int = None, cache: PageCache = None,
+                 digests: dict = None):
+    """
+    iter_pdf_chunks çıktısını sabit boyutlu yığınlara böler: (dosya, sayfa sayısı, metinler,
+    sayfalar). Yığınlar dosya sınırını aşmaz, böylece bir dosyanın vektörleri artımlı
+    güncellemede de baştan kurulumdakiyle aynı yığınlarda hesaplanır. Dosya sonunda
+    (dosya, 0, None, None) işareti gelir.
+    """
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    texts, pages, read = [], [], 0
+    for file_name, page_count, chunks in iter_pdf_chunks(files, workers, cache, digests):
+        read += page_count
+        if chunks is None:
+            if texts:
+                yield file_name, read, texts, pages
+            yield file_name, 0, None, None
+            texts, pages, read = [], [], 0
+            continue
+        for text, page in chunks:
+            texts.append(text)
+            pages.append(page)
+            if len(texts) == batch_size:
+                yield file_name, read, texts, pages
+                texts, pages, read = [], [], 0
+
+
+def prefetch(items, depth: int):
+    """
+    items'ı arka plandaki bir iş parçacığında üretir; en fazla 'depth' öğe önden hazırlanır,
+    kuyruk doluysa üretici bekler (geri basınç). Üreticideki hata tüketicide yeniden fırlatılır.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((None, item)):
+                    return
+            put((None, done))
+        except BaseException as e:
+            put((e, None))
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+
+    producer = threading.Thread(target=produce, name="ayla-ingest", daemon=True)
+    producer.start()
+    try:
+        while True:
+            error, item = buffer.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+def update_vector_db(embeddings, workers: int = 1, root: str = VECTOR_DB_PATH, batch_size: int = None):
+    """
+    Bilgi bankasını PDF_FILES ile eşitler ve KnowledgeIndex döndürür (hiç belge yoksa None).
+    manifest.json dosya başına içerik özetini (sha256) ve indeks ayarlarını tutar:
+    yalnızca yeni/değişen dosyalar yeniden parçalanıp gömülür, değişmeyen dosyaların
+    vektörleri eski artifact'ten kopyalanır, silinen dosyalar dışarıda kalır.
+    Model veya parçalama ayarları değişmişse indeks baştan kurulur (sayfa metinleri
+    PageCache'ten okunur, PDF'ler yeniden ayrıştırılmaz); yalnızca indeks
+    tipi (AYLA_INDEX_TYPE) veya BM25 formatı değişmişse saklı vektör ve metinlerden
+    yeniden gömmeden kurulur.
+    Kurulum akış halindedir (bkz. iter_batches, prefetch, ArtifactWriter): sayfalar okunup
+    parçalanırken önceki yığınlar gömülüp diske eklenir, bellek kullanımı bilgi bankasının
+    boyutuyla büyümez. workers > 1 ise PDF'ler bir process havuzunda okunur.
+    """
+    params = _index_params()
+    manifest = _load_manifest(root)
+    old = None
+    files = {}
+
+    if manifest.get("artifact") and _params_match(manifest, params):
+        old = KnowledgeIndex.open(root)
+        files = manifest.get("files", {})
+    elif manifest or os.path.exists(os.path.join(root, "index.pkl")):
+        log.warning("⚠️ İndeks ayarları/formatı değişmiş, bilgi bankası yeniden kuruluyor "
+              "(eski LangChain indeksi için: python convert_index.py)")
+
+    current = {f: _file_sha256(f) for f in PDF_FILES if os.path.exists(f)}
+    stale = [f for f, info in files.items() if current.get(f) != info["sha256"]]
+    fresh = [f for f, sha in current.items() if f not in files or files[f]["sha256"] != sha]
+    relayout = old is not None and (manifest.get("index_type", "flat") != INDEX_TYPE.lower()
+                                    or manifest.get("lexical") != LEXICAL_FORMAT)
+    if relayout:
+        log.info(f"🔄 İndeks tipi/BM25 formatı değişmiş ({manifest.get('index_type', 'flat')} → {INDEX_TYPE}), "
+              "saklı vektörlerden yeniden kuruluyor")
+    if not stale and not fresh and not relayout:
+        return old
+
+    writer = ArtifactWriter(root)
+    new_files = {}
+    try:
+        # PDF_FILES sırasıyla yaz: artımlı güncelleme ile baştan kurulum aynı artifact'i üretir.
+        # Değişmeyen dosyalar sırası geldiğinde kopyalanır; yeni/değişenler akıştan gelir.
+        cache = PageCache(root) if PAGE_CACHE_ENABLED else None
+        batches = prefetch(iter_batches(fresh, workers, batch_size, cache, current), INGEST_QUEUE_DEPTH)
+        pending = iter(current)
+        active, chunks, pages_read = None, 0, 0
+        started = time.perf_counter()
+        for file_name, page_count, texts, pages in batches:
+            if file_name != active:
+                # Sıradaki yeni dosyaya kadar değişmeyen dosyaları kopyala
+                for name in pending:
+                    if name == file_name:
+                        break
+                    if name not in fresh:
+                        writer.copy_from(old, name)
+                        new_files[name] = files[name]
+                active = file_name
+            pages_read += page_count
+            INGESTED.inc("pages", page_count)
+            if texts is None:
+                new_files[file_name] = {"sha256": current[file_name], "chunks": chunks}
+                took = time.perf_counter() - started
+                log.info(f"  ✓ {file_name} ({chunks} parça)", extra={"fields": {
+                    "pages": pages_read, "seconds": round(took, 2),
+                    "pages_per_s": round(pages_read / took, 1) if took else 0}})
+                chunks = pages_read = 0
+                started = time.perf_counter()
+                continue
+            with timed("index_embed"):
+                vectors = embeddings.embed_documents(texts)
+            writer.add(file_name, vectors, texts, pages)
+            chunks += len(texts)
+            INGESTED.inc("chunks", len(texts))
+        for name in pending:
+            if name not in fresh:
+                writer.copy_from(old, name)
+                new_files[name] = files[name]
+    except BaseException:
+        writer.discard()
+        raise
+    for file_name in stale:
+        if file_name not in current:
+            log.info(f"  − {file_name}")
+
+    with timed("index_write"):
+        manifest = writer.write(params, new_files)
+    if PAGE_CACHE_ENABLED:
+        PageCache(root).prune(current.values())
+    log.info(f"✓ İndeks güncellendi: {len(fresh)} yeni/değişen, {len(stale)} eski dosya "
+          f"(toplam {manifest['count']} bilgi parçası)")
+    return KnowledgeIndex.open(root)
+
+
+def setup_client() -> bool:
+    """Gemini istemcisini hazırlar (hızlı; model veya indeks yüklemez)."""
+    global client
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        log.error("❌ GEMINI_API_KEY bulunamadı. .env dosyanızı kontrol edin.")
+        return False
+
+    try:
+        http_options = {"base_url": GEMINI_BASE_URL} if GEMINI_BASE_URL else None
+        client = genai.Client(api_key=api_key, http_options=http_options)
+        log.info("✓ Gemini istemcisi hazır")
+        return True
+    except Exception as e:
+        log.error(f"❌ Gemini başlatılamadı: {e}")
+        return False
+
+
+def load_knowledge_base() -> bool:
+    """
+    Embedding modelini ve FAISS bilgi bankasını yükler/günceller.
+    Aynı anda yalnızca bir yükleme çalışır; yüklenemezse normal sohbet devam eder.
+    """
+    global vector_db, embedder, rag_state
+
+    with _rag_lock:
+        if rag_state == "ready":
+            return True
+        rag_state = "loading"
+        started = time.perf_counter()
+        try:
+            embedder = _get_embeddings()
+            vector_db = update_vector_db(embedder)
+            invalidate_retrieval_caches()
+            topic_router.set_centroid(vector_db.vectors if vector_db else None)
+            rag_state = "ready"
+            if vector_db:
+                log.info("✓ Psikoloji bilgi bankası yüklendi", extra={"fields": {
+                    "seconds": round(time.perf_counter() - started, 2),
+                    "chunks": vector_db.count}})
+            return True
+        except Exception as e:
+            rag_state = "failed"
+            log.warning(f"⚠️ PDF veritabanı yüklenemedi (normal sohbet devam edecek): {e}")
+            return False
+
+
+def ensure_warmup():
+    """
+    Bu process'te bilgi bankası henüz yüklenmediyse arka planda yüklemeye başlar.
+    Her istekte çağrılır; gunicorn fork'undan sonra her worker kendi
+    yüklemesini başlatır (preload modunda ise master'da yüklenmiş olan
+    bellek copy-on-write paylaşılır).
+    """
+    global _warmup_pid
+    if _warmup_pid == os.getpid() or rag_state in ("ready", "loading"):
+        return
+    with _rag_lock:
+        if _warmup_pid == os.getpid():
+            return
+        _warmup_pid = os.getpid()
+    threading.Thread(target=load_knowledge_base, name="ayla-warmup", daemon=True).start()
+
+
+def _reset_rag_after_fork():
+    """
+    Master yükleme sürerken fork edilen worker'a yükleme iş parçacığı geçmez; miras kalan
+    'loading' durumu ve tutulu olabilecek kilit sıfırlanır ki worker kendi yüklemesini başlatsın.
+    """
+    global _rag_lock, rag_state
+    _rag_lock = threading.Lock()
+    if rag_state == "loading":
+        rag_state = "idle"
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_rag_after_fork)
+
+
+def setup_vector_db():
+    """
+    Gemini istemcisini hazırlar ve FAISS veritabanını senkron olarak yükler/günceller.
+    İndeks API anahtarı gerektirmez; istemci hazırlanamasa da kurulur (imaj kurulumu
+    için bkz. build_index.py). İstemci hazırsa True döner.
+    """
+    ready = setup_client()
+    load_knowledge_base()
+    return ready
+
+# --- İSTEK BİRLEŞTİRME (SINGLE-FLIGHT) ---
+# Aynı anahtarla eşzamanlı gelen istekler tek bir hesaplamayı paylaşır: ilk gelen
+# (lider) işi yapar, diğerleri onun sonucunu (veya hatasını) bekler. Önbellekten farklı
+# olarak sonuç saklanmaz; iş bitince anahtar silinir. Worker içi, iş parçacıkları arası.
+class SingleFlight:
+    """Tek seferlik hesaplamalar için (bkz. do/ado)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}  # anahtar -> Future
+        self._tasks = {}  # anahtar -> asyncio.Task (event loop içinde)
+
+    def do(self, key, fn):
+        """fn()'i anahtar başına bir kez çalıştırır; eşzamanlı çağıranlar sonucu paylaşır."""
+        if not COALESCE_ENABLED:
+            return fn()
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            COALESCED.inc(self.name)
+            return future.result()
+        FLIGHTS.inc(self.name)
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def ado(self, key, fn):
+        """do'nun asyncio sürümü; fn bir coroutine döndürür. İş ayrı bir task'te
+        yürür, böylece liderin bağlantısı koparsa bekleyenler etkilenmez."""
+        if not COALESCE_ENABLED:
+            return await fn()
+        task = self._tasks.get(key)
+        if task is None:
+            FLIGHTS.inc(self.name)
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._finish_task(key, t))
+        else:
+            COALESCED.inc(self.name)
+        return await asyncio.shield(task)
+
+    def _finish_task(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Kimse beklemiyorsa "hata alınmadı" uyarısı basılmasın
+
+    def stream(self, key, factory):
+        """
+        factory() generator'ının ürettiği parçaları eşzamanlı tüm dinleyicilere dağıtır.
+        Kaynak arka plandaki bir iş parçacığında okunur; sonradan katılan dinleyici
+        önceki parçaları da alır. Hata tüm dinleyicilere iletilir.
+        """
+        if not COALESCE_ENABLED:
+            yield from factory()
+            return
+        with self._lock:
+            broadcast = self._calls.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._calls[key] = _Broadcast()
+        if leader:
+            FLIGHTS.inc(self.name)
+            threading.Thread(target=self._pump, args=(key, broadcast, factory), daemon=True,
+                             name=f"ayla-{self.name}").start()
+        else:
+            COALESCED.inc(self.name)
+        yield from broadcast.listen()
+
+    def _pump(self, key, broadcast, factory):
+        try:
+            for item in factory():
+                broadcast.publish(item)
+        except BaseException as e:
+            broadcast.close(e)
+        else:
+            broadcast.close()
+        finally:
+            with self._lock:
+                if self._calls.get(key) is broadcast:
+                    del self._calls[key]
+
+    async def astream(self, key, factory):
+        """stream'in asyncio sürümü; factory bir async generator döndürür."""
+        if not COALESCE_ENABLED:
+            async for item in factory():
+                yield item
+            return
+        broadcast = self._tasks.get(key)
+        if broadcast is None:
+            FLIGHTS.inc(self.name)
+            broadcast = self._tasks[key] = _AsyncBroadcast()
+            broadcast.task = asyncio.ensure_future(self._apump(key, broadcast, factory))
+        else:
+            COALESCED.inc(self.name)
+        async for item in broadcast.listen():
+            yield item
+
+    async def _apump(self, key, broadcast, factory):
+        try:
+            async for item in factory():
+                broadcast.publish(item)
+        except BaseException as e:
+            broadcast.close(e)
+        else:
+            broadcast.close()
+        finally:
+            if self._tasks.get(key) is broadcast:
+                del self._tasks[key]
+
+
+class _Broadcast:
+    """Tek üretici, çok dinleyicili parça listesi (iş parçacıkları arası)."""
+
+    def __init__(self):
+        self.items = []
+        self.error = None
+        self.done = False
+        self._cond = threading.Condition()
+
+    def publish(self, item):
+        with self._cond:
+            self.items.append(item)
+            self._cond.notify_all()
+
+    def close(self, error: BaseException = None):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def listen(self):
+        seen = 0
+        while True:
+            with self._cond:
+                while seen == len(self.items) and not self.done:
+                    self._cond.wait()
+                batch, done, error = self.items[seen:], self.done, self.error
+            seen += len(batch)
+            yield from batch
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class _AsyncBroadcast:
+    """_Broadcast'in event loop içi sürümü."""
+
+    def __init__(self):
+        self.items = []
+        self.error = None
+        self.done = False
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def publish(self, item):
+        self.items.append(item)
+        self._changed.set()
+
+    def close(self, error: BaseException = None):
+        self.error = error
+        self.done = True
+        self._changed.set()
+
+    async def listen(self):
+        seen = 0
+        while True:
+            while seen == len(self.items) and not self.done:
+                self._changed.clear()
+                await self._changed.wait()
+            batch, done = self.items[seen:], self.done
+            seen += len(batch)
+            for item in batch:
+                yield item
+            if done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+# --- SORGU ÖNBELLEKLERİ ---
+def turkish_casefold(text: str) -> str:
+    """Türkçe kurallarıyla küçük harfe çevirir ('İ' -> 'i', 'I' -> 'ı')."""
+    return text.replace("İ", "i").replace("I", "ı").lower()
+
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+# Kullanıcılar Türkçe karakterleri sık sık atladığı için eşleştirme ASCII üzerinde yapılır.
+# Büyük harfler de tabloda olduğundan 'İ'/'I' sorunu tek bir translate() ile çözülür.
+_ASCII_FOLD = str.maketrans("İIıĞğÜüŞşÖöÇçÂâÎîÛû", "iiigguussooccaaiiuu")
+
+
+def _route_fold(text: str) -> str:
+    return text.translate(_ASCII_FOLD).lower()
+
+
+def normalize_query(text: str) -> str:
+    """Önbellek anahtarı: Türkçe küçük harf, noktalama yok, tek boşluk."""
+    return " ".join(_NON_WORD_RE.sub(" ", turkish_casefold(text)).split())
+
+
+class LRUCache:
+    """Boyut ve süre (TTL) sınırlı, iş parçacığı güvenli LRU önbellek."""
+
+    def __init__(self, capacity: int, ttl: float):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._data = OrderedDict()  # anahtar -> (değer, eklenme zamanı)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _evict_value(self, value):
+        """Alt sınıflar için: atılan değerin kaynaklarını serbest bırakır (kilit altında)."""
+
+    def _lookup(self, key, now: float):
+        item = self._data.get(key)
+        if item is not None and now - item[1] > self.ttl:
+            del self._data[key]
+            self._evict_value(item[0])
+            self.evictions += 1
+            item = None
+        if item is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def _make_room(self):
+        while len(self._data) >= self.capacity:
+            _, (value, _) = self._data.popitem(last=False)
+            self._evict_value(value)
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            return self._lookup(key, time.monotonic())
+
+    def put(self, key, value):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._evict_value(old[0])
+            self._make_room()
+            self._data[key] = (value, time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            for value, _ in self._data.values():
+                self._evict_value(value)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class EmbeddingCache(LRUCache):
+    """
+    Sorgu vektörlerini tek bir önceden ayrılmış float32 matriste tutar;
+    sözlükte yalnızca satır numarası saklanır.
+    """
+
+    def __init__(self, capacity: int, ttl: float):
+        super().__init__(capacity, ttl)
+        self._vectors = None  # İlk eklemede (boyut belli olunca) ayrılır
+        self._free = list(range(capacity))
+
+    def _evict_value(self, slot):
+        self._free.append(slot)
+
+    def get(self, key):
+        with self._lock:
+            slot = self._lookup(key, time.monotonic())
+            return None if slot is None else self._vectors[slot].copy()
+
+    def put(self, key, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._evict_value(old[0])
+            self._make_room()
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._data[key] = (slot, time.monotonic())
+
+
+embedding_cache = EmbeddingCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+retrieval_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)  # (sorgu, k) -> parça kimlikleri
+retrieval_flight = SingleFlight("retrieval")  # Önbellekte olmayan özdeş aramalar bir kez yapılır
+
+
+def invalidate_retrieval_caches():
+    """İndeks değiştiğinde önbelleğe alınmış vektör ve sonuçları geçersiz kılar."""
+    embedding_cache.clear()
+    retrieval_cache.clear()
+    # Cevaplar da bilgi bankası bağlamına dayandığı için geçersiz olur
+    answer_cache.clear()
+
+
+def embed_query(query: str) -> np.ndarray:
+    """Sorgu vektörünü önbellekten veya modelden döndürür."""
+    key = normalize_query(query)
+    vector = embedding_cache.get(key)
+    if vector is None:
+        with timed("embed"):
+            vector = np.asarray(embedder.embed_query(query), dtype=np.float32)
+        embedding_cache.put(key, vector)
+    return vector
+
+
+Chunk = namedtuple("Chunk", "row text source page score")
+retrieval_paths = {"vector": 0, "hybrid": 0, "lexical": 0}  # Önbellek dışı aramaların yolu
+
+
+def _search(db: KnowledgeIndex, query: str, k: int) -> list:
+    """
+    Hybrid modda önce BM25 çalışır; sonuçlar güvenilirse kodlayıcı atlanır,
+    değilse BM25 ve FAISS sıralamaları reciprocal rank fusion ile birleştirilir.
+    """
+    lexical = db.lexical if RETRIEVAL_MODE == "hybrid" else None
+    if lexical is None:
+        retrieval_paths["vector"] += 1
+        vector = embed_query(query)
+        with timed("faiss_search"):
+            return db.search(vector, k)
+    terms = lexical_terms(query)
+    with timed("bm25_search"):
+        lexical_hits = lexical.search(terms, max(k, HYBRID_CANDIDATES))
+    if LEXICAL_FAST_PATH and lexical.confident(terms, lexical_hits, k):
+        retrieval_paths["lexical"] += 1
+        return [(row, score) for row, score, _ in lexical_hits[:k]]
+    retrieval_paths["hybrid"] += 1
+    vector = embed_query(query)
+    with timed("faiss_search"):
+        vector_hits = db.search(vector, max(k, HYBRID_CANDIDATES))
+    return reciprocal_rank_fusion([vector_hits, lexical_hits], k)
+
+
+def _search_and_cache(db: KnowledgeIndex, query: str, k: int, key) -> tuple:
+    hits = tuple(_search(db, query, k))
+    retrieval_cache.put(key, hits)
+    return hits
+
+
+def retrieve(query: str, k: int = 3) -> list:
+    """En alakalı k parçayı (Chunk) döndürür; aynı sorgular için kodlayıcı ve arama atlanır."""
+    db = vector_db
+    key = (normalize_query(query), k)
+    hits = retrieval_cache.get(key)
+    if hits is None:
+        hits = retrieval_flight.do(key, lambda: _search_and_cache(db, query, k, key))
+    return [Chunk(row, db.text(row), db.source(row), db.page(row), score) for row, score in hits]
+
+
+# --- ANLAMSAL CEVAP ÖNBELLEĞİ ---
+# Kriz içeren mesajlar asla önbellekten cevaplanmaz ve önbelleğe yazılmaz
+CRISIS_KEYWORDS = [
+    "intihar", "kendimi öldür", "ölmek istiyorum", "yaşamak istemiyorum",
+    "kendime zarar", "zarar vermek", "canıma kıy", "hayatıma son", "kendimi kes",
+]
+
+
+# "olmek istiyorum" gibi Türkçe karaktersiz yazımlar da yakalansın diye ASCII'ye katlanır
+_CRISIS_FOLDED = [_route_fold(kw) for kw in CRISIS_KEYWORDS]
+
+
+def is_crisis_message(text: str) -> bool:
+    folded = _route_fold(normalize_query(text))
+    return any(kw in folded for kw in _CRISIS_FOLDED)
+
+
+class AnswerCache:
+    """
+    Anlamca çok yakın sorulara Gemini'ye gitmeden önceki cevabı döndürür.
+    Sorgu vektörleri küçük bir FAISS iç çarpım indeksinde tutulur (vektörler
+    normalize olduğu için skor = kosinüs benzerliği). Bir kayıt yalnızca
+    sohbetin son mesajları da aynıysa (ör. ikisinde de geçmiş boşsa) kullanılır.
+    """
+
+    def __init__(self, capacity: int, ttl: float, threshold: float, enabled: bool):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.threshold = threshold
+        self.enabled = enabled
+        self._index = None  # İlk kayıtta vektör boyutuyla oluşturulur
+        self._entries = OrderedDict()  # id -> (cevap, kaynaklar, geçmiş anahtarı, zaman)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+
+    HISTORY_TURNS = 3  # Prompt'a giren en yakın mesajlar; daha eskileri cevabı nadiren değiştirir
+
+    @classmethod
+    def _history_key(cls, history: list) -> int:
+        return hash(tuple(history[-cls.HISTORY_TURNS:]))
+
+    def _usable(self, user_message: str, history: list) -> bool:
+        if not self.enabled or embedder is None:
+            return False
+        # Kriz mesajının kendisi ya da hemen ardından gelen sorular önbelleğe girmez
+        if is_crisis_message(user_message) or any(
+                role == "user" and is_crisis_message(text) for role, text in history[-self.HISTORY_TURNS:]):
+            self.skipped += 1
+            return False
+        return True
+
+    def _remove(self, entry_id: int):
+        del self._entries[entry_id]
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def lookup(self, user_message: str, history: list):
+        """Eşleşen kayıt varsa (cevap, kaynaklar) döndürür, yoksa None."""
+        if not self._usable(user_message, history):
+            return None
+        vector = embed_query(user_message).reshape(1, -1)
+        history_key = self._history_key(history)
+        now = time.monotonic()
+        with self._lock:
+            if self._index is None or not self._entries:
+                self.misses += 1
+                return None
+            scores, ids = self._index.search(vector, min(8, len(self._entries)))
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id == -1 or score < self.threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is None:
+                    continue
+                if now - entry[3] > self.ttl:
+                    self._remove(int(entry_id))
+                    self.evictions += 1
+                    continue
+                if entry[2] == history_key:
+                    self._entries.move_to_end(int(entry_id))
+                    self.hits += 1
+                    return entry[0], entry[1]
+            self.misses += 1
+            return None
+
+    def store(self, user_message: str, history: list, answer: str, sources: str):
+        if not self._usable(user_message, history):
+            return
+        vector = embed_query(user_message).reshape(1, -1)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            while len(self._entries) >= self.capacity:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (answer, sources, self._history_key(history), time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped_crisis": self.skipped,
+            "evictions": self.evictions,
+        }
+
+
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_ENABLED)
+
+
+# --- KONU YÖNLENDİRİCİ ---
+# Varsayılan psikoloji anahtar kelimeleri (AYLA_ROUTER_KEYWORDS ile JSON dosyasından değiştirilebilir)
+PSI_KEYWORDS = [
+    "terapi", "psikoloji", "bdt", "mindfulness", "anksiyete", "depresyon",
+    "stres", "kaygı", "farkındalık", "nefes", "meditasyon", "ego",
+    "bilinçaltı", "travma", "obsesif", "panik", "fobi", "öfke"
+]
+
+# Ünsüz yumuşaması: "panik" -> "paniğe", "kanat" -> "kanadı"
+_SOFTENING = {"k": "g", "p": "b", "t": "d"}
+# ASCII harf -> ona katlanan Türkçe harfler ("g" -> "Ğğ"); desen mesajı katlamadan eşleşsin diye
+_FOLD_VARIANTS = {}
+for _src, _dst in zip("İIıĞğÜüŞşÖöÇçÂâÎîÛû", "iiigguussooccaaiiuu"):
+    _FOLD_VARIANTS[_dst] = _FOLD_VARIANTS.get(_dst, "") + _src
+
+
+def _keyword_stems(keyword: str) -> set:
+    """Bir anahtar kelimenin, ek almış hallerinin de başladığı gövdeleri."""
+    stem = _route_fold(keyword.strip())
+    stems = {stem}
+    if len(stem) > 3 and stem[-1] in _SOFTENING:
+        stems.add(stem[:-1] + _SOFTENING[stem[-1]])
+    return stems
+
+
+def _stem_pattern(stem: str) -> str:
+    """Katlanmış gövdeyi ham metinde arayan desen: "kayg" -> "kay[gĞğ]" (büyük/küçük harf re.I ile)."""
+    return "".join(f"[{ch}{_FOLD_VARIANTS[ch]}]" if ch in _FOLD_VARIANTS else re.escape(ch) for ch in stem)
+
+
+class TopicRouter:
+    """
+    Mesajın psikoloji bilgi bankasına gidip gitmeyeceğine karar verir.
+    Anahtar kelime gövdeleri bir kez tek bir derlenmiş düzenli ifadeye,
+    (?<!\w)(?:gövde1|gövde2|...) alternasyonuna çevrilir; tarama C'de yapılır.
+    Türkçe harfler ve büyük/küçük harf desenin kendisinde karşılandığından mesaj
+    katlanmaz (kopyalanmaz). Eşleşme bir kelimenin başında başlamak zorundadır,
+    sonrasına gelen ekler serbesttir ("kaygılıyım", "paniğe"); uzun gövdeler önce denenir. İstenirse
+    anahtar kelime bulunamayan mesajlar, bilgi bankası vektörlerinin merkezine
+    (centroid) kosinüs benzerliğiyle de yönlendirilebilir.
+    """
+
+    def __init__(self, keywords, centroid_threshold: float = 0.0):
+        self.keywords = sorted({k for k in keywords if k.strip()})
+        self.centroid_threshold = centroid_threshold
+        self._centroid = None
+        self._stems = {stem: keyword for keyword in self.keywords for stem in _keyword_stems(keyword)}
+        alternation = "|".join(_stem_pattern(stem) for stem in sorted(self._stems, key=len, reverse=True))
+        self._pattern = re.compile(rf"(?<!\w)(?:{alternation})", re.IGNORECASE) if self._stems else None
+        self.keyword_hits = 0
+        self.centroid_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls):
+        keywords = PSI_KEYWORDS
+        if ROUTER_KEYWORDS_FILE:
+            with open(ROUTER_KEYWORDS_FILE, encoding="utf-8") as f:
+                data = json.load(f)
+            keywords = data["keywords"] if isinstance(data, dict) else data
+        return cls(keywords, ROUTER_CENTROID_THRESHOLD)
+
+    def matches(self, text: str) -> list:
+        """Metinde kelime başında geçen anahtar kelimeler."""
+        if self._pattern is None:
+            return []
+        return [self._stems[_route_fold(m.group())] for m in self._pattern.finditer(text)]
+
+    def set_centroid(self, vectors):
+        """Bilgi bankası vektörlerinin normalize ortalamasını yedek yönlendirme için saklar."""
+        if not self.centroid_threshold or vectors is None or not len(vectors):
+            self._centroid = None
+            return
+        centroid = np.asarray(vectors, dtype=np.float32).mean(axis=0)
+        self._centroid = centroid / (np.linalg.norm(centroid) or 1.0)
+
+    def route(self, query: str) -> bool:
+        if self._pattern is not None and self._pattern.search(query):
+            self.keyword_hits += 1
+            return True
+        if self._centroid is not None and embedder is not None:
+            if float(embed_query(query) @ self._centroid) >= self.centroid_threshold:
+                self.centroid_hits += 1
+                return True
+        self.misses += 1
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "keywords": len(self.keywords),
+            "stems": len(self._stems),
+            "centroid": self._centroid is not None,
+            "keyword_hits": self.keyword_hits,
+            "centroid_hits": self.centroid_hits,
+            "misses": self.misses,
+        }
+
+
+topic_router = TopicRouter.from_config()
+
+
+# --- PROMPT BAĞLAMI (TOKEN BÜTÇESİ) ---
+# Bulunan parçalar prompt'a girmeden önce:
+#   1. vektörü daha alakalı bir parçaya çok benzeyen (tekrar) parçalar atılır,
+#   2. aynı dosyada art arda gelen parçalar tek pasajda birleştirilir; parçalama
+#      örtüşmesi (CHUNK_OVERLAP) nedeniyle tekrarlanan metin bir kez yazılır,
+#   3. pasajlar alaka sırasıyla token bütçesine yerleştirilir; sığmayan pasaj
+#      cümle sınırından kısaltılır.
+_TOKEN_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+_MIN_OVERLAP = 8  # Daha kısa ortak uçlar tesadüf sayılır
+
+Passage = namedtuple("Passage", "text source rows tokens")
+
+
+def estimate_tokens(text: str) -> int:
+    """Ağ çağrısı yapmadan token tahmini: kelime başına ~CHARS_PER_TOKEN karakter, noktalama ayrı."""
+    return int(sum(-(-len(piece) // CHARS_PER_TOKEN) for piece in _TOKEN_PIECE_RE.findall(text)))
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Metnin bütçeye sığan ilk cümlelerini döndürür; ilk cümle de sığmıyorsa ''."""
+    kept, used = [], 0
+    for sentence in _SENTENCE_END_RE.split(text):
+        cost = estimate_tokens(sentence)
+        if used + cost > budget:
+            break
+        kept.append(sentence)
+        used += cost
+    return " ".join(kept)
+
+
+def _overlap(left: str, right: str) -> int:
+    """left'in sonunda ve right'ın başında tekrarlanan metnin uzunluğu."""
+    for size in range(min(len(left), len(right), 2 * CHUNK_OVERLAP), _MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_adjacent(chunks: list) -> str:
+    text = chunks[0].text
+    for chunk in chunks[1:]:
+        size = _overlap(text, chunk.text)
+        text += chunk.text[size:] if size else "\n" + chunk.text
+    return text
+
+
+def pack_context(db: KnowledgeIndex, docs: list, budget: int) -> list:
+    """
+    Alaka sırasındaki parçaları (Chunk) tekrarsız pasajlara çevirip token
+    bütçesine yerleştirir; prompt'a girecek Passage listesini alaka sırasıyla döndürür.
+    """
+    CONTEXT_CHUNKS.inc("retrieved", len(docs))
+    vectors = np.asarray(db.vectors[[d.row for d in docs]])
+    similarity = vectors @ vectors.T
+    kept = []
+    for i, doc in enumerate(docs):
+        if any(similarity[i, j] >= DEDUP_THRESHOLD
+               and not (docs[j].source == doc.source and abs(docs[j].row - doc.row) == 1)
+               for j in kept):
+            CONTEXT_CHUNKS.inc("duplicate")
+            continue
+        kept.append(i)
+
+    # Art arda satırlar: [en iyi alaka sırası, parçalar]
+    groups = []
+    for i in sorted(kept, key=lambda i: (docs[i].source, docs[i].row)):
+        last = groups[-1][1][-1] if groups else None
+        if last is not None and last.source == docs[i].source and last.row + 1 == docs[i].row:
+            groups[-1][0] = min(groups[-1][0], i)
+            groups[-1][1].append(docs[i])
+            CONTEXT_CHUNKS.inc("merged")
+        else:
+            groups.append([i, [docs[i]]])
+
+    passages, remaining = [], budget
+    for _, chunks in sorted(groups, key=lambda g: g[0]):
+        text = _merge_adjacent(chunks)
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            text = truncate_to_tokens(text, remaining)
+            if not text:
+                CONTEXT_CHUNKS.inc("dropped", len(chunks))
+                continue
+            tokens = estimate_tokens(text)
+            CONTEXT_CHUNKS.inc("truncated")
+        passages.append(Passage(text, chunks[0].source, tuple(c.row for c in chunks), tokens))
+        remaining -= tokens
+    CONTEXT_CHUNKS.inc("packed", sum(len(p.rows) for p in passages))
+    return passages
+
+
+def get_context_if_relevant(query: str) -> tuple:
+    """Sadece psikoloji soruları için PDF'lerden bağlam çeker."""
+    if not vector_db:
+        return "", ""
+    with timed("route"):
+        relevant = topic_router.route(query)
+    if not relevant:
+        return "", ""
+
+    try:
+        with timed("retrieval"):
+            docs = retrieve(query, k=RETRIEVAL_K)
+        if docs:
+            with timed("context_pack"):
+                passages = pack_context(vector_db, docs, PROMPT_CONTEXT_TOKENS)
+            context = "\n\n".join(p.text for p in passages)
+            sources = list(dict.fromkeys(f"📚 {os.path.basename(p.source)}" for p in passages))
+            return context, "\n".join(sources[:2])
+    except:
+        pass
+
+    return "", ""
+
+
+# --- YANIT ÜRETİMİ ---
+SYSTEM_PROMPT = """Sen Ayla, samimi ve zeki bir AI asistanısın. 
+ÖZELLİKLERİN:
+- Modern yapay zeka asistanları gibi doğal, akıcı konuşursun
+- Kısa ve öz cevaplar verirsin (2-4 cümle)
+- Emoji kullanabilirsin ama abartma
+- "Ben bir AI'yım ama..." gibi klişe cümleler kurma
+- Psikoloji konusunda uzman bilgin var
+KURALLAR:
+1. Her konuda rahat sohbet et (hava, spor, yemek, teknoloji...)
+2. Psikoloji/BDT soruları için bilgi bankamı kullan
+3. Kriz durumlarında (intihar, zarar verme) 112/155'i öner
+4. Direkt cevap ver, fazla açıklama yapma"""
+
+GENERATION_CONFIG = {
+    "temperature": 0.9,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 300,
+    "safety_settings": [
+        {"category": cat, "threshold": HarmBlockThreshold.BLOCK_NONE}
+        for cat in [
+            HarmCategory.HARM_CATEGORY_HARASSMENT,
+            HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT
+        ]
+    ],
+}
+
+# Sohbet özetleri: tutarlı olsun diye düşük sıcaklık
+SUMMARY_CONFIG = {
+    **GENERATION_CONFIG,
+    "temperature": 0.2,
+    "max_output_tokens": SUMMARY_MAX_TOKENS,
+}
+
+SUMMARY_PROMPT = """Aşağıda bir kullanıcı ile AYLA arasındaki sohbetin önceki özeti ve ardından gelen mesajlar var.
+Bunları tek bir güncel özette birleştir. Kullanıcının adı, yaşadığı durum, duyguları, hedefleri,
+verilen öneriler ve önemli kararlar gibi sonraki cevaplar için gerekli bilgileri koru; selamlaşma
+ve tekrarları at. Üçüncü şahıs ağzından, en fazla {limit} kelime, düz metin yaz.
+
+ÖNCEKİ ÖZET:
+{summary}
+
+YENİ MESAJLAR:
+{transcript}"""
+
+MAKS_DENEME = 3  # Toplam 3 kez deneyeceğiz
+TEMEL_BEKLEME_SURESI = 1  # 1 saniye ile başlayacak
+MAKS_BEKLEME_SURESI = 4  # Tek bir beklemenin üst sınırı
+
+# Yeniden denemeye değer geçici hatalar (503 ve diğer 5xx sunucu hataları, zaman aşımı
+# ve bağlantı hataları); 429 (kota) da geçici sayılır, bkz. is_retryable. Python 3.10'da
+# concurrent.futures ve asyncio zaman aşımları yerleşik TimeoutError'ın alt sınıfı değildir.
+RETRYABLE_ERRORS = (google_exceptions.ServiceUnavailable, genai_errors.ServerError,
+                    httpx.TransportError, TimeoutError, FuturesTimeoutError, asyncio.TimeoutError,
+                    ConnectionError)
+
+NO_CLIENT_MESSAGE = "Üzgünüm, şu anda bağlantım yok 😔"
+EMPTY_ANSWER_MESSAGE = "Hmm, şu an yanıt veremedim. Tekrar dener misin? 🤔"
+CONNECTION_ERROR_MESSAGE = "Bağlantı sorunu yaşıyorum, biraz sonra tekrar dene 😊"
+BUSY_MESSAGE = "Şu an çok yoğunum, birkaç saniye sonra tekrar dener misin? 🙏"
+CIRCUIT_OPEN_MESSAGE = "Yanıt servisinde geçici bir sorun var, biraz sonra tekrar dene 🛠️"
+RATE_LIMITED_MESSAGE = "Biraz hızlı gidiyoruz 🙂 Birkaç saniye bekleyip tekrar yazar mısın?"
+
+
+# --- GEMINI ERİŞİM KATMANI ---
+# Tüm Gemini çağrıları (sync/async, tek seferde/akış) GeminiGateway'den geçer:
+#   * devre kesici: art arda BREAKER_FAILURES geçici hatada devre açılır, BREAKER_RESET
+#     saniye boyunca istekler Gemini'ye gitmeden anında dostça bir mesajla yanıtlanır,
+#     sonra tek bir deneme isteği (half-open) servisin düzelip düzelmediğini yoklar;
+#   * eşzamanlılık sınırı: worker başına en fazla GEMINI_MAX_CONCURRENCY çağrı; boş yer
+#     GEMINI_QUEUE_TIMEOUT içinde açılmazsa istek "yoğunum" mesajıyla reddedilir;
+#   * yeniden deneme: titreşimli (jitter) üstel bekleme, isteğin GEMINI_DEADLINE
+#     süresini aşacaksa hiç beklenmez;
+#   * hedging (AYLA_HEDGE=1): tek seferlik çağrı son başarılı çağrıların HEDGE_QUANTILE
+#     yüzdeliğinden uzun sürerse ikinci bir istek gönderilir, önce biten kullanılır.
+class GatewayError(Exception):
+    """Gemini'ye ulaşılamadı; user_message kullanıcıya gösterilecek metindir."""
+
+    def __init__(self, user_message: str, reason: str):
+        super().__init__(reason)
+        self.user_message = user_message
+        self.reason = reason
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, genai_errors.APIError) and error.code == 429:
+        return True
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def record_usage(usage):
+    """Gemini'nin saydığı token'ları (usage_metadata) sayaçlara ekler."""
+    if usage is not None:
+        GEMINI_TOKENS.inc("prompt", usage.prompt_token_count or 0)
+        GEMINI_TOKENS.inc("output", usage.candidates_token_count or 0)
+
+
+class SlotLease:
+    """Gemini sırasındaki bir yer; kim önce bırakırsa bıraksın semafora yalnızca bir kez döner."""
+
+    def __init__(self, slots):
+        self._slots = slots
+        self._held = True
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if not self._held:
+                return
+            self._held = False
+        self._slots.release()
+
+
+class CircuitBreaker:
+    """closed -> (art arda hatalar) -> open -> (reset_timeout) -> half_open -> closed/open"""
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+    PROBE = "probe"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, name: str = "chat"):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_at = None  # half_open'da yoklama isteğinin başladığı an
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return self._state
+
+    def allow(self):
+        """
+        İstek Gemini'ye gidebilir mi? half_open'da yalnızca tek bir yoklama isteğine izin verir;
+        o istek için True yerine PROBE döner (bkz. cancel_probe).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._state == "closed":
+                return True
+            if self._state == "open":
+                if now - self._opened_at < self.reset_timeout:
+                    return False
+                self._transition("half_open")
+            # Sonucu hiç bildirilmeyen yoklama reset_timeout sonra kayıp sayılır
+            if self._probe_at is None or now - self._probe_at >= self.reset_timeout:
+                self._probe_at = now
+                return self.PROBE
+            return False
+
+    def cancel_probe(self):
+        """Yoklama isteği Gemini'ye gitmeden vazgeçildi (ör. sıra dolu): yeni yoklamaya izin ver."""
+        with self._lock:
+            if self._state == "half_open":
+                self._probe_at = None
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state != "closed":
+                self._transition("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == "half_open" or (self._state == "closed"
+                                               and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition("open")
+
+    def _transition(self, state: str):
+        self._state = state
+        self._probe_at = None
+        BREAKER_TRANSITIONS.inc(state)
+        log.log(logging.INFO if state == "closed" else logging.WARNING,
+                f"🔌 Gemini devre kesici: {state}", extra={"fields": {"failures": self._failures,
+                                                                "gateway": self.name}})
+
+
+class GeminiGateway:
+    """Gemini çağrılarını devre kesici, eşzamanlılık sınırı, süre sınırı ve hedging ile sarar."""
+
+    def __init__(self, max_concurrency: int = None, queue_timeout: float = None, deadline: float = None,
+                 attempt_timeout: float = None, attempts: int = MAKS_DENEME, hedge: bool = None,
+                 name: str = "chat"):
+        self.max_concurrency = max_concurrency or GEMINI_MAX_CONCURRENCY
+        self.queue_timeout = GEMINI_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.deadline = deadline or GEMINI_DEADLINE
+        self.attempt_timeout = attempt_timeout or GEMINI_ATTEMPT_TIMEOUT
+        self.attempts = attempts
+        self.hedge = HEDGE_ENABLED if hedge is None else hedge
+        self.name = name
+        self.breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET, name)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._async_slots = None  # asyncio.Semaphore, ilk async çağrıda oluşturulur
+        self._hedge_pool = None
+        self._latencies = deque(maxlen=200)  # Son başarılı çağrıların süreleri (hedging eşiği)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    # --- ortak adımlar ---
+    def _config(self, deadline: float, config: dict = None) -> dict:
+        """Deneme başına zaman aşımı: kalan süreyi aşmaz."""
+        timeout = max(0.1, min(self.attempt_timeout, deadline - time.monotonic()))
+        return {**(config or GENERATION_CONFIG), "http_options": {"timeout": int(1000 * timeout)}}
+
+    def _admit(self) -> bool:
+        """Devre kesici izin vermezse GatewayError; istek half_open yoklamasıysa True döner."""
+        allowed = self.breaker.allow()
+        if not allowed:
+            GATEWAY_EVENTS.inc("rejected_open")
+            raise GatewayError(CIRCUIT_OPEN_MESSAGE, "circuit_open")
+        return allowed == CircuitBreaker.PROBE
+
+    def _reject_busy(self, probe: bool):
+        # Gemini'ye gitmeyen yoklama geri verilir; yoksa devre reset_timeout boyunca yoklamasız kalır
+        if probe:
+            self.breaker.cancel_probe()
+        GATEWAY_EVENTS.inc("rejected_busy")
+        raise GatewayError(BUSY_MESSAGE, "busy")
+
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def _leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _succeeded(self, seconds: float):
+        self.breaker.record_success()
+        self._latencies.append(seconds)
+
+    def hedge_delay(self):
+        """Hedge isteği için bekleme süresi; yeterli örnek yoksa veya kapalıysa None."""
+        if not self.hedge or len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        samples = sorted(self._latencies)
+        return samples[min(len(samples) - 1, int(HEDGE_QUANTILE * len(samples)))]
 
-# Hız için Flash-8B modeli, daha detaylı yanıtlar için Pro'ya çevirebilirsiniz
-GEMINI_MODEL = "gemini-2.0-flash-exp"  # En hızlı ve güncel model
-VECTOR_DB_PATH = "faiss_index"
-HOST_IP = "127.0.0.1"
-PORT_NUMBER = 5000
+    def _retry_delay(self, error: Exception, attempt: int, deadline: float, streaming: bool = False) -> float:
+        """
+        Hatayı sınıflandırır ve sayar; yeniden denenecekse bekleme süresini döndürür,
+        denenmeyecekse GatewayError fırlatır.
+        """
+        kind = "Akış" if streaming else "Yanıt"
+        if not is_retryable(error):
+            GEMINI_ATTEMPTS.inc("error")
+            # Servis cevap verdi (ör. 400); devre kesici açısından sağlıklı sayılır
+            self.breaker.record_success()
+            log.error(f"❌ Kalıcı {kind.lower()} hatası: {error}")
+            raise GatewayError(CONNECTION_ERROR_MESSAGE, "error") from error
+        GEMINI_ATTEMPTS.inc("retryable_error")
+        self.breaker.record_failure()
+        log.warning(f"❌ {kind} hatası (geçici), deneme {attempt + 1}/{self.attempts}",
+                    extra={"fields": {"error": error}})
+        if attempt == self.attempts - 1:
+            log.error("Hata: Maksimum deneme sayısına ulaşıldı. Model yanıt vermiyor.")
+            raise GatewayError(CONNECTION_ERROR_MESSAGE, "exhausted") from error
+        # Titreşimli üstel geri çekilme: [tavan/2, tavan] aralığında rastgele
+        ceiling = min(MAKS_BEKLEME_SURESI, TEMEL_BEKLEME_SURESI * (2 ** attempt))
+        delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+        if time.monotonic() + delay >= deadline:
+            GATEWAY_EVENTS.inc("deadline")
+            raise GatewayError(CONNECTION_ERROR_MESSAGE, "deadline") from error
+        return delay
 
-PDF_FILES = [
-    "psikoloji_sozlugu.pdf",
-    "mindfulness_egzersizleri.pdf",
-    "bdt_kilavuzu.pdf"
-]
+    # --- sync ---
+    def _acquire(self, deadline: float, probe: bool = False):
+        if not self._slots.acquire(timeout=max(0.0, min(self.queue_timeout, deadline - time.monotonic()))):
+            self._reject_busy(probe)
 
-client = None
-vector_db = None
-conversation_history = []  # Sohbet geçmişi (son 6 mesaj)
+    def _call(self, messages: list, deadline: float, config: dict = None, lease: SlotLease = None):
+        """
+        Tek bir generate_content denemesi; çağıran yer açmış olmalıdır, yer burada bırakılır.
+        lease verilirse yer onun üzerinden bırakılır (hedging'de kaybeden çağrının yeri erken bırakılabilir).
+        """
+        self._enter()
+        try:
+            with timed("gemini_attempt") as attempt:
+                response = client.models.generate_content(
+                    model=GEMINI_MODEL, contents=messages, config=self._config(deadline, config))
+            self._succeeded(time.perf_counter() - attempt.start)
+            record_usage(response.usage_metadata)
+            return response
+        finally:
+            self._leave()
+            (lease or self._slots).release()
 
-def setup_vector_db():
-    """PDF'leri yükler ve FAISS veritabanını oluşturur (opsiyonel)."""
-    global client, vector_db
+    def _call_hedged(self, messages: list, deadline: float, config: dict = None):
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._call(messages, deadline, config)
+        if self._hedge_pool is None:
+            with self._lock:
+                if self._hedge_pool is None:
+                    # Yeri bırakılmış ama HTTP isteği henüz bitmemiş çağrılar da iş parçacığı tutar
+                    self._hedge_pool = ThreadPoolExecutor(max_workers=2 * self.max_concurrency,
+                                                          thread_name_prefix="ayla-hedge")
+        leases = {}
 
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        print("❌ GEMINI_API_KEY bulunamadı. .env dosyanızı kontrol edin.")
-        return False
+        def submit() -> Future:
+            lease = SlotLease(self._slots)
+            future = self._hedge_pool.submit(self._call, messages, deadline, config, lease)
+            leases[future] = lease
+            return future
 
-    try:
-        client = genai.Client(api_key=api_key)
-        print("✓ Gemini istemcisi hazır")
-    except Exception as e:
-        print(f"❌ Gemini başlatılamadı: {e}")
-        return False
+        primary, hedge = submit(), None
+        done, _ = futures_wait([primary], timeout=delay)
+        # İkinci istek için boş yer yoksa beklenmez: hedging yükü artırmamalı
+        if not done and self._slots.acquire(blocking=False):
+            GATEWAY_EVENTS.inc("hedge")
+            hedge = submit()
+        pending, error = set(leases), None
+        try:
+            while pending:
+                done, pending = futures_wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                             return_when=FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError("Gemini isteği süre sınırını aştı")
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            GATEWAY_EVENTS.inc("hedge_won")
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            # Senkron HTTP çağrısı yarıda kesilemez: kaybeden istek başlamadıysa iptal edilir,
+            # başladıysa yeri hemen bırakılır ki sonucu kimsenin beklemediği istek sırayı tutmasın
+            for future in pending:
+                future.cancel()
+                leases[future].release()
 
-    # PDF yükleme (opsiyonel - varsa yükle, yoksa devam et)
-    if os.path.exists(VECTOR_DB_PATH):
+    def generate(self, messages: list, config: dict = None):
+        """client.models.generate_content; başarısızlıkta GatewayError. config: GENERATION_CONFIG yerine."""
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.attempts):
+            probe = self._admit()
+            self._acquire(deadline, probe)
+            try:
+                return self._call_hedged(messages, deadline, config)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+            with timed("retry_backoff"):
+                time.sleep(delay)
+        raise GatewayError(CONNECTION_ERROR_MESSAGE, "exhausted")
+
+    def stream(self, messages: list):
+        """
+        client.models.generate_content_stream parçalarını üretir. Yalnızca ilk parçadan
+        önceki hatalar yeniden denenir; sonrasında yanıtı bozmamak için GatewayError.
+        """
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.attempts):
+            probe = self._admit()
+            self._acquire(deadline, probe)
+            self._enter()
+            started, usage = False, None
+            try:
+                with timed("gemini_attempt") as span:
+                    for chunk in client.models.generate_content_stream(
+                            model=GEMINI_MODEL, contents=messages, config=self._config(deadline)):
+                        if not started:
+                            started = True
+                            STAGE_SECONDS.observe("gemini_first_token", time.perf_counter() - span.start)
+                        usage = chunk.usage_metadata or usage
+                        yield chunk
+                self.breaker.record_success()
+                record_usage(usage)
+                return
+            except Exception as e:
+                # İlk parça gönderildikten sonra yeniden denemek yanıtı bozar: son deneme say
+                delay = self._retry_delay(e, self.attempts - 1 if started else attempt, deadline,
+                                          streaming=True)
+            finally:
+                self._leave()
+                self._slots.release()
+            with timed("retry_backoff"):
+                time.sleep(delay)
+        raise GatewayError(CONNECTION_ERROR_MESSAGE, "exhausted")
+
+    # --- async ---
+    def _aslots(self) -> asyncio.Semaphore:
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        return self._async_slots
+
+    async def _aacquire(self, deadline: float, probe: bool = False):
+        timeout = max(0.0, min(self.queue_timeout, deadline - time.monotonic()))
         try:
-            embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
-            )
-            vector_db = FAISS.load_local(VECTOR_DB_PATH, embeddings, allow_dangerous_deserialization=True)
-            print("✓ Psikoloji bilgi bankası yüklendi")
-            return True
-        except Exception as e:
-            print(f"⚠️ PDF veritabanı yüklenemedi (normal sohbet devam edecek): {e}")
+            await asyncio.wait_for(self._aslots().acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._reject_busy(probe)
+        except asyncio.CancelledError:
+            if probe:
+                self.breaker.cancel_probe()
+            raise
+
+    async def _acall(self, messages: list, deadline: float, lease: SlotLease = None):
+        """_call'ın asyncio sürümü; lease verilirse yer onun üzerinden bırakılır."""
+        self._enter()
+        try:
+            with timed("gemini_attempt") as attempt:
+                response = await client.aio.models.generate_content(
+                    model=GEMINI_MODEL, contents=messages, config=self._config(deadline))
+            self._succeeded(time.perf_counter() - attempt.start)
+            record_usage(response.usage_metadata)
+            return response
+        finally:
+            self._leave()
+            (lease or self._aslots()).release()
+
+    async def _acall_hedged(self, messages: list, deadline: float):
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._acall(messages, deadline)
+        leases = {}
+
+        def start() -> asyncio.Task:
+            lease = SlotLease(self._aslots())
+            task = asyncio.ensure_future(self._acall(messages, deadline, lease))
+            leases[task] = lease
+            return task
+
+        primary, hedge = start(), None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            # İkinci istek için boş yer yoksa beklenmez: hedging yükü artırmamalı
+            if not done and not self._aslots().locked():
+                await self._aslots().acquire()
+                GATEWAY_EVENTS.inc("hedge")
+                hedge = start()
+            pending, error = set(leases), None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError("Gemini isteği süre sınırını aştı")
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            GATEWAY_EVENTS.inc("hedge_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Kaybeden istek, süre dolarsa ya da çağıran iptal edilirse (istemci koptu) bitmemiş
+            # tüm istekler iptal edilir. Hiç başlamamış bir görevin finally bloğu çalışmayacağı
+            # için yeri burada bırakılır (lease tek sefer bırakır).
+            for task, lease in leases.items():
+                if not task.done():
+                    task.cancel()
+                    lease.release()
+
+    async def agenerate(self, messages: list):
+        """generate'in asyncio sürümü; beklemeler event loop'u bloklamaz."""
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.attempts):
+            probe = self._admit()
+            await self._aacquire(deadline, probe)
+            try:
+                return await self._acall_hedged(messages, deadline)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+            with timed("retry_backoff"):
+                await asyncio.sleep(delay)
+        raise GatewayError(CONNECTION_ERROR_MESSAGE, "exhausted")
+
+    async def astream(self, messages: list):
+        """stream'in asyncio sürümü (async generator)."""
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.attempts):
+            probe = self._admit()
+            await self._aacquire(deadline, probe)
+            self._enter()
+            started, usage = False, None
+            try:
+                with timed("gemini_attempt") as span:
+                    async for chunk in await client.aio.models.generate_content_stream(
+                            model=GEMINI_MODEL, contents=messages, config=self._config(deadline)):
+                        if not started:
+                            started = True
+                            STAGE_SECONDS.observe("gemini_first_token", time.perf_counter() - span.start)
+                        usage = chunk.usage_metadata or usage
+                        yield chunk
+                self.breaker.record_success()
+                record_usage(usage)
+                return
+            except Exception as e:
+                # İlk parça gönderildikten sonra yeniden denemek yanıtı bozar: son deneme say
+                delay = self._retry_delay(e, self.attempts - 1 if started else attempt, deadline,
+                                          streaming=True)
+            finally:
+                self._leave()
+                self._aslots().release()
+            with timed("retry_backoff"):
+                await asyncio.sleep(delay)
+        raise GatewayError(CONNECTION_ERROR_MESSAGE, "exhausted")
+
+    def stats(self) -> dict:
+        return {"breaker": self.breaker.state, "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency, "hedge_delay": self.hedge_delay()}
+
+
+gemini = GeminiGateway()
+
+
+# --- İSTEK KABUL DENETİMİ ---
+# Ani trafikte istekler gunicorn'da birikip herkes saniyelerce beklemesin diye /chat ve
+# /chat/stream girişte süzülür:
+#   * istemci başına token bucket: dakikada RATE_LIMIT_PER_MINUTE mesaj, en fazla
+#     RATE_LIMIT_BURST art arda; aşan istemci hemen 429 alır;
+#   * eşzamanlılık sınırı: worker başına en fazla ADMISSION_MAX_CONCURRENCY istek işlenir,
+#     en fazla ADMISSION_QUEUE_SIZE istek ADMISSION_QUEUE_TIMEOUT saniye sırada bekler;
+#     sıra doluysa ya da süre dolarsa istek 429 ve Retry-After ile reddedilir.
+class AdmissionError(Exception):
+    """İstek kabul edilmedi; kullanıcıya user_message, retry_after saniye sonra denemesi söylenir."""
+
+    def __init__(self, user_message: str, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.user_message = user_message
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """İstemci anahtarı başına token bucket; en uzun süredir görülmeyen istemciler atılır."""
+
+    def __init__(self, per_minute: float = None, burst: int = None, max_clients: int = None):
+        self.rate = (RATE_LIMIT_PER_MINUTE if per_minute is None else per_minute) / 60.0
+        self.burst = max(1, burst or RATE_LIMIT_BURST)
+        self.max_clients = max_clients or RATE_LIMIT_CLIENTS
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # anahtar -> (kalan token, son güncelleme)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, key: str):
+        """Token varsa harcar; yoksa AdmissionError fırlatır."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if not allowed:
+            ADMISSION.inc("rate_limited")
+            raise AdmissionError(RATE_LIMITED_MESSAGE, "rate_limited", math.ceil((1 - tokens) / self.rate))
+
+    def stats(self) -> dict:
+        return {"per_minute": self.rate * 60, "burst": self.burst, "clients": len(self._buckets)}
+
+
+class _AsyncWaiter:
+    """
+    Sırada bekleyen async istek. Yerin devredilip devredilmediğine (granted) _cond altında
+    karar verilir; Future yalnızca uyandırma içindir ve yalnızca kendi event loop'unda çözülür
+    (asyncio Future'ları iş parçacığı güvenli değildir).
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = None  # None: bekliyor, True: yer devredildi, False: süre doldu/vazgeçildi
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+    def wake(self) -> bool:
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
             return True
+        except RuntimeError:  # event loop kapanmış
+            return False
 
-    # Yeni veritabanı oluştur
-    documents = []
-    for file_name in PDF_FILES:
-        if not os.path.exists(file_name):
-            continue
+
+class AdmissionController:
+    """
+    Eşzamanlılık sınırı ve süreli, sınırlı bekleme sırası. Sync (Flask iş parçacıkları) ve
+    async (ASGI event loop) yollarının ikisi de aynı sayaçları kullanır; async bekleyenler
+    sırayla boşalan yeri devralır. Retry-After son isteklerin ortalama süresinden tahmin edilir.
+    """
+
+    def __init__(self, max_concurrency: int = None, queue_size: int = None, queue_timeout: float = None):
+        self.max_concurrency = max_concurrency or ADMISSION_MAX_CONCURRENCY
+        self.queue_size = ADMISSION_QUEUE_SIZE if queue_size is None else queue_size
+        self.queue_timeout = ADMISSION_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self._cond = threading.Condition()
+        self._waiters = deque()  # async bekleyenler (_AsyncWaiter, geliş sırasıyla)
+        self._service = self.queue_timeout or 1.0  # İstek süresinin üstel ortalaması (saniye)
+        self.active = 0
+        self.waiting = 0
+
+    def _reject(self, reason: str):
+        ADMISSION.inc(f"rejected_{reason}")
+        # Önümüzdeki istekler max_concurrency'lik dilimler halinde biter
+        retry_after = math.ceil(self._service * (self.waiting + 1) / self.max_concurrency)
+        raise AdmissionError(BUSY_MESSAGE, reason, min(60, max(1, retry_after)))
+
+    def _admitted(self, queued_at: float = None) -> float:
+        if queued_at is None:
+            ADMISSION.inc("admitted")
+        else:
+            ADMISSION.inc("queued")
+            STAGE_SECONDS.observe("admission_wait", time.monotonic() - queued_at)
+        return time.monotonic()
+
+    def acquire(self) -> float:
+        """Yer açılana kadar bekler; başlangıç anını döndürür (release'e verilir)."""
+        with self._cond:
+            if self.active < self.max_concurrency and not self.waiting:
+                self.active += 1
+                return self._admitted()
+            if self.waiting >= self.queue_size:
+                self._reject("queue_full")
+            queued_at = time.monotonic()
+            self.waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self.active < self.max_concurrency, self.queue_timeout):
+                    self._reject("timeout")
+                self.active += 1
+            finally:
+                self.waiting -= 1
+        return self._admitted(queued_at)
+
+    async def aacquire(self) -> float:
+        """acquire'ın asyncio sürümü; event loop iş parçacığından çağrılır."""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self.active < self.max_concurrency and not self.waiting:
+                self.active += 1
+                return self._admitted()
+            if self.waiting >= self.queue_size:
+                self._reject("queue_full")
+            queued_at = time.monotonic()
+            self.waiting += 1
+            waiter = _AsyncWaiter(loop)
+            self._waiters.append(waiter)
+        timer = loop.call_later(self.queue_timeout, self._expire, waiter)
+        try:
+            await waiter.future
+        except BaseException:
+            with self._cond:
+                # Yer devredildikten hemen sonra iptal edildiyse (istemci gitti) yer geri verilir
+                if waiter.granted:
+                    self.release()
+                waiter.granted = False
+            raise
+        finally:
+            timer.cancel()
+            with self._cond:
+                self.waiting -= 1
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        with self._cond:
+            if not waiter.granted:
+                self._reject("timeout")
+        return self._admitted(queued_at)
+
+    def _expire(self, waiter: _AsyncWaiter):
+        """Sırada bekleme süresi doldu (event loop'ta çalışır); yer devredilmediyse vazgeçilir."""
+        with self._cond:
+            if waiter.granted is None:
+                waiter.granted = False
+        waiter.wake()
+
+    def release(self, started: float = None):
+        with self._cond:
+            if started is not None:
+                self._service = 0.9 * self._service + 0.1 * (time.monotonic() - started)
+            # Bekleyen async istek varsa yer ona devredilir (active değişmez); karar _cond
+            # altında verilir, Future bekleyenin kendi event loop'unda çözülür
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if waiter.granted is None:
+                    waiter.granted = waiter.wake()
+                    if waiter.granted:
+                        return
+            self.active -= 1
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        return {"enabled": ADMISSION_ENABLED, "active": self.active, "waiting": self.waiting,
+                "max_concurrency": self.max_concurrency, "queue_size": self.queue_size,
+                "queue_timeout": self.queue_timeout, "mean_service_s": round(self._service, 3),
+                "outcomes": ADMISSION.snapshot()}
+
+
+admission = AdmissionController()
+rate_limiter = RateLimiter()
+
+
+def client_key(remote_addr: str, forwarded_for: str = None) -> str:
+    """Hız sınırı anahtarı: istemci IP'si (TRUST_PROXY ise X-Forwarded-For'daki son adres)."""
+    if TRUST_PROXY and forwarded_for:
+        return forwarded_for.rsplit(",", 1)[-1].strip() or remote_addr or "-"
+    return remote_addr or "-"
+
+
+def admit(remote_addr: str, forwarded_for: str = None):
+    """
+    Hız sınırı ve kabul denetimi; kabul edilmezse AdmissionError fırlatır.
+    Dönen değer istek bitince admission.release'e verilir (denetim kapalıysa None).
+    """
+    rate_limiter.check(client_key(remote_addr, forwarded_for))
+    return admission.acquire() if ADMISSION_ENABLED else None
+
+
+async def aadmit(remote_addr: str, forwarded_for: str = None):
+    """admit'in asyncio sürümü."""
+    rate_limiter.check(client_key(remote_addr, forwarded_for))
+    return await admission.aacquire() if ADMISSION_ENABLED else None
+
+
+def release(admitted):
+    if admitted is not None:
+        admission.release(admitted)
+
+
+def rejection_payload(error: AdmissionError) -> dict:
+    """429 yanıtının gövdesi; arayüz 'response' metnini gösterip retry_after saniye sonra yeniden dener."""
+    return {"response": error.user_message, "error": error.reason, "retry_after": error.retry_after}
+
+
+# --- SOHBET ÖZETİ ---
+class ConversationSummarizer:
+    """
+    Oturum penceresinden (SESSION_MAX_TURNS) taşan mesajları arka planda, cevap
+    yolunu bekletmeden oturumun özetine katlar. Her oturum için aynı anda tek bir
+    özetleme işi çalışır; başarısız olursa eski mesajlar bir sonraki taşmada yeniden denenir.
+    Özetler sohbetinkinden ayrı bir GeminiGateway kullanır: başarısız veya yavaş özetler
+    sohbetin devre kesicisini açmaz, hedging eşiğini bozmaz ve sohbetten yer almaz.
+    """
+
+    def __init__(self, store: ConversationStore, threads: int = SUMMARY_THREADS, gateway: GeminiGateway = None):
+        self.store = store
+        self.gateway = gateway or GeminiGateway(max_concurrency=threads, hedge=False, name="summary")
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="ayla-summary")
+
+    def schedule(self, sid: str):
+        self._pool.submit(self._fold, sid)
+
+    def summarize(self, summary: str, turns: list) -> str:
+        """Önceki özet + yeni mesajlar -> yeni özet (Gemini çağrısı)."""
+        transcript = "\n".join(f"{'Kullanıcı' if role == 'user' else 'AYLA'}: {content}"
+                               for role, content in turns)
+        prompt = SUMMARY_PROMPT.format(limit=SUMMARY_MAX_TOKENS // 2, summary=summary or "(yok)",
+                                       transcript=transcript)
+        response = self.gateway.generate([{"role": "user", "parts": [{"text": prompt}]}], config=SUMMARY_CONFIG)
+        return truncate_to_tokens(_response_text(response).strip(), SUMMARY_MAX_TOKENS)
+
+    def _fold(self, sid: str):
+        job = self.store.begin_fold(sid)
+        if job is None:
+            return
+        summary, turns = job
         try:
-            loader = PyPDFLoader(file_name)
-            documents.extend(loader.load())
-            print(f"  ✓ {file_name}")
+            if not client:
+                raise RuntimeError("Gemini istemcisi hazır değil")
+            with timed("summarize"):
+                new_summary = self.summarize(summary, turns)
+            if not new_summary:
+                raise ValueError("Boş özet")
         except Exception as e:
-            print(f"  ⚠️ {file_name} yüklenemedi")
-
-    if documents:
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=150)
-        texts = text_splitter.split_documents(documents)
-        vector_db = FAISS.from_documents(texts, embeddings)
-        vector_db.save_local(VECTOR_DB_PATH)
-        print(f"✓ {len(texts)} bilgi parçası indekslendi")
-    
-    return True
+            SUMMARIES.inc("error")
+            log.warning("⚠️ Sohbet özetlenemedi", extra={"fields": {"error": e, "turns": len(turns)}})
+            self.store.abort_fold(sid)
+            return
+        SUMMARIES.inc("ok")
+        if self.store.finish_fold(sid, new_summary, len(turns)):
+            self.schedule(sid)
+
+
+summarizer = ConversationSummarizer(sessions) if SUMMARY_ENABLED else None
+if summarizer:
+    sessions.on_overflow = summarizer.schedule
+
+
+def select_history(summary: str, history: list, budget: int = PROMPT_HISTORY_TOKENS) -> tuple:
+    """
+    Özet ve son mesajları token bütçesine sığdırır: özet en fazla bütçenin yarısını
+    alır, kalan bütçe en yeni mesajdan geriye doğru doldurulur. Tek başına sığmayan
+    en yeni mesaj kısaltılır. (summary, mesajlar) döndürür.
+    """
+    summary = truncate_to_tokens(summary, budget // 2) if summary else ""
+    remaining = budget - estimate_tokens(summary)
+    selected = []
+    for role, content in reversed(history):
+        cost = estimate_tokens(content)
+        if cost > remaining:
+            if not selected and remaining > 0:
+                selected.append((role, truncate_to_tokens(content, remaining)))
+            break
+        selected.append((role, content))
+        remaining -= cost
+    return summary, selected[::-1]
+
+
+def build_messages(user_message: str, history: list, summary: str = "") -> tuple:
+    """
+    Gemini'ye gönderilecek mesaj listesini hazırlar.
+    (messages, context, sources) döndürür.
+    """
+    # Psikoloji sorusu mu kontrol et
+    context, sources = get_context_if_relevant(user_message)
+
+    with timed("prompt"):
+        system = SYSTEM_PROMPT
+        # Context varsa ekle (pack_context bütçeye göre kısaltmıştır)
+        if context:
+            system += f"\n\nBİLGİ BANKASI:\n{context}"
+
+        # Sohbet geçmişi: eski mesajların özeti + bütçeye sığan son mesajlar + yeni mesaj
+        summary, recent = select_history(summary, history)
+        if summary:
+            system += f"\n\nÖNCEKİ KONUŞMANIN ÖZETİ:\n{summary}"
+        messages = [{"role": "user", "parts": [{"text": system}]}]
+        for msg_role, content in recent + [("user", user_message)]:
+            role = "user" if msg_role == "user" else "model"
+            messages.append({"role": role, "parts": [{"text": content}]})
+
+        tokens = {"system": estimate_tokens(SYSTEM_PROMPT), "context": estimate_tokens(context),
+                  "summary": estimate_tokens(summary),
+                  "history": sum(estimate_tokens(content) for _, content in recent),
+                  "message": estimate_tokens(user_message)}
+        tokens["total"] = sum(tokens.values())
+        for part, count in tokens.items():
+            PROMPT_TOKENS.observe(part, count)
+        log.debug("🧮 Prompt token tahmini", extra={"fields": tokens})
+    return messages, context, sources
+
+
+def prepare_turn(user_message: str, session_id: str) -> tuple:
+    """
+    Bir sohbet turunu hazırlar: (history, cached, messages, context, sources).
+    Anlamsal önbellekte eşleşme varsa cached = (cevap, kaynaklar) olur ve
+    Gemini'ye gidilmez; yoksa mesaj listesi hazırlanır.
+    """
+    summary, history = sessions.snapshot(session_id)
+    with timed("answer_cache"):
+        cached = answer_cache.lookup(user_message, history)
+    if cached is not None:
+        return history, cached, None, "", ""
+    messages, context, sources = build_messages(user_message, history, summary)
+    return history, None, messages, context, sources if context else ""
+
+
+def finish_turn(user_message: str, session_id: str, history: list, answer: str, sources: str):
+    """Başarılı cevabı oturum geçmişine ve cevap önbelleğine yazar."""
+    sessions.commit(session_id, ("user", user_message), ("assistant", answer))
+    answer_cache.store(user_message, history, answer, sources)
+
+
+# Boş geçmişli özdeş sorular (ör. arayüzdeki öneri soruları) aynı anda gelirse tek bir
+# Gemini çağrısını paylaşır; her istek cevabı kendi oturumuna yazar.
+chat_flight = SingleFlight("chat")
+stream_flight = SingleFlight("chat_stream")
+
+
+def _flight_key(user_message: str, history: list):
+    """Birleştirme anahtarı; geçmişi olan sohbetlerin prompt'u farklıdır, birleştirilmez (None)."""
+    return None if history else normalize_query(user_message) or None
+
+
+def _with_sources(answer: str, sources: str) -> str:
+    return f"{answer}\n\n{sources}" if sources else answer
 
-def get_context_if_relevant(query: str) -> tuple:
-    """Sadece psikoloji soruları için PDF'lerden bağlam çeker."""
-    psi_keywords = [
-        "terapi", "psikoloji", "bdt", "mindfulness", "anksiyete", "depresyon",
-        "stres", "kaygı", "farkındalık", "nefes", "meditasyon", "ego",
-        "bilinçaltı", "travma", "obsesif", "panik", "fobi", "öfke"
-    ]
-    
-    query_lower = query.lower()
-    is_psi = any(kw in query_lower for kw in psi_keywords)
-    
-    if not is_psi or not vector_db:
-        return "", ""
-    
-    try:
-        docs = vector_db.similarity_search(query, k=3)
-        if docs:
-            context = "\n\n".join([d.page_content[:500] for d in docs])
-            sources = list(set([f"📚 {os.path.basename(d.metadata.get('source', ''))}" for d in docs]))
-            return context, "\n".join(sources[:2])
-    except:
-        pass
-    
-    return "", ""
+
+def _response_text(response) -> str:
+    """Gemini yanıtından (veya akış parçasından) metni güvenli şekilde çıkarır."""
+    if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+        return "".join(part.text or "" for part in response.candidates[0].content.parts)
+    return ""
 
 
 # --- GÜNCELLENMİŞ FONKSİYON ---
-def generate_response(user_message: str) -> str:
+def generate_response(user_message: str, session_id: str) -> str:
     """
     Geliştirilmiş, hızlı ve doğal yanıt üretir.
-    Geçici API hatalarında (503) yeniden deneme mekanizması içerir.
+    Geçici API hatalarında (503) GeminiGateway üzerinden yeniden dener.
+    Sohbet geçmişi oturuma (session_id) göre ayrı tutulur.
     """
-    global conversation_history
-    
     if not client:
-        return "Üzgünüm, şu anda bağlantım yok 😔"
+        return NO_CLIENT_MESSAGE
 
     # --- 1. Hazırlık ---
-    # Sohbet geçmişini güncelle
-    conversation_history.append({"role": "user", "content": user_message})
-    if len(conversation_history) > 6:
-        conversation_history = conversation_history[-6:]
+    history, cached, messages, context, sources = prepare_turn(user_message, session_id)
+    if cached:
+        # Anlamca aynı soru daha önce cevaplanmış: Gemini'ye gitme
+        sessions.commit(session_id, ("user", user_message), ("assistant", cached[0]))
+        return _with_sources(*cached)
 
-    # Psikoloji sorusu mu kontrol et
-    context, sources = get_context_if_relevant(user_message)
-    
-    # System prompt
-    system = """Sen Ayla, samimi ve zeki bir AI asistanısın. 
-ÖZELLİKLERİN:
-- Modern yapay zeka asistanları gibi doğal, akıcı konuşursun
-- Kısa ve öz cevaplar verirsin (2-4 cümle)
-- Emoji kullanabilirsin ama abartma
-- "Ben bir AI'yım ama..." gibi klişe cümleler kurma
-- Psikoloji konusunda uzman bilgin var
-KURALLAR:
-1. Her konuda rahat sohbet et (hava, spor, yemek, teknoloji...)
-2. Psikoloji/BDT soruları için bilgi bankamı kullan
-3. Kriz durumlarında (intihar, zarar verme) 112/155'i öner
-4. Direkt cevap ver, fazla açıklama yapma"""
+    # --- 2. API Çağrısı (yeniden deneme, devre kesici ve sınırlar GeminiGateway'de) ---
+    key = _flight_key(user_message, history)
+    try:
+        if key:
+            response = chat_flight.do(key, lambda: gemini.generate(messages))
+        else:
+            response = gemini.generate(messages)
+    except GatewayError as e:
+        return e.user_message
 
-    # Context varsa ekle
-    if context:
-        system += f"\n\nBİLGİ BANKASI:\n{context[:1000]}"
-
-    # Sohbet geçmişini hazırla
-    messages = [{"role": "user", "parts": [{"text": system}]}]
-    for msg in conversation_history[-4:]:
-        role = "user" if msg["role"] == "user" else "model"
-        messages.append({"role": role, "parts": [{"text": msg["content"]}]})
-    
-    
-    # --- 2. Yeniden Deneme Döngüsü ---
-    
-    maks_deneme = 3  # Toplam 3 kez deneyeceğiz
-    temel_bekleme_suresi = 1 # 1 saniye ile başlayacak
-    
-    for deneme in range(maks_deneme):
-        try:
-            # --- 3. API Çağrısı ---
-            response = client.models.generate_content(
-                model=GEMINI_MODEL,
-                contents=messages,
-                config={
-                    "temperature": 0.9,
-                    "top_p": 0.95,
-                    "top_k": 40,
-                    "max_output_tokens": 300,
-                    "safety_settings": [
-                        {"category": cat, "threshold": HarmBlockThreshold.BLOCK_NONE}
-                        for cat in [
-                            HarmCategory.HARM_CATEGORY_HARASSMENT,
-                            HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT
-                        ]
-                    ],
-                }
-            )
-            
-            # --- 4. Başarılı Yanıt İşleme ---
-            if response.candidates and response.candidates[0].content.parts:
-                answer = response.candidates[0].content.parts[0].text.strip()
-                
-                # Sohbet geçmişine ekle
-                conversation_history.append({"role": "assistant", "content": answer})
-                
-                # Kaynak varsa ekle
-                if sources and context:
-                    answer += f"\n\n{sources}"
-                
-                return answer # Başarılı, cevabı döndür ve fonksiyondan çık
-            else:
-                # Model boş yanıt dönerse (örn. güvenlik filtresi)
-                return "Hmm, şu an yanıt veremedim. Tekrar dener misin? 🤔"
-                
-        # --- 5. Hata Yönetimi ---
-        
-        # Sadece '503 Service Unavailable' (veya benzeri geçici) hataları yakala
-        except google_exceptions.ServiceUnavailable as e:
-            print(f"❌ Yanıt hatası (503): {e}")
-            print(f"Uyarı: 503 Hizmet Kullanılamıyor. Deneme {deneme + 1}/{maks_deneme}.")
-            
-            # Eğer son deneme değilse, bekle
-            if deneme < maks_deneme - 1:
-                # Üstel geri çekilme: 1*2^0=1s, 1*2^1=2s...
-                bekleme_suresi = temel_bekleme_suresi * (2 ** deneme)
-                print(f"{bekleme_suresi} saniye bekleniyor...")
-                time.sleep(bekleme_suresi)
-            else:
-                # Son denemeydi, artık hata ver
-                print("Hata: Maksimum deneme sayısına ulaşıldı. Model yanıt vermiyor.")
-                return "Bağlantı sorunu yaşıyorum, biraz sonra tekrar dene 😊"
+    # --- 3. Yanıt İşleme ---
+    answer = _response_text(response).strip()
+    if not answer:
+        # Model boş yanıt dönerse (örn. güvenlik filtresi)
+        GEMINI_ATTEMPTS.inc("empty")
+        return EMPTY_ANSWER_MESSAGE
+    GEMINI_ATTEMPTS.inc("ok")
+    # Soru ve cevabı birlikte oturum geçmişine (ve önbelleğe) ekle
+    finish_turn(user_message, session_id, history, answer, sources)
+    # Kaynak varsa ekle
+    return _with_sources(answer, sources)
 
-        # Diğer tüm kalıcı hatalar (API anahtarı yanlışı, kütüphane sorunu vb.)
-        except Exception as e:
-            print(f"❌ Kalıcı yanıt hatası: {e}")
-            # Bu hatalar için tekrar denemenin anlamı yok, doğrudan hata ver
-            return "Baçağlantı sorunu yaşıyorum, biraz sonra tekrar dene 😊"
+def _sse(event: str, data: dict) -> str:
+    """Tek bir server-sent event satırı üretir."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+_FAILED_ANSWERS = (NO_CLIENT_MESSAGE, EMPTY_ANSWER_MESSAGE, CONNECTION_ERROR_MESSAGE, BUSY_MESSAGE,
+                   CIRCUIT_OPEN_MESSAGE)
+
+
+def log_turn(endpoint: str, session_id: str, user_message: str, started: float,
+             answer: str = None, failed: bool = False, aborted: bool = False):
+    """
+    Tamamlanan sohbet isteğini 'response' histogramına, sayaçlara ve günlüğe yazar.
+    İstemci ayrıldığı için yarıda kalan akışlar (aborted) yalnızca ayrı sayaçta sayılır.
+    Mesaj içerikleri yalnızca DEBUG seviyesinde günlüğe girer.
+    """
+    seconds = time.perf_counter() - started
+    fields = {"endpoint": endpoint, "sid": session_id[:8], "ms": round(1000 * seconds),
+              "chars_in": len(user_message)}
+    if aborted:
+        REQUESTS_ABORTED.inc(endpoint)
+        log.info("⏹️ Akış yarıda kaldı (istemci ayrıldı)", extra={"fields": fields})
+        return
+    STAGE_SECONDS.observe("response", seconds)
+    REQUESTS.inc(endpoint)
+    failed = failed or answer in _FAILED_ANSWERS
+    if failed:
+        REQUEST_ERRORS.inc(endpoint)
+    if answer is not None:
+        fields["chars_out"] = len(answer)
+    log.log(logging.WARNING if failed else logging.INFO,
+            "❌ Yanıt verilemedi" if failed else "🤖 Yanıt verildi", extra={"fields": fields})
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(f"💬 Kullanıcı: {user_message}")
+        if answer is not None:
+            log.debug(f"🤖 Ayla: {answer[:80]}...")
+
+
+def observe_stream(events, endpoint: str, session_id: str, user_message: str):
+    """SSE generator'ını sarar: ilk token süresini ve tüm akışın sonucunu kaydeder."""
+    started = time.perf_counter()
+    failed = first = aborted = False
+    try:
+        for event in events:
+            if not first and event.startswith("event: token"):
+                first = True
+                STAGE_SECONDS.observe("first_token", time.perf_counter() - started)
+            failed = failed or event.startswith("event: error")
+            yield event
+    except GeneratorExit:
+        # İstemci akış bitmeden ayrıldı (WSGI sunucusu generator'ı kapatır)
+        aborted = True
+        raise
+    except Exception:
+        failed = True
+        raise
+    finally:
+        log_turn(endpoint, session_id, user_message, started, failed=failed, aborted=aborted)
+
+
+def stream_response(user_message: str, session_id: str):
+    """
+    Yanıtı parça parça SSE olayları olarak üretir (generator).
+    Olaylar: 'token' (metin parçası), 'sources' (kaynaklar), 'error', 'done'.
+    Geçmiş yalnızca akış başarıyla tamamlanınca kaydedilir.
+    """
+    if not client:
+        yield _sse("error", {"text": NO_CLIENT_MESSAGE})
+        return
+
+    history, cached, messages, context, sources = prepare_turn(user_message, session_id)
+    if cached:
+        sessions.commit(session_id, ("user", user_message), ("assistant", cached[0]))
+        yield _sse("token", {"text": cached[0]})
+        if cached[1]:
+            yield _sse("sources", {"text": cached[1]})
+        yield _sse("done", {})
+        return
+    parts = []
+    key = _flight_key(user_message, history)
+    chunks = stream_flight.stream(key, lambda: gemini.stream(messages)) if key else gemini.stream(messages)
+    try:
+        for chunk in chunks:
+            text = _response_text(chunk)
+            if text:
+                parts.append(text)
+                yield _sse("token", {"text": text})
+    except GatewayError as e:
+        yield _sse("error", {"text": e.user_message})
+        return
+
+    answer = "".join(parts).strip()
+    if not answer:
+        GEMINI_ATTEMPTS.inc("empty")
+        yield _sse("error", {"text": EMPTY_ANSWER_MESSAGE})
+        return
+    GEMINI_ATTEMPTS.inc("ok")
 
-    # Eğer döngü bir şekilde biterse (normalde dönmemesi gerekir)
-    return "Bağlantı sorunu yaşıyorum, biraz sonra tekrar dene 😊"
+    finish_turn(user_message, session_id, history, answer, sources)
+    if sources:
+        yield _sse("sources", {"text": sources})
+    yield _sse("done", {})
 
 # --- MODERN WEB ARAYÜZÜ ---
 HTML_TEMPLATE = """
@@ -354,6 +3528,12 @@ HTML_TEMPLATE = """
             background: #f1f5f9;
             color: #64748b;
         }
+
+        .bot-message.typing.busy {
+            background: #fef3c7;
+            color: #92400e;
+            border-color: #fde68a;
+        }
         
         .typing-indicator {
             display: inline-flex;
@@ -478,7 +3658,11 @@ Hadi sohbete başlayalım!</div>
             const typingDiv = document.createElement('div');
             typingDiv.className = 'message bot-message typing';
             typingDiv.id = 'typing-msg';
-            typingDiv.innerHTML = '<div class="typing-indicator"><span></span><span></span><span></span></div>';
+            const showTyping = () => {
+                typingDiv.classList.remove('busy');
+                typingDiv.innerHTML = '<div class="typing-indicator"><span></span><span></span><span></span></div>';
+            };
+            showTyping();
             chatBox.appendChild(typingDiv);
             
             chatBox.scrollTop = chatBox.scrollHeight;
@@ -486,22 +3670,82 @@ Hadi sohbete başlayalım!</div>
             input.disabled = true;
             sendBtn.disabled = true;
             isWaiting = true;
-            fetch('/chat', {
+            let botDiv = null;
+            const showBotText = (text) => {
+                if (!botDiv) {
+                    document.getElementById('typing-msg')?.remove();
+                    botDiv = document.createElement('div');
+                    botDiv.className = 'message bot-message';
+                    chatBox.appendChild(botDiv);
+                }
+                botDiv.textContent += text;
+                chatBox.scrollTop = chatBox.scrollHeight;
+            };
+            // SSE olayını işle: token'lar geldikçe ekrana yazılır
+            const handleEvent = (block) => {
+                let event = 'message', data = '';
+                for (const line of block.split('\\n')) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                if (!data) return;
+                const payload = JSON.parse(data);
+                if (event === 'token') showBotText(payload.text);
+                else if (event === 'sources') showBotText('\\n\\n' + payload.text);
+                else if (event === 'error') showBotText((botDiv ? '\\n\\n' : '') + payload.text);
+            };
+            // Sunucu yoğunsa (429) balonda bekleme durumu gösterilir, Retry-After dolunca yeniden denenir
+            const MAX_RETRIES = 3;
+            const waitBusy = (text, seconds) => new Promise(resolve => {
+                typingDiv.classList.add('busy');
+                let left = seconds;
+                const tick = () => {
+                    if (left <= 0) {
+                        showTyping();
+                        resolve();
+                        return;
+                    }
+                    typingDiv.textContent = `${text}\n⏳ ${left} sn sonra tekrar deniyorum...`;
+                    chatBox.scrollTop = chatBox.scrollHeight;
+                    left -= 1;
+                    setTimeout(tick, 1000);
+                };
+                tick();
+            });
+            const send = (retries) => fetch('/chat/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ message: message })
             })
-            .then(res => res.json())
-            .then(data => {
-                document.getElementById('typing-msg')?.remove();
-                
-                const botDiv = document.createElement('div');
-                botDiv.className = 'message bot-message';
-                botDiv.textContent = data.response;
-                chatBox.appendChild(botDiv);
-                
-                chatBox.scrollTop = chatBox.scrollHeight;
-            })
+            .then(async res => {
+                if (res.status === 429) {
+                    const payload = await res.json().catch(() => ({}));
+                    const text = payload.response || 'Şu an çok yoğunum 🙏';
+                    if (retries >= MAX_RETRIES) {
+                        showBotText(text);
+                        return;
+                    }
+                    const seconds = parseInt(res.headers.get('Retry-After'), 10) || payload.retry_after || 2;
+                    await waitBusy(text, seconds);
+                    return send(retries + 1);
+                }
+                if (!res.ok || !res.body) throw new Error('stream');
+                const reader = res.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    let idx;
+                    while ((idx = buffer.indexOf('\\n\\n')) !== -1) {
+                        handleEvent(buffer.slice(0, idx));
+                        buffer = buffer.slice(idx + 2);
+                    }
+                }
+                if (!botDiv) throw new Error('empty');
+            });
+            send(0)
             .catch(error => {
                 document.getElementById('typing-msg')?.remove();
                 
@@ -536,61 +3780,437 @@ Hadi sohbete başlayalım!</div>
 def index():
     return render_template_string(HTML_TEMPLATE)
 
-@app.route('/health')
-def health():
-    return jsonify({
+def _embedding_health() -> dict:
+    """Paylaşılan embedding sunucusu kullanılıyorsa yığınlama istatistiklerini ekler."""
+    if not isinstance(embedder, EmbeddingClient):
+        return {"server": None, "backend": EMBEDDING_BACKEND}
+    try:
+        return {"server": embedder.path, **embedder.stats()}
+    except OSError as e:
+        return {"server": embedder.path, "error": str(e)}
+
+def _health_payload() -> dict:
+    return {
         "status": "online",
+        "ready": client is not None,
         "model": GEMINI_MODEL,
         "rag_enabled": vector_db is not None,
+        "rag_state": rag_state,
+        "sessions": sessions.stats(),
+        "caches": {
+            "query_embedding": embedding_cache.stats(),
+            "retrieval": retrieval_cache.stats(),
+            "answer": answer_cache.stats(),
+        },
+        "router": topic_router.stats(),
+        "retrieval": {"mode": RETRIEVAL_MODE, "k": RETRIEVAL_K,
+                      "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP,
+                      "lexical_index": vector_db is not None and vector_db.lexical is not None,
+                      "paths": dict(retrieval_paths)},
+        "admission": {**admission.stats(), "rate_limit": rate_limiter.stats()},
+        "embedding": _embedding_health(),
+        "gemini": {**gemini.stats(), "summary": summarizer.gateway.stats() if summarizer else None},
+        "coalescing": {"enabled": COALESCE_ENABLED, "calls": FLIGHTS.snapshot(), "saved": COALESCED.snapshot()},
         "timestamp": datetime.now().isoformat()
-    })
+    }
+
+def _metric_block(name: str, kind: str, help_text: str, label: str, values: dict) -> list:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    return lines + [f'{name}{{{label}="{key}"}} {value}' for key, value in values.items()]
+
+
+def render_metrics() -> str:
+    """Tüm metrikleri Prometheus metin formatında (0.0.4) döndürür."""
+    lines = (STAGE_SECONDS.render() + REQUESTS.render() + REQUEST_ERRORS.render() + REQUESTS_ABORTED.render()
+             + GEMINI_ATTEMPTS.render() + PROMPT_TOKENS.render() + GEMINI_TOKENS.render()
+             + CONTEXT_CHUNKS.render() + GATEWAY_EVENTS.render() + BREAKER_TRANSITIONS.render()
+             + FLIGHTS.render() + COALESCED.render() + SUMMARIES.render() + ADMISSION.render())
+    caches = {"query_embedding": embedding_cache.stats(), "retrieval": retrieval_cache.stats(),
+              "answer": answer_cache.stats()}
+    for field, kind, help_text in (("hits", "counter", "Önbellek isabetleri"),
+                                   ("misses", "counter", "Önbellek ıskaları"),
+                                   ("evictions", "counter", "Önbellekten atılan kayıtlar"),
+                                   ("size", "gauge", "Önbellekteki kayıt sayısı")):
+        name = f"ayla_cache_{field}" + ("_total" if kind == "counter" else "")
+        lines += _metric_block(name, kind, help_text, "cache",
+                               {cache: stats[field] for cache, stats in caches.items()})
+    session_stats = sessions.stats()
+    router_stats = topic_router.stats()
+    lines += _metric_block("ayla_sessions_active", "gauge", "Aktif oturumlar", "store",
+                           {"memory": session_stats["active"]})
+    lines += _metric_block("ayla_session_evictions_total", "counter", "Atılan oturumlar", "reason",
+                           {"lru": session_stats["evicted_lru"], "ttl": session_stats["evicted_ttl"]})
+    lines += _metric_block("ayla_router_decisions_total", "counter", "Konu yönlendirici kararları", "result",
+                           {"keyword": router_stats["keyword_hits"], "centroid": router_stats["centroid_hits"],
+                            "miss": router_stats["misses"]})
+    lines += _metric_block("ayla_retrieval_paths_total", "counter", "Önbellek dışı arama yolları", "path",
+                           dict(retrieval_paths))
+    gateway = gemini.stats()
+    lines += ["# HELP ayla_breaker_state Devre kesici durumu (0 closed, 1 half_open, 2 open)",
+              "# TYPE ayla_breaker_state gauge",
+              f"ayla_breaker_state {CircuitBreaker.STATES[gateway['breaker']]}",
+              "# HELP ayla_gemini_in_flight Süren Gemini çağrıları", "# TYPE ayla_gemini_in_flight gauge",
+              f"ayla_gemini_in_flight {gateway['in_flight']}"]
+    lines += ["# HELP ayla_admission_active Kabul edilip işlenen sohbet istekleri",
+              "# TYPE ayla_admission_active gauge", f"ayla_admission_active {admission.active}",
+              "# HELP ayla_admission_queue_depth Kabul sırasında bekleyen sohbet istekleri",
+              "# TYPE ayla_admission_queue_depth gauge", f"ayla_admission_queue_depth {admission.waiting}"]
+    lines += ["# HELP ayla_rag_ready Bilgi bankası hazır mı (1/0)", "# TYPE ayla_rag_ready gauge",
+              f"ayla_rag_ready {int(rag_state == 'ready')}"]
+    return "\n".join(lines) + "\n"
+
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _readiness() -> tuple:
+    """Sohbet istemcisi hazırsa trafik alınabilir; bilgi bankası yüklenirken de sohbet çalışır."""
+    ready = client is not None
+    return {"ready": ready, "rag_state": rag_state}, (200 if ready else 503)
+
+@app.before_request
+def _start_warmup():
+    ensure_warmup()
+
+@app.route('/health')
+def health():
+    return jsonify(_health_payload())
+
+@app.route('/health/live')
+def health_live():
+    """Liveness: process ayakta ve istek karşılayabiliyor."""
+    return jsonify({"status": "alive"})
+
+@app.route('/health/ready')
+def health_ready():
+    """Readiness: sohbet yanıtlanabiliyor mu (bilgi bankası durumu bilgi amaçlı)."""
+    payload, status = _readiness()
+    return jsonify(payload), status
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrikleri (aşama süreleri, önbellek, yeniden deneme ve hata sayaçları)."""
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+def _with_session(response, session_id: str, is_new: bool):
+    """Yeni oturumlar için kimliği çereze yazar."""
+    if is_new:
+        response.set_cookie(SESSION_COOKIE, session_id, max_age=SESSION_TTL,
+                            httponly=True, samesite="Lax")
+    return response
+
+def _rejected(error: AdmissionError, session_id: str, is_new: bool):
+    """Kabul edilmeyen istek: 429 ve Retry-After ile hemen yanıtlanır."""
+    response = jsonify(rejection_payload(error))
+    response.status_code = 429
+    response.headers["Retry-After"] = str(error.retry_after)
+    return _with_session(response, session_id, is_new)
 
 @app.route('/chat', methods=['POST'])
 def chat_endpoint():
     try:
         data = request.get_json()
         user_message = data.get('message', '').strip()
+        session_id, is_new = get_session_id()
 
         if not user_message:
-            return jsonify({'response': 'Bir şeyler yaz bakalım 😊'})
+            return _with_session(jsonify({'response': 'Bir şeyler yaz bakalım 😊'}), session_id, is_new)
 
-        print(f"💬 [{datetime.now().strftime('%H:%M:%S')}] Kullanıcı: {user_message}")
-        
-        response = generate_response(user_message)
-        
-        print(f"🤖 [{datetime.now().strftime('%H:%M:%S')}] Ayla: {response[:80]}...")
+        try:
+            admitted = admit(request.remote_addr, request.headers.get("X-Forwarded-For"))
+        except AdmissionError as e:
+            return _rejected(e, session_id, is_new)
+        try:
+            started = time.perf_counter()
+            response = generate_response(user_message, session_id)
+            log_turn("chat", session_id, user_message, started, response)
+        finally:
+            release(admitted)
         
-        return jsonify({'response': response})
+        return _with_session(jsonify({'response': response}), session_id, is_new)
 
     except Exception as e:
-        print(f"❌ Chat hatası: {e}")
+        REQUEST_ERRORS.inc("chat")
+        log.exception(f"❌ Chat hatası: {e}")
         return jsonify({'response': 'Bir sorun oluştu, tekrar dener misin? 😊'})
 
-# ... (chat_endpoint fonksiyonunun sonu burada olmalı) ...
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream_endpoint():
+    """Yanıtı server-sent events (SSE) olarak akıtır; ilk kelimeler hemen gelir."""
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message', '').strip()
+    session_id, is_new = get_session_id()
+
+    admitted = None
+    if not user_message:
+        events = iter([_sse("token", {"text": "Bir şeyler yaz bakalım 😊"}), _sse("done", {})])
+    else:
+        try:
+            admitted = admit(request.remote_addr, request.headers.get("X-Forwarded-For"))
+        except AdmissionError as e:
+            return _rejected(e, session_id, is_new)
+        events = stream_with_context(observe_stream(
+            stream_response(user_message, session_id), "chat_stream", session_id, user_message))
+
+    response = Response(events, mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Yer akış bitince (ya da istemci ayrılınca) bırakılır
+    response.call_on_close(lambda: release(admitted))
+    return _with_session(response, session_id, is_new)
+
+
+# --- ASYNC (ASGI) SUNUCU MODU ---
+# 'uvicorn chatbot:asgi_app' veya
+# 'gunicorn -k uvicorn.workers.UvicornWorker chatbot:asgi_app' ile çalıştırılır.
+# Gemini çağrıları ve yeniden deneme beklemeleri event loop'u bloklamaz;
+# FAISS araması ayrı bir iş parçacığı havuzunda yapılır. Böylece tek bir
+# process yüzlerce yanıt bekleyen sohbeti aynı anda taşıyabilir.
+_retrieval_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_THREADS, thread_name_prefix="ayla-retrieval")
+
+
+async def agenerate_response(user_message: str, session_id: str) -> str:
+    """generate_response'un asyncio sürümü."""
+    if not client:
+        return NO_CLIENT_MESSAGE
+
+    loop = asyncio.get_running_loop()
+    history, cached, messages, context, sources = await loop.run_in_executor(
+        _retrieval_pool, prepare_turn, user_message, session_id)
+    if cached:
+        sessions.commit(session_id, ("user", user_message), ("assistant", cached[0]))
+        return _with_sources(*cached)
+
+    key = _flight_key(user_message, history)
+    try:
+        if key:
+            response = await chat_flight.ado(key, lambda: gemini.agenerate(messages))
+        else:
+            response = await gemini.agenerate(messages)
+    except GatewayError as e:
+        return e.user_message
+    answer = _response_text(response).strip()
+    if not answer:
+        GEMINI_ATTEMPTS.inc("empty")
+        return EMPTY_ANSWER_MESSAGE
+    GEMINI_ATTEMPTS.inc("ok")
+    await loop.run_in_executor(
+        _retrieval_pool, finish_turn, user_message, session_id, history, answer, sources)
+    return _with_sources(answer, sources)
+
+
+async def astream_response(user_message: str, session_id: str):
+    """stream_response'un asyncio sürümü (SSE olaylarını üreten async generator)."""
+    if not client:
+        yield _sse("error", {"text": NO_CLIENT_MESSAGE})
+        return
+
+    loop = asyncio.get_running_loop()
+    history, cached, messages, context, sources = await loop.run_in_executor(
+        _retrieval_pool, prepare_turn, user_message, session_id)
+    if cached:
+        sessions.commit(session_id, ("user", user_message), ("assistant", cached[0]))
+        yield _sse("token", {"text": cached[0]})
+        if cached[1]:
+            yield _sse("sources", {"text": cached[1]})
+        yield _sse("done", {})
+        return
+    parts = []
+    key = _flight_key(user_message, history)
+    chunks = stream_flight.astream(key, lambda: gemini.astream(messages)) if key else gemini.astream(messages)
+    try:
+        async for chunk in chunks:
+            text = _response_text(chunk)
+            if text:
+                parts.append(text)
+                yield _sse("token", {"text": text})
+    except GatewayError as e:
+        yield _sse("error", {"text": e.user_message})
+        return
+
+    answer = "".join(parts).strip()
+    if not answer:
+        GEMINI_ATTEMPTS.inc("empty")
+        yield _sse("error", {"text": EMPTY_ANSWER_MESSAGE})
+        return
+    GEMINI_ATTEMPTS.inc("ok")
+
+    await loop.run_in_executor(
+        _retrieval_pool, finish_turn, user_message, session_id, history, answer, sources)
+    if sources:
+        yield _sse("sources", {"text": sources})
+    yield _sse("done", {})
+
+
+def _session_cookie_header(session_id: str) -> str:
+    return f"{SESSION_COOKIE}={session_id}; Max-Age={SESSION_TTL}; Path=/; HttpOnly; SameSite=Lax"
+
+
+async def _asgi_read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _asgi_start(send, status: int, content_type: str, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode())] + list(headers),
+    })
+
+
+async def _asgi_send(send, status: int, content_type: str, body: str, headers=()):
+    await _asgi_start(send, status, content_type, headers)
+    await send({"type": "http.response.body", "body": body.encode("utf-8")})
+
+
+async def asgi_app(scope, receive, send):
+    """Flask uygulamasıyla aynı uç noktaları sunan bağımlılıksız ASGI uygulaması."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                _retrieval_pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    ensure_warmup()
+
+    method, path = scope["method"], scope["path"]
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+
+    if path == "/" and method == "GET":
+        await _asgi_send(send, 200, "text/html; charset=utf-8", HTML_TEMPLATE)
+        return
+    if path == "/health" and method == "GET":
+        await _asgi_send(send, 200, "application/json", json.dumps(_health_payload(), ensure_ascii=False))
+        return
+    if path == "/health/live" and method == "GET":
+        await _asgi_send(send, 200, "application/json", json.dumps({"status": "alive"}))
+        return
+    if path == "/health/ready" and method == "GET":
+        payload, status = _readiness()
+        await _asgi_send(send, status, "application/json", json.dumps(payload))
+        return
+    if path == "/metrics" and method == "GET":
+        await _asgi_send(send, 200, METRICS_CONTENT_TYPE, render_metrics())
+        return
+    if path not in ("/chat", "/chat/stream") or method != "POST":
+        await _asgi_send(send, 404, "application/json", json.dumps({"error": "not found"}))
+        return
+
+    try:
+        data = json.loads(await _asgi_read_body(receive) or b"{}")
+        user_message = str(data.get("message", "")).strip()
+    except (ValueError, AttributeError):
+        user_message = ""
+
+    try:
+        cookie = SimpleCookie(headers.get("cookie", ""))
+        cookie_sid = cookie[SESSION_COOKIE].value if SESSION_COOKIE in cookie else None
+    except CookieError:
+        cookie_sid = None
+    session_id, is_new = resolve_session_id(headers.get(SESSION_HEADER.lower()), cookie_sid)
+    extra_headers = [(b"set-cookie", _session_cookie_header(session_id).encode())] if is_new else []
+
+    admitted = None
+    if user_message:
+        try:
+            admitted = await aadmit((scope.get("client") or ("",))[0], headers.get("x-forwarded-for"))
+        except AdmissionError as e:
+            await _asgi_send(send, 429, "application/json", json.dumps(rejection_payload(e), ensure_ascii=False),
+                             [(b"retry-after", str(e.retry_after).encode())] + extra_headers)
+            return
+    try:
+        await _asgi_chat(send, path, user_message, session_id, extra_headers)
+    finally:
+        release(admitted)
+
+
+async def _asgi_chat(send, path: str, user_message: str, session_id: str, extra_headers: list):
+    """Kabul edilmiş /chat veya /chat/stream isteğini yanıtlar."""
+    if path == "/chat":
+        if not user_message:
+            response = 'Bir şeyler yaz bakalım 😊'
+        else:
+            started = time.perf_counter()
+            failed = False
+            try:
+                response = await agenerate_response(user_message, session_id)
+            except Exception as e:
+                log.exception(f"❌ Chat hatası: {e}")
+                response = 'Bir sorun oluştu, tekrar dener misin? 😊'
+                failed = True
+            log_turn("chat", session_id, user_message, started, response, failed)
+        await _asgi_send(send, 200, "application/json",
+                         json.dumps({"response": response}, ensure_ascii=False), extra_headers)
+        return
+
+    # /chat/stream
+    await _asgi_start(send, 200, "text/event-stream",
+                      [(b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")] + extra_headers)
+    if not user_message:
+        events = [_sse("token", {"text": "Bir şeyler yaz bakalım 😊"}), _sse("done", {})]
+        for event in events:
+            await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+    else:
+        started = time.perf_counter()
+        failed = first = aborted = False
+        try:
+            async for event in astream_response(user_message, session_id):
+                if not first and event.startswith("event: token"):
+                    first = True
+                    STAGE_SECONDS.observe("first_token", time.perf_counter() - started)
+                failed = failed or event.startswith("event: error")
+                await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+        except (asyncio.CancelledError, OSError):
+            # İstemci akış bitmeden ayrıldı (görev iptal edildi ya da gönderim başarısız)
+            aborted = True
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            log_turn("chat_stream", session_id, user_message, started, failed=failed, aborted=aborted)
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
 
 # --- UYGULAMAYI BAŞLATMA ---
 # Gunicorn'un ve lokal çalıştırmanın 'client' ve 'vector_db' değişkenlerini
 # başlatabilmesi için bu bloğu '__main__' dışına taşıyoruz.
-print("=" * 70)
-print("💜 AYLA AI - GELİŞMİŞ SOHBET ASİSTANI")
-print("=" * 70)
-
-# setup_vector_db()'yi global scope'ta (en dış katmanda) çağır
-if setup_vector_db():
-    mode = "Tam Özellikli" if vector_db else "Sohbet Modu"
-    print(f"✓ Mod: {mode}")
-    print(f"✓ Model: {GEMINI_MODEL}")
-    # Not: HF için IP/Port yazdırmak çok önemli değil ama zararı da yok.
-    print(f"✓ Adres (Lokal): http://{HOST_IP}:{PORT_NUMBER}") 
-    print("=" * 70)
-else:
-    # Bu hata mesajı artık hem lokalde hem de HF'de görünür olacak
-    print("❌ Başlatma başarısız. .env dosyanızı (veya HF Secrets) kontrol edin.")
+# offline modda (ör. build_index.py) Gemini istemcisi ve bilgi bankası başlatılmaz.
+if STARTUP_MODE != "offline":
+    log.info("=" * 70)
+    log.info("💜 AYLA AI - GELİŞMİŞ SOHBET ASİSTANI")
+    log.info("=" * 70)
+
+    # Import hızlı kalsın diye yalnızca Gemini istemcisi burada hazırlanır;
+    # bilgi bankası STARTUP_MODE'a göre yüklenir (bkz. KONFİGÜRASYON).
+    if setup_client():
+        if STARTUP_MODE == "preload":
+            load_knowledge_base()
+        elif STARTUP_MODE == "background":
+            ensure_warmup()
+        mode = "Tam Özellikli" if vector_db else f"Sohbet Modu (bilgi bankası: {STARTUP_MODE})"
+        log.info(f"✓ Mod: {mode}")
+        log.info(f"✓ Model: {GEMINI_MODEL}")
+        # Not: HF için IP/Port yazdırmak çok önemli değil ama zararı da yok.
+        log.info(f"✓ Adres (Lokal): http://{HOST_IP}:{PORT_NUMBER}") 
+        log.info("=" * 70)
+    else:
+        # Bu hata mesajı artık hem lokalde hem de HF'de görünür olacak
+        log.error("❌ Başlatma başarısız. .env dosyanızı (veya HF Secrets) kontrol edin.")
 
 # Lokal'de 'python chatbot.py' komutuyla çalıştırmak için bu blok kalmalı
 # Gunicorn bu bloğu GÖRMEYECEK, bu normal.
 if __name__ == '__main__':
-    print("🌐 Tarayıcınızda yukarıdaki adresi açın!")
-    print("⌨️  Ctrl+C ile durdurun")
-    print("=" * 70)
+    log.info("🌐 Tarayıcınızda yukarıdaki adresi açın!")
+    log.info("⌨️  Ctrl+C ile durdurun")
+    log.info("=" * 70)
     app.run(host=HOST_IP, port=PORT_NUMBER, debug=False, use_reloader=False)
@@ -0,0 +1,68 @@
+"""
+Eski LangChain FAISS indeksini (index.faiss + index.pkl) pickle içermeyen
+mmap formatına dönüştürür. PDF'ler yeniden okunmaz ve gömülmez.
+
+    python convert_index.py [--path faiss_index]
+
+index.pkl bu işlem sırasında son kez, güvenilen yerel bir dosya olarak okunur;
+dönüşümden sonra silinir ve uygulama bir daha pickle yüklemez.
+"""
+import argparse
+import os
+import pickle
+
+os.environ["AYLA_STARTUP"] = "lazy"  # Import sırasında bilgi bankası yüklenmesin
+
+import faiss  # noqa: E402
+import numpy as np  # noqa: E402
+
+import chatbot  # noqa: E402
+
+
+def convert(root: str) -> dict:
+    index = faiss.read_index(os.path.join(root, "index.faiss"))
+    with open(os.path.join(root, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    vectors = index.reconstruct_n(0, index.ntotal)
+    by_source = {}
+    for row in range(index.ntotal):
+        doc = docstore.search(index_to_docstore_id[row])
+        source = doc.metadata.get("source", "")
+        by_source.setdefault(source, []).append((row, doc.page_content, doc.metadata.get("page", 0)))
+
+    # Artımlı güncelleme bilgisi: varsa eski manifest, yoksa diskteki PDF'lerin özeti
+    old_manifest = chatbot._load_manifest(root)
+    old_files = old_manifest.get("files", {})
+    params = chatbot._index_params()
+    for key in ("chunk_size", "chunk_overlap", "embedding_model"):
+        params[key] = old_manifest.get(key, params[key])
+    params["embedding_backend"] = "torch"  # LangChain indeksi fp32 PyTorch ile gömülmüştü
+
+    order = [f for f in chatbot.PDF_FILES if f in by_source] + \
+            sorted(f for f in by_source if f not in chatbot.PDF_FILES)
+    writer = chatbot.ArtifactWriter(root)
+    files = {}
+    for source in order:
+        rows, texts, pages = zip(*by_source[source])
+        writer.add(source, vectors[np.array(rows)], list(texts), list(pages))
+        sha = old_files.get(source, {}).get("sha256")
+        if sha is None:
+            sha = chatbot._file_sha256(source) if os.path.exists(source) else ""
+        files[source] = {"sha256": sha, "chunks": len(rows)}
+        print(f"  ✓ {source} ({len(rows)} parça)")
+    return writer.write(params, files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LangChain FAISS indeksini mmap formatına dönüştürür")
+    parser.add_argument("--path", default=chatbot.VECTOR_DB_PATH)
+    args = parser.parse_args()
+    if not os.path.exists(os.path.join(args.path, "index.pkl")):
+        parser.error(f"{args.path} içinde eski formatta (index.pkl) indeks yok")
+    manifest = convert(args.path)
+    print(f"✓ Dönüştürüldü: {manifest['artifact']} ({manifest['count']} parça, {manifest['dim']} boyut)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Paylaşılan embedding sunucusu: embedding modelini tek bir process'te yükler ve tüm
+gunicorn worker'larının kodlama isteklerini bir Unix soketi üzerinden mikro yığınlar
+halinde yanıtlar. Worker tarafı chatbot.EmbeddingClient'tır; protokol chatbot.py'de tanımlıdır.
+
+    AYLA_EMBEDDING_SERVER=/tmp/ayla-embed.sock python embedding_server.py [--max-batch 64] [--max-wait-ms 5]
+
+Worker'lar aynı AYLA_EMBEDDING_SERVER değeriyle başlatılınca modeli yüklemez; gunicorn.conf.py
+bu değişken verilmişse sunucuyu gunicorn ile birlikte kendisi başlatır. Model ayarları
+(AYLA_EMBEDDING_BACKEND, AYLA_EMBEDDING_THREADS, ...) uygulamadakiyle aynıdır.
+"""
+import argparse
+import json
+import os
+import queue
+import signal
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+os.environ["AYLA_STARTUP"] = "offline"  # Gemini istemcisi ve bilgi bankası yüklenmesin
+
+import numpy as np  # noqa: E402
+
+import chatbot  # noqa: E402
+from chatbot import _REQUEST_HEADER, _RESPONSE_HEADER, _recv_exact  # noqa: E402
+
+EMBEDDING_MAX_BATCH = int(os.getenv("AYLA_EMBEDDING_MAX_BATCH", "64"))  # Mikro yığın başına metin
+EMBEDDING_MAX_WAIT = float(os.getenv("AYLA_EMBEDDING_MAX_WAIT_MS", "5")) / 1000  # Yığın toplama süresi
+
+
+class EmbeddingServer:
+    """
+    Tek bir embedding modelini Unix soketi üzerinden tüm worker'lara sunar; model bellekte
+    bir kez bulunur. Eşzamanlı istekler bir kuyrukta toplanır ve tek embed_documents
+    çağrısıyla kodlanır (mikro yığın): ilk istekten sonra en fazla max_wait saniye veya
+    max_batch metin birikene kadar beklenir. Başka bağlantı beklemiyorsa hiç beklenmez,
+    böylece tek worker'ın gecikmesi artmaz. Bağlantı başına bir iş parçacığı vardır;
+    model yalnızca yığınlayıcı iş parçacığında çalışır.
+    """
+
+    def __init__(self, embedder, path: str = chatbot.EMBEDDING_SERVER, max_batch: int = EMBEDDING_MAX_BATCH,
+                 max_wait: float = EMBEDDING_MAX_WAIT):
+        self.embedder = embedder
+        self.path = path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.dim = int(np.asarray(embedder.embed_documents(["ısınma"])).shape[1])
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._waiting = 0  # Yanıt bekleyen bağlantı sayısı
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.errors = 0
+        self._server = None
+
+    def info(self) -> dict:
+        return {"model": chatbot.EMBEDDING_MODEL,
+                "backend": getattr(self.embedder, "backend", chatbot.EMBEDDING_BACKEND), "dim": self.dim}
+
+    def stats(self) -> dict:
+        return {**self.info(), "requests": self.requests, "texts": self.texts, "batches": self.batches,
+                "errors": self.errors, "mean_batch": round(self.texts / self.batches, 2) if self.batches else 0.0,
+                "max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000}
+
+    def encode(self, texts: list) -> np.ndarray:
+        """Metinleri sıradaki mikro yığına ekler ve vektörleri bekler."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        future = Future()
+        with self._lock:
+            self._waiting += 1
+            self.requests += 1
+        try:
+            self._queue.put((texts, future))
+            return future.result()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._waiting <= len(batch):
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run_batches(self):
+        while True:
+            batch = self._collect()
+            texts = [text for item, _ in batch for text in item]
+            try:
+                vectors = np.asarray(self.embedder.embed_documents(texts), dtype=np.float32)
+            except Exception as e:
+                self.errors += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for item, future in batch:
+                future.set_result(vectors[offset:offset + len(item)])
+                offset += len(item)
+
+    def _handle(self, sock):
+        while True:
+            try:
+                (length,) = _REQUEST_HEADER.unpack(_recv_exact(sock, _REQUEST_HEADER.size))
+                request = json.loads(_recv_exact(sock, length))
+            except (ConnectionError, OSError, ValueError):
+                return
+            op = request.get("op", "encode")
+            try:
+                if op == "encode":
+                    vectors = self.encode(list(request.get("texts", [])))
+                    sock.sendall(_RESPONSE_HEADER.pack(len(vectors), self.dim) + vectors.tobytes())
+                    continue
+                reply = self.stats() if op == "stats" else self.info()
+            except Exception as e:
+                reply = {"error": f"{type(e).__name__}: {e}"}
+            payload = json.dumps(reply).encode()
+            try:
+                sock.sendall(_RESPONSE_HEADER.pack(-1, len(payload)) + payload)
+            except OSError:
+                return
+
+    def serve_forever(self):
+        """Soketi açar (eski soket dosyası silinir) ve kapatılana kadar istekleri yanıtlar."""
+        owner = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                owner._handle(self.request)
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        threading.Thread(target=self._run_batches, name="ayla-embed-batcher", daemon=True).start()
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self._server.daemon_threads = True
+        os.chmod(self.path, 0o600)
+        chatbot.log.info(f"✓ Embedding sunucusu hazır: {self.path}", extra={"fields": {
+            **self.info(), "max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000}})
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def shutdown(self):
+        if self._server:
+            self._server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker'lar arasında paylaşılan embedding sunucusu")
+    parser.add_argument("--socket", default=chatbot.EMBEDDING_SERVER or "/tmp/ayla-embed.sock",
+                        help="Unix soket yolu (varsayılan: AYLA_EMBEDDING_SERVER)")
+    parser.add_argument("--max-batch", type=int, default=EMBEDDING_MAX_BATCH,
+                        help="Bir mikro yığındaki en fazla metin")
+    parser.add_argument("--max-wait-ms", type=float, default=EMBEDDING_MAX_WAIT * 1000,
+                        help="İlk istekten sonra yığın için en fazla bekleme")
+    args = parser.parse_args()
+
+    # SIGTERM (gunicorn kapanışı) soket dosyası silinerek temiz çıkış yapsın
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    server = EmbeddingServer(chatbot.SentenceEmbedder(), args.socket, args.max_batch, args.max_wait_ms / 1000)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# Gunicorn, çalışma dizinindeki bu dosyayı otomatik olarak okur.
+import os
+import subprocess
+import sys
+
+# AYLA_STARTUP=preload: uygulama ve bilgi bankası master process'te bir kez
+# yüklenir, worker'lar fork ile bu belleği copy-on-write paylaşır.
+preload_app = os.getenv("AYLA_STARTUP") == "preload"
+
+# AYLA_EMBEDDING_SERVER=<soket yolu>: embedding modeli worker'larda değil, gunicorn ile
+# birlikte başlatılan tek bir sunucu process'inde (embedding_server.py) yüklenir.
+# Ayar okunurken başlatılır ki preload modunda master da sunucuyu kullanabilsin.
+# AYLA_EMBEDDING_SERVER_SPAWN=0 ise sunucunun ayrıca çalıştırıldığı varsayılır.
+_SERVER_PID = "AYLA_EMBEDDING_SERVER_PID"
+
+
+def _embedding_server_running() -> bool:
+    pid = int(os.environ.get(_SERVER_PID) or 0)
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+if (os.getenv("AYLA_EMBEDDING_SERVER") and os.getenv("AYLA_EMBEDDING_SERVER_SPAWN", "1") == "1"
+        and not _embedding_server_running()):
+    # Ayar dosyası SIGHUP ile yeniden okunduğunda ikinci bir sunucu başlatılmaz
+    _script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_server.py")
+    os.environ[_SERVER_PID] = str(subprocess.Popen([sys.executable, _script]).pid)
+
+
+def on_exit(server):
+    if _embedding_server_running():
+        os.kill(int(os.environ[_SERVER_PID]), 15)